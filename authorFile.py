@@ -0,0 +1,114 @@
+# authorFile.py
+# by Zachary Levonian and Freddy Stein
+# A binary, columnar file format for the author features, which cure.py memory-maps
+# instead of unpickling a dictionary of Author objects. The file holds:
+#   a 64 byte header: magic, version, number of features, number of authors,
+#       and the number of bytes of names (0 if there are none)
+#   the author ids, as int64
+#   each feature column in turn, as contiguous float64
+#   optionally, the names: int64 offsets (one per author, plus one) into a UTF-8 blob
+# All numbers are little-endian. Existing pickles can be converted with
+# pickleCreator.py (see convertPickleFile there). A large set of authors can also be
+# split into a directory of shards, each an author file, for shardedCure.py.
+# Convenience functions; intended to be used via import
+
+import os, struct
+import numpy as np
+from authorMatrix import *
+from checkpoint import *
+
+FILE_MAGIC = "CUREAUTH"
+FILE_VERSION = 1
+HEADER_FORMAT = "<8sIIQQ"
+HEADER_SIZE = 64
+
+# Names of the shard files in a shard directory; shards are read in name order
+SHARD_PREFIX = "authors-"
+SHARD_FORMAT = SHARD_PREFIX + "%05d.bin"
+
+# Writes the given authors to a file in the columnar format. The file is written
+# under a temporary name and then renamed, so a reader never sees half a file.
+# Input: the AuthorMatrix of authors (with or without names), and the name of the file
+#        (matrix, fileName)
+# Output: None
+def writeAuthorFile(matrix, fileName):
+    nameOffsets, nameBlob = None, ""
+    if matrix.names is not None:
+        encoded = [name.encode("utf-8") if isinstance(name, unicode) else name for name in matrix.names]
+        nameOffsets = np.zeros(len(encoded) + 1, dtype="<i8")
+        nameOffsets[1:] = np.cumsum([len(name) for name in encoded])
+        nameBlob = "".join(encoded)
+    namesBytes = 0 if nameOffsets is None else nameOffsets.nbytes + len(nameBlob)
+    def write(outFile):
+        header = struct.pack(HEADER_FORMAT, FILE_MAGIC, FILE_VERSION, NUM_FEATURES, \
+                             len(matrix), namesBytes)
+        outFile.write(header.ljust(HEADER_SIZE, "\0"))
+        outFile.write(np.asarray(matrix.ids, dtype="<i8").tostring())
+        outFile.write(np.asarray(matrix.data.T, dtype="<f8", order="C").tostring())
+        if nameOffsets is not None:
+            outFile.write(nameOffsets.tostring())
+            outFile.write(nameBlob)
+    writeAtomically(fileName, write)
+
+# Reads the header of a file in the columnar format.
+# Input: the name of the file (fileName)
+# Output: the number of features, the number of authors and the number of bytes of
+#         names (numFeatures, numAuthors, namesBytes)
+def readAuthorFileHeader(fileName):
+    with open(fileName, "rb") as inFile:
+        header = inFile.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError(fileName + " is too short to be an author file")
+    magic, version, numFeatures, numAuthors, namesBytes = \
+        struct.unpack(HEADER_FORMAT, header[:struct.calcsize(HEADER_FORMAT)])
+    if magic != FILE_MAGIC:
+        raise ValueError(fileName + " is not an author file")
+    if version != FILE_VERSION:
+        raise ValueError(fileName + " has unsupported author file version " + str(version))
+    if numFeatures != NUM_FEATURES:
+        raise ValueError(fileName + " has " + str(numFeatures) + " features, not " + str(NUM_FEATURES))
+    return numFeatures, numAuthors, namesBytes
+
+# Loads a file in the columnar format. The ids and features are memory-mapped
+# read-only, so this returns almost at once and only touches the pages used.
+# Input: the name of the file, and whether to load the names too (fileName, loadNames)
+# Output: the AuthorMatrix of the authors in the file (matrix)
+def loadAuthorFile(fileName, loadNames=False):
+    numFeatures, numAuthors, namesBytes = readAuthorFileHeader(fileName)
+    ids = np.memmap(fileName, dtype="<i8", mode="r", offset=HEADER_SIZE, shape=(numAuthors,))
+    featuresOffset = HEADER_SIZE + ids.nbytes
+    columns = np.memmap(fileName, dtype="<f8", mode="r", offset=featuresOffset, \
+                        shape=(numFeatures, numAuthors))
+    names = None
+    if loadNames and namesBytes > 0:
+        namesOffset = featuresOffset + columns.nbytes
+        offsets = np.memmap(fileName, dtype="<i8", mode="r", offset=namesOffset, shape=(numAuthors + 1,))
+        with open(fileName, "rb") as inFile:
+            inFile.seek(namesOffset + offsets.nbytes)
+            blob = inFile.read(int(offsets[-1]))
+        names = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(numAuthors)]
+    return AuthorMatrix(ids, columns.T, names=names)
+
+# Splits the given authors into a directory of shards of at most shardSize authors,
+# keeping their order. Names are not written to the shards.
+# Input: the AuthorMatrix of authors, the directory to write to, and the number of
+#        authors per shard (matrix, directory, shardSize)
+# Output: the names of the shard files, in order (shardFiles)
+def writeAuthorShards(matrix, directory, shardSize):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    shardFiles = []
+    for start in range(0, len(matrix), shardSize):
+        stop = min(start + shardSize, len(matrix))
+        shardFile = os.path.join(directory, SHARD_FORMAT % len(shardFiles))
+        writeAuthorFile(AuthorMatrix(matrix.ids[start:stop], matrix.data[start:stop]), shardFile)
+        shardFiles.append(shardFile)
+    return shardFiles
+
+# Lists the shard files of a shard directory, in the order their authors come in.
+# Input: the shard directory (directory)
+# Output: the names of the shard files (shardFiles)
+def listAuthorShards(directory):
+    names = sorted(name for name in os.listdir(directory) \
+                   if name.startswith(SHARD_PREFIX) and name.endswith(".bin"))
+    return [os.path.join(directory, name) for name in names]
@@ -0,0 +1,166 @@
+# authorMatrix.py
+# by Zach Levonian and Freddy Stein
+# Columnar storage for the author feature vectors. The clustering code works on
+# one (n_authors, 6) float64 matrix instead of reading Author.getData() one author
+# at a time; an id <-> row index lets the old dictionary-style lookups keep working.
+# Convenience functions; intended to be used via import
+
+import numpy as np
+
+# Number of features in each author's feature vector (see Author.buildRepList)
+NUM_FEATURES = 6
+
+# Default number of rows handled at once by the chunked distance functions
+DEFAULT_CHUNK_SIZE = 10000
+
+# Running counts of the point-to-point distances computed by getEucSquaredDistances and
+# of the points looked up in KD-trees, for profiling (see instrumentation.py)
+evaluationCounts = dict([('distances', 0), ('indexQueries', 0)])
+
+# A thin, read-only view of a single row of an AuthorMatrix. It behaves like
+# an Author as far as the clustering code is concerned.
+class AuthorRow(object):
+    def __init__(self, matrix, row):
+        self.matrix = matrix
+        self.row = row
+
+    def __repr__(self):
+        return "Author " + str(self.id) + " " + str(list(self.getData()))
+
+    @property
+    def id(self):
+        return int(self.matrix.ids[self.row])
+
+    @property
+    def repList(self):
+        return self.getData()
+
+    def getData(self):
+        return self.matrix.data[self.row]
+
+# This class holds the feature vectors of every author as one float64 matrix,
+# along with the author id of each row, optionally the author names, and a
+# dictionary from id to row (only built once it is first needed).
+# Indexing it by author id returns an AuthorRow, so it can stand in for the
+# dictionary of authors.
+class AuthorMatrix(object):
+    def __init__(self, ids, data, index=None, names=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.data = np.asarray(data, dtype=np.float64).reshape(len(self.ids), NUM_FEATURES)
+        self.idIndex = index
+        self.names = names
+
+    @property
+    def index(self):
+        if self.idIndex is None:
+            self.idIndex = dict([(authorId, row) for row, authorId in enumerate(self.ids.tolist())])
+        return self.idIndex
+
+    def __repr__(self):
+        return "AuthorMatrix of " + str(len(self)) + " authors"
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __contains__(self, authorId):
+        return authorId in self.index
+
+    def __getitem__(self, authorId):
+        return AuthorRow(self, self.index[authorId])
+
+    def keys(self):
+        return self.ids.tolist()
+
+    def getRow(self, authorId):
+        return self.index[authorId]
+
+    def getRows(self, authorIds):
+        return np.array([self.index[authorId] for authorId in authorIds], dtype=np.intp)
+
+    def getAuthor(self, row):
+        return AuthorRow(self, row)
+
+    # Returns a matrix with the same ids (and id index) but different feature values
+    def withData(self, data):
+        return AuthorMatrix(self.ids, data, self.idIndex, self.names)
+
+    # Returns a new matrix holding only the given rows of this one
+    def take(self, rows):
+        names = None
+        if self.names is not None:
+            names = [self.names[row] for row in np.asarray(rows).tolist()]
+        return AuthorMatrix(self.ids[rows], self.data[rows], names=names)
+
+####
+
+# Builds an AuthorMatrix from the dictionary of authors in a single pass.
+# Input: the dictionary of authors, as stored in the pickle file (authors)
+# Output: the matrix of author features, with its id index (matrix)
+def buildAuthorMatrix(authors):
+    ids = list(authors.keys())
+    data = np.empty((len(ids), NUM_FEATURES), dtype=np.float64)
+    for row in range(len(ids)):
+        data[row] = authors[ids[row]].getData()
+    return AuthorMatrix(ids, data)
+
+# Returns the given authors as an AuthorMatrix, building one if needed.
+# Input: a dictionary of authors or an AuthorMatrix (authors)
+# Output: the corresponding AuthorMatrix (matrix)
+def asAuthorMatrix(authors):
+    if isinstance(authors, AuthorMatrix):
+        return authors
+    return buildAuthorMatrix(authors)
+
+# Computes the squared euclidean distance from every point to every other point,
+# the vectorized form of clustering.getEucSquaredDistance. The differences are
+# summed one feature at a time, which keeps the results exact (identical points are
+# at distance 0) while only holding one (n, m) array.
+# Input: an (n, d) array of points and an (m, d) array of other points (points, others)
+# Output: the (n, m) array of squared distances (dists)
+def getEucSquaredDistances(points, others):
+    points = np.asarray(points, dtype=np.float64)
+    others = np.asarray(others, dtype=np.float64)
+    evaluationCounts['distances'] += len(points) * len(others)
+    dists = np.zeros((len(points), len(others)))
+    diff = np.empty_like(dists)
+    for j in range(points.shape[1]):
+        np.subtract(points[:, j, np.newaxis], others[np.newaxis, :, j], out=diff)
+        diff *= diff
+        dists += diff
+    return dists
+
+# Finds the nearest of the given centers for every point, working through the
+# points chunkSize at a time so only a (chunkSize, k) distance array is held.
+# Given rows, only those rows of the points are read, a chunk at a time.
+# Input: an (n, d) array of points, a (k, d) array of centers, the chunk size, and
+#        optionally the sorted rows of the points to use (points, centers, chunkSize, rows)
+# Output: the index of the nearest center for each point (or row), and the squared
+#         distance to it (nearest, minDists)
+def getNearestCenters(points, centers, chunkSize=DEFAULT_CHUNK_SIZE, rows=None):
+    numPoints = len(points) if rows is None else len(rows)
+    nearest = np.empty(numPoints, dtype=np.intp)
+    minDists = np.empty(numPoints, dtype=np.float64)
+    for start in range(0, numPoints, chunkSize):
+        if rows is None:
+            chunk = points[start:start + chunkSize]
+        else:
+            chunk = points[rows[start:start + chunkSize]]
+        dists = getEucSquaredDistances(chunk, centers)
+        chunkNearest = np.argmin(dists, axis=1)
+        nearest[start:start + chunkSize] = chunkNearest
+        minDists[start:start + chunkSize] = dists[np.arange(len(chunkNearest)), chunkNearest]
+    return nearest, minDists
+
+# Splits the given rows into groups by their label, keeping the rows of each
+# group in their original order.
+# Input: an array of rows, the label of each row, and the number of labels (rows, labels, k)
+# Output: a list of k arrays, the rows with each label (groups)
+def groupByLabel(rows, labels, k):
+    order = np.argsort(labels, kind='mergesort')
+    bounds = np.searchsorted(labels[order], np.arange(k + 1))
+    sortedRows = np.asarray(rows)[order]
+    groups = [sortedRows[bounds[i]:bounds[i + 1]] for i in range(k)]
+    return groups
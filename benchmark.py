@@ -0,0 +1,221 @@
+# benchmark.py
+# by Zach Levonian and Freddy Stein
+# Benchmarks the clustering and ingestion code on synthetic authors (see
+# syntheticAuthors.py), since the real dataset isn't included. For each scale it times
+# every phase of runCURE, the preliminary kMeans on its own, and the pickleCreator
+# ingestion path, records the peak memory and how well the known clusters were found,
+# and writes the results to a JSON file per scale. Runs are seeded, so results files
+# from two versions of the code can be compared to catch regressions.
+# Usage: pypy benchmark.py [scale ...]          (scales: 10k, 100k, 1m, 10m)
+#        pypy benchmark.py compare old.json new.json
+
+import sys, os, time, json, shutil, platform, tempfile
+import numpy as np
+import cure, pickleCreator
+from cure import *
+from syntheticAuthors import *
+
+# The number of authors in each benchmark scale
+SCALES = dict([('10k', 10000), ('100k', 100000), ('1m', 1000000), ('10m', 10000000)])
+
+# Number of ground-truth clusters in the synthetic data, and the clusters CURE looks for
+BENCHMARK_CLUSTERS = 8
+BENCHMARK_PRELIM_K = 32
+
+# Seed for the synthetic data and for the clustering
+BENCHMARK_SEED = 0
+
+# Number of processes used to assign the remaining data
+BENCHMARK_WORKERS = 1
+
+# The ingestion path is benchmarked on at most this many of the authors, as the CSV
+# files for the larger scales would take up a great deal of disk
+INGEST_MAX_AUTHORS = 100000
+
+# Where the results files are written
+RESULTS_DIR = "benchmarkResults"
+
+# Timings more than this factor slower than in the old results are flagged by compare
+REGRESSION_FACTOR = 1.2
+
+# Runs the benchmarks at one scale.
+# Input: the name of the scale (scale)
+# Output: a dictionary of the results (results)
+def runBenchmark(scale):
+    numAuthors = SCALES[scale]
+    results = dict([])
+    results['scale'] = scale
+    results['numAuthors'] = numAuthors
+    results['parameters'] = dict([('clusters', BENCHMARK_CLUSTERS), ('prelimK', BENCHMARK_PRELIM_K), \
+                                  ('seed', BENCHMARK_SEED), ('workers', BENCHMARK_WORKERS)])
+    results['environment'] = getEnvironment()
+    print "Generating " + str(numAuthors) + " synthetic authors."
+    start = time.time()
+    authors, trueLabels = generateAuthors(numAuthors, BENCHMARK_CLUSTERS, BENCHMARK_SEED)
+    results['generateSeconds'] = time.time() - start
+    print "Benchmarking runCURE."
+    results['cure'] = benchmarkCURE(authors, trueLabels)
+    print "Benchmarking kMeans."
+    results['kMeans'] = benchmarkKMeans(authors)
+    print "Benchmarking ingestion."
+    ingestAuthors = authors.take(np.arange(min(numAuthors, INGEST_MAX_AUTHORS)))
+    results['ingestion'] = benchmarkIngestion(ingestAuthors)
+    results['peakMemoryKB'] = getPeakMemory()
+    return results
+
+# Times each phase of a seeded runCURE and scores the clusters against the truth. The
+# merge distance cap is turned off so the clusters are merged down to BENCHMARK_CLUSTERS,
+# as the accuracy figures compare against that many true clusters.
+# Input: the AuthorMatrix of authors, and their true clusters (authors, trueLabels)
+# Output: a dictionary of the run report, throughput and accuracy (results)
+def benchmarkCURE(authors, trueLabels):
+    cure.CLUSTERING_SEED = BENCHMARK_SEED
+    cure.CLUSTER_MERGE_DISTANCE = None
+    profiler = RunProfiler(quiet=True)
+    start = time.time()
+    clusters, outliers = runCURE(authors, BENCHMARK_CLUSTERS, BENCHMARK_WORKERS, \
+                                 prelimK=BENCHMARK_PRELIM_K, profiler=profiler)
+    seconds = time.time() - start
+    if len(clusters) != BENCHMARK_CLUSTERS:
+        raise ValueError("runCURE returned " + str(len(clusters)) + " clusters, not " + str(BENCHMARK_CLUSTERS))
+    labels, centers = getClusterLabels(clusters, len(authors))
+    results = dict([])
+    results['seconds'] = seconds
+    results['authorsPerSecond'] = len(authors) / seconds
+    results['phases'] = dict([(phase['name'], phase) for phase in profiler.getReport()['phases']])
+    results['adjustedRandIndex'] = getAdjustedRandIndex(labels, trueLabels)
+    results['purity'] = getPurity(labels, trueLabels)
+    results['numClusters'] = len(clusters)
+    return results
+
+# Times the preliminary kMeans by itself, on the same sample runCURE would use.
+# Input: the AuthorMatrix of authors (authors)
+# Output: a dictionary of the timing and number of passes (results)
+def benchmarkKMeans(authors):
+    cure.CLUSTERING_SEED = BENCHMARK_SEED
+    standardized = standardizeAuthors(authors)
+    sample = standardized.take(chooseSampleRows(standardized, getSampleSize(len(standardized))))
+    start = time.time()
+    initialCenters = chooseInitialCenters(BENCHMARK_PRELIM_K, sample, INITIAL_CENTERS_STRATEGY, BENCHMARK_SEED)
+    seedSeconds = time.time() - start
+    clusters, centers, iterations = lloydKMeans(sample.data, initialCenters, KMEANS_TOLERANCE, \
+                                                KMEANS_MAX_ITERATIONS, KMEANS_MAX_SHIFTS)
+    results = dict([])
+    results['seconds'] = time.time() - start
+    results['seedSeconds'] = seedSeconds
+    results['iterations'] = iterations
+    results['sampleSize'] = len(sample)
+    return results
+
+# Times the pickleCreator ingestion path on CSV files written for the given authors,
+# and checks the features read back match them.
+# Input: the AuthorMatrix of authors (authors)
+# Output: a dictionary of the timings of each step (results)
+def benchmarkIngestion(authors):
+    workDir = tempfile.mkdtemp(prefix="cureBenchmark")
+    oldDir = os.getcwd()
+    oldLimits = pickleCreator.PAPERAUTHOR_NUM, pickleCreator.PAPER_NUM
+    profiler = RunProfiler(quiet=True)
+    try:
+        with profiler.phase("writeDataFiles"):
+            numPapers = writeDataFiles(authors, os.path.join(workDir, "dataRev2"), BENCHMARK_SEED)
+        os.chdir(workDir)
+        pickleCreator.PAPERAUTHOR_NUM = pickleCreator.PAPER_NUM = numPapers
+        with profiler.phase("getAuthors"):
+            authorDict = pickleCreator.getAuthors()
+        with profiler.phase("readPaperAuthor"):
+            papers, authorDict = pickleCreator.readPaperAuthor(authorDict)
+        with profiler.phase("getPaperInfo"):
+            papers = pickleCreator.getPaperInfo(papers)
+        with profiler.phase("recomputeAuthors"):
+            authorDict = pickleCreator.recomputeAuthors(authorDict, papers)
+        with profiler.phase("createAuthorFile"):
+            pickleCreator.createAuthorFile(authorDict, "authors.bin")
+        ingested = loadAuthorFile("authors.bin")
+        order = np.argsort(ingested.ids)
+        matches = np.array_equal(ingested.ids[order], authors.ids) and \
+                  np.array_equal(ingested.data[order], authors.data)
+    finally:
+        os.chdir(oldDir)
+        pickleCreator.PAPERAUTHOR_NUM, pickleCreator.PAPER_NUM = oldLimits
+        shutil.rmtree(workDir)
+    results = dict([])
+    results['numAuthors'] = len(authors)
+    results['numPapers'] = numPapers
+    results['phases'] = dict([(phase['name'], phase) for phase in profiler.getReport()['phases']])
+    results['seconds'] = sum([phase['wallSeconds'] for phase in profiler.phases \
+                              if phase['name'] != "writeDataFiles"])
+    results['featuresMatch'] = bool(matches)
+    return results
+
+# Describes the machine and library versions the benchmarks ran with.
+# Input: none
+# Output: a dictionary describing the environment (environment)
+def getEnvironment():
+    environment = dict([])
+    environment['python'] = platform.python_version()
+    environment['implementation'] = platform.python_implementation()
+    environment['numpy'] = np.__version__
+    environment['platform'] = platform.platform()
+    environment['cpus'] = multiprocessing.cpu_count()
+    return environment
+
+# Writes the results of one scale to RESULTS_DIR.
+# Input: the dictionary of results (results)
+# Output: the name of the file written (fileName)
+def writeResults(results):
+    if not os.path.isdir(RESULTS_DIR):
+        os.makedirs(RESULTS_DIR)
+    fileName = os.path.join(RESULTS_DIR, "benchmark-" + results['scale'] + ".json")
+    with open(fileName, "w") as outFile:
+        json.dump(toJSONValue(results), outFile, indent=2, sort_keys=True)
+    return fileName
+
+# Finds every timing in a results dictionary.
+# Input: the results, and the name of the enclosing entry (results, prefix)
+# Output: a dictionary of dotted timing name -> seconds (timings)
+def getTimings(results, prefix=""):
+    timings = dict([])
+    for key in results:
+        name = prefix + key
+        if isinstance(results[key], dict):
+            timings.update(getTimings(results[key], name + "."))
+        elif key in ["seconds", "wallSeconds", "generateSeconds", "seedSeconds"]:
+            timings[name] = results[key]
+    return timings
+
+# Compares two results files of the same scale, printing the ratio of every timing and
+# of the peak memory, and flagging those more than REGRESSION_FACTOR worse.
+# Input: the names of the old and new results files (oldName, newName)
+# Output: the number of regressions found (numRegressions)
+def compareResults(oldName, newName):
+    old, new = json.load(open(oldName)), json.load(open(newName))
+    oldTimings, newTimings = getTimings(old), getTimings(new)
+    oldTimings['peakMemoryKB'], newTimings['peakMemoryKB'] = old['peakMemoryKB'], new['peakMemoryKB']
+    numRegressions = 0
+    for name in sorted(set(oldTimings) & set(newTimings)):
+        ratio = newTimings[name] / max(oldTimings[name], 1e-9)
+        flag = ""
+        if ratio > REGRESSION_FACTOR and newTimings[name] - oldTimings[name] > 0.01:
+            flag = "  <-- REGRESSION"
+            numRegressions += 1
+        print "%-60s %12.4f %12.4f %7.2fx%s" % (name, oldTimings[name], newTimings[name], ratio, flag)
+    for name in ["adjustedRandIndex", "purity"]:
+        print "%-60s %12.4f %12.4f" % ("cure." + name, old['cure'][name], new['cure'][name])
+    print str(numRegressions) + " regressions found."
+    return numRegressions
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "compare":
+        sys.exit(1 if compareResults(sys.argv[2], sys.argv[3]) > 0 else 0)
+    scales = sys.argv[1:] if len(sys.argv) > 1 else ["10k"]
+    for scale in scales:
+        if scale not in SCALES:
+            print "Unknown scale " + scale + "; choose from " + ", ".join(sorted(SCALES.keys()))
+            return
+    for scale in scales:
+        results = runBenchmark(scale)
+        print "Results written to " + writeResults(results) + "."
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+# checkEquivalence.py
+# by Zach Levonian and Freddy Stein
+# Checks, on seeded synthetic authors (see syntheticAuthors.py), that the faster code
+# paths give the same answers as the simple ones they replaced: the KD-tree rep index
+# agrees with the brute-force one, the heap-based mergeCloseClusters merges the same
+# clusters as a naive search for the closest pair, and assigning the remaining data
+# with a pool of worker processes gives the same labels as assigning it serially.
+# Each check prints PASS or FAIL, and the exit status is the number that failed.
+# Usage: pypy checkEquivalence.py [seed]
+
+import sys
+import numpy as np
+import cure
+from cure import *
+from syntheticAuthors import *
+
+# Number of synthetic authors, the clusters they are drawn from, and the number of
+# preliminary clusters the checks merge down from
+CHECK_AUTHORS = 5000
+CHECK_CLUSTERS = 6
+CHECK_PRELIM_K = 30
+
+# Seed for the synthetic data and for the clustering, unless one is given
+CHECK_SEED = 0
+
+# Number of processes the parallel assignment is checked with
+CHECK_WORKERS = 2
+
+# Number of random replacements made to the rep indexes before they are compared again
+CHECK_INDEX_UPDATES = 20
+
+# Runs every check.
+# Input: the seed (seed)
+# Output: the number of checks that failed (failures)
+def runChecks(seed):
+    authors, trueLabels = generateAuthors(CHECK_AUTHORS, CHECK_CLUSTERS, seed)
+    authors = standardizeAuthors(authors)
+    oldSeed, oldDistance = cure.CLUSTERING_SEED, cure.CLUSTER_MERGE_DISTANCE
+    cure.CLUSTERING_SEED = seed
+    cure.CLUSTER_MERGE_DISTANCE = None # The naive merge only stops at a cluster count
+    try:
+        failures = 0
+        failures += report("kdtree and brute rep indexes agree", checkRepIndexes(authors, seed))
+        failures += report("heap merge matches naive closest-pair merge", checkHeapMerge(authors))
+        failures += report("parallel and serial assignment agree", checkParallelAssign(authors))
+    finally:
+        cure.CLUSTERING_SEED, cure.CLUSTER_MERGE_DISTANCE = oldSeed, oldDistance
+    return failures
+
+# Prints the outcome of one check.
+# Input: the name of the check, and whether it passed (name, passed)
+# Output: 1 if it failed, 0 if it passed (failed)
+def report(name, passed):
+    print ("PASS" if passed else "FAIL") + ": " + name
+    return 0 if passed else 1
+
+# Builds the preliminary CURE clusters, with their representative points, that the
+# checks start from. The same seed always gives the same clusters.
+# Input: the standardized AuthorMatrix of authors (authors)
+# Output: the list of CureClusters (clusters)
+def buildCheckClusters(authors):
+    prelimClusters, centers, sampleRows = prelimClustering(CHECK_PRELIM_K, authors, SILENT_PROFILER)
+    clusters = buildCureClusters(prelimClusters, centers, authors, len(centers), sampleRows)
+    return generateRepresentativePoints(clusters, SILENT_PROFILER)
+
+# Compares the nearest reps found by two indexes. Where the labels differ, the
+# distances must be tied.
+# Input: the two indexes, and the points to query (index, reference, points)
+# Output: whether they agree (agree)
+def nearestAgree(index, reference, points):
+    dists, labels = index.nearest(points)
+    refDists, refLabels = reference.nearest(points)
+    if not np.allclose(dists, refDists):
+        return False
+    differ = labels != refLabels
+    return np.allclose(dists[differ], refDists[differ], rtol=0, atol=1e-12)
+
+# Compares the closest cluster found by two indexes for every cluster.
+# Input: the two indexes, and the labels of the clusters (index, reference, labels)
+# Output: whether they agree (agree)
+def closestAgree(index, reference, labels):
+    for label in labels:
+        closest, dist = index.closestCluster(label)
+        refClosest, refDist = reference.closestCluster(label)
+        if not np.isclose(dist, refDist):
+            return False
+        if closest != refClosest and not np.isclose(index.clusterDistance(label, refClosest), dist):
+            return False
+    return True
+
+# Checks that the KD-tree index answers nearest-rep and closest-cluster queries like
+# the brute-force index, both when freshly built and after clusters have been
+# replaced and removed, as they are while merging.
+# Input: the standardized AuthorMatrix of authors, and the seed (authors, seed)
+# Output: whether the indexes agree (agree)
+def checkRepIndexes(authors, seed):
+    clusters = buildCheckClusters(authors)
+    tree = buildClusterRepIndex(clusters, "kdtree")
+    brute = buildClusterRepIndex(clusters, "brute")
+    clusterReps = dict([(cluster.id, cluster.repPoints) for cluster in clusters])
+    labels = sorted(clusterReps.keys())
+    randomState = np.random.RandomState(seed)
+    points = authors.data[np.sort(randomState.choice(len(authors), min(1000, len(authors)), replace=False))]
+    if not nearestAgree(tree, brute, points) or not closestAgree(tree, brute, labels):
+        return False
+    for i in range(CHECK_INDEX_UPDATES):
+        if len(labels) < 3:
+            break
+        label = labels[randomState.randint(len(labels))]
+        if i % 2 == 0:
+            reps = clusterReps[label] + randomState.normal(0, 0.01, clusterReps[label].shape)
+            tree.setCluster(label, reps)
+            brute.setCluster(label, reps)
+        else:
+            tree.removeCluster(label)
+            brute.removeCluster(label)
+            labels.remove(label)
+        if not nearestAgree(tree, brute, points) or not closestAgree(tree, brute, labels):
+            return False
+    return True
+
+# Merges clusters the slow way: each step searches every pair for the closest two
+# and merges them, the one with the lower id absorbing the other, as the heap does.
+# Input: the list of clusters, and the number of clusters to stop at (clusters, targetCount)
+# Output: the list of merged clusters (clusters)
+def naiveMergeCloseClusters(clusters, targetCount):
+    remaining = list(clusters)
+    while len(remaining) > targetCount:
+        best = None
+        for i in range(len(remaining)):
+            for j in range(i + 1, len(remaining)):
+                dist = getClosestClusterDist(remaining[i], remaining[j])
+                pair = (dist, min(remaining[i].id, remaining[j].id), i, j)
+                if best is None or pair[:2] < best[:2]:
+                    best = pair
+        dist, survivorId, i, j = best
+        if remaining[i].id != survivorId:
+            i, j = j, i
+        remaining[i].mergeWithCluster(remaining[j])
+        del remaining[j]
+    return remaining
+
+# Describes a clustering by the sorted rows of each cluster, whatever the cluster ids.
+# Input: the list of clusters (clusters)
+# Output: a sorted list of tuples of rows (partition)
+def getPartition(clusters):
+    return sorted([tuple(sorted(cluster.rows)) for cluster in clusters])
+
+# Checks that mergeCloseClusters, with either kind of rep index, merges the
+# preliminary clusters into the same clusters as the naive closest-pair merge.
+# Input: the standardized AuthorMatrix of authors (authors)
+# Output: whether the merges agree (agree)
+def checkHeapMerge(authors):
+    expected = getPartition(naiveMergeCloseClusters(buildCheckClusters(authors), CHECK_CLUSTERS))
+    oldKind = cure.REP_INDEX_KIND
+    try:
+        for kind in INDEX_KINDS:
+            cure.REP_INDEX_KIND = kind
+            merged = mergeCloseClusters(buildCheckClusters(authors), CHECK_CLUSTERS)
+            if getPartition(merged) != expected:
+                return False
+    finally:
+        cure.REP_INDEX_KIND = oldKind
+    return True
+
+# Checks that the remaining data gets the same labels from a pool of worker processes
+# as from this process, with either kind of rep index, directly and through runCURE.
+# Input: the standardized AuthorMatrix of authors (authors)
+# Output: whether the labels agree (agree)
+def checkParallelAssign(authors):
+    clusters = mergeCloseClusters(buildCheckClusters(authors), CHECK_CLUSTERS)
+    reps, repLabels = buildRepMatrix(clusters)
+    rows = np.arange(len(authors))
+    for kind in INDEX_KINDS:
+        serial = getNearestRepLabels(authors.data, rows, buildRepIndex(reps, repLabels, kind))
+        parallel = getNearestRepLabelsParallel(authors.data, rows, reps, repLabels, CHECK_WORKERS, \
+                                               indexKind=kind)
+        if not np.array_equal(serial, parallel):
+            return False
+    serialClusters = runCURE(authors, CHECK_CLUSTERS, prelimK=CHECK_PRELIM_K, profiler=SILENT_PROFILER, \
+                             standardized=True)[0]
+    parallelClusters = runCURE(authors, CHECK_CLUSTERS, workers=CHECK_WORKERS, prelimK=CHECK_PRELIM_K, \
+                               profiler=SILENT_PROFILER, standardized=True)[0]
+    return getPartition(serialClusters) == getPartition(parallelClusters)
+
+def main():
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else CHECK_SEED
+    sys.exit(runChecks(seed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# checkpoint.py
+# by Zach Levonian and Freddy Stein
+# Checkpoints for long CURE runs. After each phase, runCURE hands the state the later
+# phases need (the sample rows, the preliminary labels and centers, or the clusters
+# with their representative points) to a RunCheckpoint, which writes it to a .npz file
+# in the checkpoint directory; while assigning the remaining data, the labels of each
+# block of rows are written to a file of their own. Every file is written under a
+# temporary name and then renamed, so an interrupted write never leaves a half-written
+# checkpoint. A resumed run continues after the last phase checkpointed and skips the
+# blocks already labeled. When checkpointing is off, runCURE uses NULL_CHECKPOINT,
+# whose methods do nothing.
+# Convenience functions; intended to be used via import
+
+import os, json, hashlib
+import numpy as np
+
+CHECKPOINT_VERSION = 1
+
+# Names of the files written to the checkpoint directory
+SETTINGS_FILENAME = "settings.json"
+PHASE_FORMAT = "phase-%s.npz"
+BLOCK_FORMAT = "assign-%05d.npy"
+
+# Number of evenly spaced rows the data fingerprint hashes in full
+FINGERPRINT_ROWS = 1000
+
+# Saves and loads nothing; used when no checkpoint is given.
+class NullCheckpoint(object):
+    enabled = False
+
+    def start(self, settings):
+        pass
+
+    def getLastPhase(self, phases):
+        return None
+
+    def save(self, phase, arrays):
+        pass
+
+    def load(self, phase):
+        return None
+
+    def saveBlock(self, block, labels):
+        pass
+
+    def loadBlock(self, block):
+        return None
+
+NULL_CHECKPOINT = NullCheckpoint()
+
+# Writes the state of a run to a checkpoint directory, and reads it back when resuming.
+# A run that doesn't resume starts by deleting the checkpoints of any earlier run.
+class RunCheckpoint(object):
+    enabled = True
+
+    def __init__(self, directory, resume=False):
+        self.directory = directory
+        self.resume = resume
+
+    # Prepares the directory for a run with the given settings (a dictionary of plain
+    # values, such as k). A resumed run must have the same settings as the one it resumes.
+    def start(self, settings):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        settings = dict([('version', CHECKPOINT_VERSION)] + settings.items())
+        settingsFile = os.path.join(self.directory, SETTINGS_FILENAME)
+        if self.resume and os.path.exists(settingsFile):
+            stored = json.load(open(settingsFile))
+            if stored != settings:
+                raise ValueError(self.directory + " holds the checkpoints of a run with different settings: " + \
+                                 str(stored))
+            return
+        for fileName in os.listdir(self.directory):
+            if fileName.startswith("phase-") or fileName.startswith("assign-"):
+                os.remove(os.path.join(self.directory, fileName))
+        writeAtomically(settingsFile, lambda outFile: json.dump(settings, outFile, sort_keys=True))
+
+    # Finds the last of the given phases (in run order) with a checkpoint, or None
+    def getLastPhase(self, phases):
+        if not self.resume:
+            return None
+        for phase in reversed(phases):
+            if os.path.exists(self.getPhaseFile(phase)):
+                return phase
+        return None
+
+    # Writes the state after a phase, a dictionary of name -> array
+    def save(self, phase, arrays):
+        writeAtomically(self.getPhaseFile(phase), lambda outFile: np.savez(outFile, **arrays))
+
+    # Reads the state written after a phase, or None if there is none
+    def load(self, phase):
+        if not os.path.exists(self.getPhaseFile(phase)):
+            return None
+        with np.load(self.getPhaseFile(phase)) as stored:
+            arrays = dict([(name, stored[name]) for name in stored.files])
+        return arrays
+
+    # Writes the labels of one block of the assigned rows
+    def saveBlock(self, block, labels):
+        writeAtomically(self.getBlockFile(block), lambda outFile: np.save(outFile, labels))
+
+    # Reads the labels of one block of the assigned rows, or None if it hasn't been labeled
+    def loadBlock(self, block):
+        if not self.resume or not os.path.exists(self.getBlockFile(block)):
+            return None
+        return np.load(self.getBlockFile(block))
+
+    def getPhaseFile(self, phase):
+        return os.path.join(self.directory, PHASE_FORMAT % phase)
+
+    def getBlockFile(self, block):
+        return os.path.join(self.directory, BLOCK_FORMAT % block)
+
+####
+
+# Fingerprints a data matrix cheaply, so a resumed run can tell it has the same data:
+# hashes the ids and features of FINGERPRINT_ROWS evenly spaced rows, and the sum of
+# each feature over every row.
+# Input: the ids and the data matrix (ids, data)
+# Output: the hex digest (fingerprint)
+def getDataFingerprint(ids, data):
+    rows = np.unique(np.linspace(0, len(ids) - 1, min(len(ids), FINGERPRINT_ROWS)).astype(np.int64))
+    digest = hashlib.md5()
+    digest.update(np.ascontiguousarray(np.asarray(ids)[rows], dtype=np.int64).tostring())
+    digest.update(np.ascontiguousarray(np.asarray(data)[rows], dtype=np.float64).tostring())
+    digest.update(np.asarray(data, dtype=np.float64).sum(axis=0).tostring())
+    return digest.hexdigest()
+
+# Writes a file under a temporary name and then renames it, so readers only ever see
+# the old file or the complete new one.
+# Input: the name of the file, and a function that writes to an open file (fileName, write)
+# Output: None
+def writeAtomically(fileName, write):
+    tempName = fileName + ".tmp"
+    with open(tempName, "wb") as outFile:
+        write(outFile)
+        outFile.flush()
+        os.fsync(outFile.fileno())
+    os.rename(tempName, fileName)
@@ -0,0 +1,198 @@
+# clusterMetrics.py
+# by Zach Levonian and Freddy Stein
+# Measures the quality of a clustering from the feature matrix, the cluster label of
+# each row (-1 for rows in no cluster, such as pruned outliers) and the cluster centers:
+# per-cluster L1 and squared error, inertia, the distribution of cluster sizes, and
+# sampled silhouette and Davies-Bouldin scores. Every pass works chunkSize rows at a
+# time, so the metrics are cheap enough to compute after every run. When the true
+# clusters are known, as for synthetic data, the adjusted Rand index and purity
+# compare a clustering to them.
+# Convenience functions; intended to be used via import
+
+import numpy as np
+from authorMatrix import *
+
+# Number of labeled rows the silhouette score is computed over
+SILHOUETTE_SAMPLE_SIZE = 2000
+
+# Computes every metric below for a clustering.
+# Input: the feature matrix, the cluster of each row, the (k, d) cluster centers, the
+#        silhouette sample size, a seed or numpy RandomState for the sample, and the
+#        chunk size (data, labels, centers, sampleSize, seed, chunkSize)
+# Output: a dictionary of metric name -> value (metrics)
+def computeClusterMetrics(data, labels, centers, sampleSize=SILHOUETTE_SAMPLE_SIZE, seed=None, \
+                          chunkSize=DEFAULT_CHUNK_SIZE):
+    l1Errors, squaredErrors = getClusterErrors(data, labels, centers, chunkSize)
+    sizes = getClusterSizes(labels, len(centers))
+    metrics = dict([])
+    metrics['l1Errors'] = l1Errors
+    metrics['squaredErrors'] = squaredErrors
+    metrics['totalL1Error'] = l1Errors.sum()
+    metrics['inertia'] = squaredErrors.sum()
+    metrics['sizes'] = sizes
+    metrics['sizeSummary'] = getSizeSummary(sizes)
+    metrics['unlabeled'] = int(np.count_nonzero(np.asarray(labels) < 0))
+    metrics['silhouette'] = getSilhouetteScore(data, labels, sampleSize, seed, chunkSize)
+    metrics['daviesBouldin'] = getDaviesBouldinScore(data, labels, centers, chunkSize)
+    return metrics
+
+# Gets the labels and centers of a list of clusters, for the metrics.
+# Input: the list of CureClusters, and the number of rows in their matrix (clusters, numRows)
+# Output: the index (in clusters) of the cluster of each row, or -1 for rows in none of
+#         them, and the (k, d) array of cluster centers (labels, centers)
+def getClusterLabels(clusters, numRows):
+    labels = np.empty(numRows, dtype=np.intp)
+    labels.fill(-1)
+    for i in range(len(clusters)):
+        labels[np.asarray(clusters[i].rows, dtype=np.intp)] = i
+    centers = np.vstack([np.empty((0, NUM_FEATURES))] + [cluster.center for cluster in clusters])
+    return labels, centers
+
+# Finds the total L1 (sum of absolute differences) and squared euclidean distance from
+# the rows of each cluster to its center.
+# Input: the feature matrix, the cluster of each row, the cluster centers, and the
+#        chunk size (data, labels, centers, chunkSize)
+# Output: the L1 error and the squared error of each cluster (l1Errors, squaredErrors)
+def getClusterErrors(data, labels, centers, chunkSize=DEFAULT_CHUNK_SIZE):
+    centers = np.asarray(centers, dtype=np.float64)
+    l1Errors = np.zeros(len(centers))
+    squaredErrors = np.zeros(len(centers))
+    for start in range(0, len(data), chunkSize):
+        chunkLabels = np.asarray(labels[start:start + chunkSize])
+        labeled = chunkLabels >= 0
+        chunkLabels = chunkLabels[labeled]
+        diffs = np.abs(np.asarray(data[start:start + chunkSize])[labeled] - centers[chunkLabels])
+        l1Errors += np.bincount(chunkLabels, diffs.sum(axis=1), len(centers))
+        squaredErrors += np.bincount(chunkLabels, (diffs**2).sum(axis=1), len(centers))
+    return l1Errors, squaredErrors
+
+# Counts the rows in each cluster.
+# Input: the cluster of each row, and the number of clusters (labels, k)
+# Output: the size of each cluster (sizes)
+def getClusterSizes(labels, k):
+    labels = np.asarray(labels)
+    return np.bincount(labels[labels >= 0], minlength=k)
+
+# Summarizes the distribution of cluster sizes.
+# Input: the size of each cluster (sizes)
+# Output: a dictionary of the smallest, largest, mean and median size, and the
+#         fraction of the rows in the largest cluster (summary)
+def getSizeSummary(sizes):
+    summary = dict([])
+    if len(sizes) == 0:
+        return summary
+    summary['min'] = int(sizes.min())
+    summary['max'] = int(sizes.max())
+    summary['mean'] = float(sizes.mean())
+    summary['median'] = float(np.median(sizes))
+    summary['largestFraction'] = float(sizes.max()) / max(sizes.sum(), 1)
+    return summary
+
+# Computes the mean silhouette coefficient over a uniform sample of the labeled rows.
+# For a row, a is the mean distance to the other sampled rows of its cluster and b the
+# smallest mean distance to the sampled rows of another cluster; its silhouette is
+# (b - a) / max(a, b), or 0 if it is alone in its cluster within the sample.
+# Input: the feature matrix, the cluster of each row, the sample size, a seed or numpy
+#        RandomState, and the chunk size (data, labels, sampleSize, seed, chunkSize)
+# Output: the mean silhouette, between -1 and 1, or None with fewer than 2 clusters
+#         in the sample (score)
+def getSilhouetteScore(data, labels, sampleSize=SILHOUETTE_SAMPLE_SIZE, seed=None, \
+                       chunkSize=DEFAULT_CHUNK_SIZE):
+    randomState = seed if isinstance(seed, np.random.RandomState) else np.random.RandomState(seed)
+    labeledRows = np.flatnonzero(np.asarray(labels) >= 0)
+    if len(labeledRows) > sampleSize:
+        labeledRows = np.sort(randomState.choice(labeledRows, sampleSize, replace=False))
+    sampleLabels = np.unique(np.asarray(labels)[labeledRows], return_inverse=True)[1]
+    numClusters = sampleLabels.max() + 1 if len(sampleLabels) > 0 else 0
+    if numClusters < 2:
+        return None
+    points = np.asarray(data[labeledRows], dtype=np.float64)
+    counts = np.bincount(sampleLabels, minlength=numClusters).astype(np.float64)
+    membership = np.zeros((len(points), numClusters))
+    membership[np.arange(len(points)), sampleLabels] = 1.0
+    scores = np.empty(len(points))
+    for start in range(0, len(points), chunkSize):
+        chunkLabels = sampleLabels[start:start + chunkSize]
+        rowIds = np.arange(len(chunkLabels))
+        clusterSums = np.sqrt(getEucSquaredDistances(points[start:start + chunkSize], points)).dot(membership)
+        ownCounts = counts[chunkLabels] - 1
+        a = clusterSums[rowIds, chunkLabels] / np.maximum(ownCounts, 1)
+        means = clusterSums / counts
+        means[rowIds, chunkLabels] = np.inf
+        b = means.min(axis=1)
+        chunkScores = (b - a) / np.maximum(np.maximum(a, b), 1e-300)
+        chunkScores[ownCounts == 0] = 0.0
+        scores[start:start + chunkSize] = chunkScores
+    return float(scores.mean())
+
+# Computes the Davies-Bouldin index: the mean, over the clusters, of the largest
+# (s_i + s_j) / d(c_i, c_j) over the other clusters j, where s is the mean euclidean
+# distance from a cluster's rows to its center. Lower is better; empty clusters are
+# left out.
+# Input: the feature matrix, the cluster of each row, the cluster centers, and the
+#        chunk size (data, labels, centers, chunkSize)
+# Output: the Davies-Bouldin index, or None with fewer than 2 non-empty clusters (score)
+def getDaviesBouldinScore(data, labels, centers, chunkSize=DEFAULT_CHUNK_SIZE):
+    centers = np.asarray(centers, dtype=np.float64)
+    spreads = np.zeros(len(centers))
+    for start in range(0, len(data), chunkSize):
+        chunkLabels = np.asarray(labels[start:start + chunkSize])
+        labeled = chunkLabels >= 0
+        chunkLabels = chunkLabels[labeled]
+        diffs = np.asarray(data[start:start + chunkSize])[labeled] - centers[chunkLabels]
+        spreads += np.bincount(chunkLabels, np.sqrt((diffs**2).sum(axis=1)), len(centers))
+    sizes = getClusterSizes(labels, len(centers))
+    present = sizes > 0
+    if np.count_nonzero(present) < 2:
+        return None
+    spreads = spreads[present] / sizes[present]
+    centerDists = np.sqrt(getEucSquaredDistances(centers[present], centers[present]))
+    ratios = (spreads[:, np.newaxis] + spreads[np.newaxis, :]) / np.maximum(centerDists, 1e-300)
+    np.fill_diagonal(ratios, -np.inf)
+    return float(ratios.max(axis=1).mean())
+
+# Compares a clustering to known (ground-truth) clusters with the adjusted Rand index:
+# 1 for identical clusterings, around 0 for a random one. Rows labeled -1 in either
+# clustering are left out.
+# Input: the cluster of each row, and the true cluster of each row (labels, trueLabels)
+# Output: the adjusted Rand index (score)
+def getAdjustedRandIndex(labels, trueLabels):
+    labels, trueLabels = np.asarray(labels), np.asarray(trueLabels)
+    both = (labels >= 0) & (trueLabels >= 0)
+    labels = np.unique(labels[both], return_inverse=True)[1]
+    trueLabels = np.unique(trueLabels[both], return_inverse=True)[1]
+    if len(labels) < 2:
+        return 1.0
+    table = np.bincount(labels * (trueLabels.max() + 1) + trueLabels, \
+                        minlength=(labels.max() + 1) * (trueLabels.max() + 1)).astype(np.float64)
+    index = countPairs(table)
+    rowPairs = countPairs(np.bincount(labels).astype(np.float64))
+    colPairs = countPairs(np.bincount(trueLabels).astype(np.float64))
+    expected = rowPairs * colPairs / countPairs(np.array([float(len(labels))]))
+    maximum = (rowPairs + colPairs) / 2.0
+    if maximum == expected:
+        return 1.0
+    return float((index - expected) / (maximum - expected))
+
+# Helper function for getAdjustedRandIndex()
+# Counts the pairs that can be drawn from groups of the given sizes.
+# Input: the size of each group (counts)
+# Output: the total number of pairs within the groups (numPairs)
+def countPairs(counts):
+    return (counts * (counts - 1) / 2.0).sum()
+
+# Computes the purity of a clustering against known clusters: the fraction of rows
+# whose cluster's most common true cluster is their own. Rows labeled -1 in either
+# clustering are left out.
+# Input: the cluster of each row, and the true cluster of each row (labels, trueLabels)
+# Output: the purity, between 0 and 1 (purity)
+def getPurity(labels, trueLabels):
+    labels, trueLabels = np.asarray(labels), np.asarray(trueLabels)
+    both = (labels >= 0) & (trueLabels >= 0)
+    if not both.any():
+        return 1.0
+    labels = np.unique(labels[both], return_inverse=True)[1]
+    trueLabels = np.unique(trueLabels[both], return_inverse=True)[1]
+    numTrue = trueLabels.max() + 1
+    table = np.bincount(labels * numTrue + trueLabels, minlength=(labels.max() + 1) * numTrue)
+    return float(table.reshape(-1, numTrue).max(axis=1).sum()) / len(labels)
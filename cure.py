@@ -3,228 +3,891 @@
 # Written as a final project for CS324 - Data Mining
 # This file loads the pickled author data and creates clusters from it.
 
-import sys, math
+import sys, os, math, time
 from pickleCreator import *
 from kMeansAuthors import *
-import itertools
+from authorMatrix import *
+from parallelAssign import *
+from repIndex import *
+from repSelection import *
+from sampling import *
+from cureModel import *
+from scaler import *
+from clusterMetrics import *
+from instrumentation import *
+from checkpoint import *
+import itertools, heapq, multiprocessing
+import kMeansAuthors
+import numpy as np
 
 # Percentage of the authors to use in the initial clustering
 PRELIM_DATA_PERCENTAGE = 0.15
 
+# How the preliminary sample is drawn: "reservoir" (uniform, one streaming pass),
+# "stratified" (proportionally from quantile strata of SAMPLE_STRATIFY_FEATURE), or
+# "prefix" (the first authors in storage order, as this code used to do)
+SAMPLING_MODE = "reservoir"
+
+# Feature column and number of quantile strata used by the stratified sampling
+SAMPLE_STRATIFY_FEATURE = 0
+SAMPLE_NUM_STRATA = 10
+
+# If set, the sample size comes from the CURE paper's Chernoff bound instead of
+# PRELIM_DATA_PERCENTAGE: the smallest cluster size we care about, the fraction of such
+# a cluster that should land in the sample, and the allowed probability of missing it
+SAMPLE_MIN_CLUSTER_SIZE = None
+SAMPLE_CLUSTER_FRACTION = 0.1
+SAMPLE_FAILURE_PROBABILITY = 0.001
+
+# How the author features are put on comparable scales; one of scaler.SCALER_KINDS
+# ("minmax", our original 0.01-1.01 scaling, "zscore" or "robust")
+SCALER_KIND = "minmax"
+
 # Percentage of each preliminary cluster to use as representative points
 REPRESENTATIVE_POINTS_PERCENTAGE = 0.005
 
 # Percentage of distance towards cluster centroid each representative point should travel
 CENTROID_MIGRATION_PERCENTAGE = 0.20
 
-# Min distance between CURE clusters without merging
-CLUSTER_MERGE_DISTANCE = 0.02
+# The author data to cluster: a columnar author file (see authorFile.py), or else the
+# pickle it was made from. Can also use the authorsSmall files for a faster runtime.
+AUTHORS_FILE = "authorsFull.bin"
+AUTHORS_PICKLE = "authorsFull.p"
+
+# If set, main() profiles the run and writes a JSON run report to this file
+# (see instrumentation.py); None leaves profiling off
+RUN_REPORT_FILE = None
+
+# Where main() saves the fitted model, for labeling new authors later (see cureModel.py)
+CURE_MODEL_FILE = "cureModel.npz"
+
+# If set, main() checkpoints the run to this directory after each phase (see
+# checkpoint.py), and "--resume" continues an interrupted run from it; None leaves
+# checkpointing off
+CHECKPOINT_DIR = None
+
+# Number of remaining authors assigned between checkpoints; with more than one worker,
+# one process pool labels every block
+CHECKPOINT_ASSIGN_ROWS = 1000000
+
+# The checkpointed phases of runCURE, in run order
+CHECKPOINT_PHASES = ["prelimClustering", "representativePoints", "mergeCloseClusters"]
+
+# Seed for the random choices made by the preliminary clustering, so runs can be
+# reproduced; None gives a different run each time
+CLUSTERING_SEED = None
+
+# How the preliminary clustering picks its initial centers; one of SEEDING_STRATEGIES
+# ("farthest", "kmeans++" or "kmeans||"; see chooseInitialCenters)
+INITIAL_CENTERS_STRATEGY = "kmeans++"
+
+# Which kMeans runs the preliminary clustering: "lloyd" (full passes over the sample) or
+# "minibatch" (small random batches, for much larger samples; see miniBatchKMeans)
+PRELIM_KMEANS_MODE = "lloyd"
+
+# Number of sampled authors the "minibatch" mode chooses its initial centers from; the
+# rest of the sample is only ever read a batch at a time
+MINIBATCH_SEEDING_SIZE = 10000
+
+# If True, clusters that stay small are pruned as outliers during the merge phase, in the
+# two passes of the CURE paper (see mergeWithOutlierElimination)
+ELIMINATE_OUTLIERS = False
+
+# First pass: once merging is down to this fraction of the starting number of clusters,
+# clusters with fewer than OUTLIER_MIN_SIZE authors are pruned
+OUTLIER_PRUNE_POINT = 1 / 3.0
+OUTLIER_MIN_SIZE = 3
+
+# Second pass: once merging is down to OUTLIER_FINAL_MULTIPLE * k clusters, clusters
+# holding less than OUTLIER_FINAL_FRACTION of the sampled authors are pruned
+OUTLIER_FINAL_MULTIPLE = 2
+OUTLIER_FINAL_FRACTION = 0.001
+
+# The id of the cluster that collects the pruned authors
+OUTLIER_CLUSTER_ID = -1
+
+# If set, merging also stops once the closest clusters are at least this (squared)
+# distance apart, even with more than k clusters left; our original value was 0.02.
+# None merges all the way down to k, as the final phase of the CURE paper does
+CLUSTER_MERGE_DISTANCE = None
+
+# Number of authors whose nearest representative point is found at once when
+# assigning the remaining data; bounds the size of the distance matrix in memory
+ASSIGN_CHUNK_SIZE = 10000
+
+# Kind of nearest-neighbour index used to search the representative points;
+# one of repIndex.INDEX_KINDS ("kdtree" or "brute")
+REP_INDEX_KIND = "kdtree"
+
+# If True, merging two clusters works from their existing representative points, as in
+# the CURE paper, instead of recomputing them from every author in the merged cluster
+INCREMENTAL_MERGE = True
+
+# How representative points are scattered; one of repSelection.CRITERIA
+# ("maxTotal", our original rule, or "maxMin", the CURE paper's farthest-point rule)
+REP_SELECTION_CRITERION = MAX_TOTAL_DISTANCE
+
+# Clusters larger than this choose their representative points from a random
+# subsample of this many authors, drawn with CLUSTERING_SEED; None always uses every author
+REP_SELECTION_SAMPLE_CAP = None
+
+# If set, each partition of a partitioned run (see partitionedClustering) is pre-clustered
+# down to 1/PARTITION_REDUCTION of its authors, the CURE paper's q; None pre-clusters each
+# partition into as many clusters as the preliminary clustering would use
+PARTITION_REDUCTION = None
+
+# The author data, as seen from inside a worker process (see initAuthorsWorker)
+workerAuthors = dict([])
+
+# Which metric the k sweep picks the best run by: "silhouette" (highest wins) or
+# "daviesBouldin" (lowest wins)
+SWEEP_SCORE = "silhouette"
 
 # This class describes the conceptual clusters used in the CURE algorithm,
 # and contains list to contain the points (Authors) within it as well
-# as the representative points.
-class CureCluster:
-    def __init__(self, id__, center__):
+# as the representative points. Authors are stored as rows of the AuthorMatrix,
+# and the representative points as one array with a row per point. The scatter
+# points are the representative points before they are moved towards the centroid.
+class CureCluster(object):
+    def __init__(self, id__, center__, matrix__):
         self.id = id__
-        self.authors = []
-        self.repPoints = []
-        self.center = center__
+        self.matrix = matrix__
+        self.rows = []
+        self.scatterPoints = np.empty((0, NUM_FEATURES))
+        self.repPoints = np.empty((0, NUM_FEATURES))
+        self.center = np.array(center__, dtype=np.float64)
         
     def __repr__(self):
-        return "Cluster #" + str(self.id) + " Size: " + str(len(self.authors))
+        return "Cluster #" + str(self.id) + " Size: " + str(len(self.rows))
+    
+    # The authors in this cluster, as views into the author matrix
+    @property
+    def authors(self):
+        return [self.matrix.getAuthor(row) for row in self.rows]
         
     def addAuthor(self, user):
-        self.authors.append(user)
+        self.rows.append(user.row)
+    
+    def addRows(self, rows):
+        self.rows.extend(rows)
+    
+    # Returns the feature vectors of this cluster's authors, one row per author
+    def getPoints(self):
+        return self.matrix.data[np.asarray(self.rows, dtype=np.intp)]
     
     # Computes and stores the centroid of this cluster, based on its authors
     def computeCentroid(self):
-        sumPoints = [0 for i in range(6)]
-        for author in self.authors:
-            addToList(sumPoints, author.getData())
-        totalPoints = len(self.authors)
-        average = [ sumPoints[i] / totalPoints for i in range(6)]
-        self.center = average
+        self.center = self.getPoints().mean(axis=0)
     
     # Computes and stores representative points for this cluster, based on its
     # center and the fixed percentage of points to choose.
     def computeRepPoints(self):
-        # Choose the first rep point to be the point furthest point from the "center"
-        farthestAuthor = None
-        farthestDistance = -1
-        for author in self.authors:
-            dist = clustering.getEucSquaredDistance(author.getData(), self.center)
-            if dist > farthestDistance:
-                farthestAuthor = author
-                farthestDistance = dist
-        self.repPoints.append(farthestAuthor.getData())
-        numPointsToChoose = int(math.floor(len(self.authors) * REPRESENTATIVE_POINTS_PERCENTAGE))
-        # Keep adding points that maximize total distance from each other
-        while len(self.repPoints) < numPointsToChoose:
-            farthestAuthor = None
-            farthestTotalDistance = -1
-            for author in self.authors:
-                totalDist = 0
-                for rep in self.repPoints:
-                    totalDist += clustering.getEucSquaredDistance(author.getData(), rep)
-                if totalDist > farthestTotalDistance:
-                    farthestTotalDistance = totalDist
-                    farthestAuthor = author
-            self.repPoints.append(farthestAuthor.getData())
+        self.scatterPoints = chooseScatteredPoints(self.getPoints(), self.center, \
+                                                   getNumRepPoints(len(self.rows)), \
+                                                   getRepSelectionSeed(self.id))
+        self.repPoints = self.scatterPoints.copy()
     
     # Migrates each representative point a fixed percentage towards
     # the centroid of the cluster
     def moveRepPoints(self):
-        for repPoint in self.repPoints:
-            for i in range(len(repPoint)):
-                distToCenter = math.sqrt((repPoint[i] - self.center[i])**2)
-                moveDist = distToCenter * CENTROID_MIGRATION_PERCENTAGE
-                if repPoint[i] < self.center[i]:
-                    repPoint[i] += moveDist
-                elif repPoint[i] > self.center[i]:
-                    repPoint[i] -= moveDist
+        self.repPoints += (self.center - self.repPoints) * CENTROID_MIGRATION_PERCENTAGE
     
     # Merges this cluster with the given clust, recomputing the centroid
-    # and the representative points
-    def mergeWithCluster(self, clust):
-        for author in clust.authors:
-            self.addAuthor(author)
-        self.computeCentroid()
-        self.computeRepPoints()
+    # and the representative points. If a rep index (labeled by cluster id) is
+    # given, this cluster's reps are replaced in it and clust's are removed.
+    # When incremental (the default is INCREMENTAL_MERGE), the new centroid is the
+    # size-weighted mean of the two centroids and the new scatter points are chosen
+    # from the two clusters' scatter points only, so the cost does not depend on the
+    # number of authors.
+    def mergeWithCluster(self, clust, index=None, incremental=None):
+        if incremental is None:
+            incremental = INCREMENTAL_MERGE
+        if incremental:
+            size, otherSize = len(self.rows), len(clust.rows)
+            if size + otherSize > 0:
+                self.center = (size * self.center + otherSize * clust.center) / float(size + otherSize)
+            self.addRows(clust.rows)
+            candidates = np.vstack([self.scatterPoints, clust.scatterPoints])
+            self.scatterPoints = chooseScatteredPoints(candidates, self.center, \
+                                                       getNumRepPoints(len(self.rows)), \
+                                                       getRepSelectionSeed(self.id))
+            self.repPoints = self.scatterPoints.copy()
+        else:
+            self.addRows(clust.rows)
+            self.computeCentroid()
+            self.computeRepPoints()
         self.moveRepPoints()
+        if index is not None:
+            index.removeCluster(clust.id)
+            index.setCluster(self.id, self.repPoints)
+
+# Determines how many representative points a cluster of the given size gets:
+# the fixed percentage of its authors, but always at least one.
+# Input: the number of authors in the cluster (size)
+# Output: the number of representative points to choose (numPoints)
+def getNumRepPoints(size):
+    numPoints = max(1, int(math.floor(size * REPRESENTATIVE_POINTS_PERCENTAGE)))
+    return numPoints
+
+# Chooses well-scattered points from the given candidates, using the configured
+# REP_SELECTION_CRITERION and REP_SELECTION_SAMPLE_CAP (see repSelection.py).
+# Input: the candidate points, the cluster center, how many to choose, and the seed
+#        for the subsample (points, center, numPoints, seed)
+# Output: the array of chosen points, at most one per candidate (chosen)
+def chooseScatteredPoints(points, center, numPoints, seed=None):
+    chosen = selectScatteredPoints(points, center, numPoints, REP_SELECTION_CRITERION, \
+                                   REP_SELECTION_SAMPLE_CAP, seed)
+    return chosen
+
+# Gives each cluster its own seed for subsampling its representative point candidates,
+# so a seeded run is reproduced whatever order the clusters are handled in.
+# Input: the id of the cluster (clusterId)
+# Output: the seed for the cluster, or None for an unseeded run (seed)
+def getRepSelectionSeed(clusterId):
+    if CLUSTERING_SEED is None:
+        return None
+    return [CLUSTERING_SEED, clusterId % 2**32]
+
+# Packs a list of clusters into arrays, for checkpoints; the rows and points of the
+# clusters are concatenated, with the count of each cluster's alongside.
+# Input: the list of CureClusters, and a prefix for the array names (clusters, prefix)
+# Output: a dictionary of name -> array (arrays)
+def clustersToArrays(clusters, prefix="clusters_"):
+    arrays = dict([])
+    arrays[prefix + 'ids'] = np.array([cluster.id for cluster in clusters], dtype=np.int64)
+    arrays[prefix + 'centers'] = np.vstack([np.empty((0, NUM_FEATURES))] + [cluster.center for cluster in clusters])
+    arrays[prefix + 'rows'] = np.concatenate([np.empty(0, dtype=np.int64)] + \
+                                             [np.asarray(cluster.rows, dtype=np.int64) for cluster in clusters])
+    arrays[prefix + 'rowCounts'] = np.array([len(cluster.rows) for cluster in clusters], dtype=np.int64)
+    for name in ['scatterPoints', 'repPoints']:
+        points = [getattr(cluster, name) for cluster in clusters]
+        arrays[prefix + name] = np.vstack([np.empty((0, NUM_FEATURES))] + points)
+        arrays[prefix + name[:-len('Points')] + 'Counts'] = np.array([len(p) for p in points], dtype=np.int64)
+    return arrays
+
+# Unpacks the clusters packed by clustersToArrays().
+# Input: the dictionary of arrays, the AuthorMatrix of authors, and the prefix of the
+#        array names (arrays, authors, prefix)
+# Output: the list of CureClusters (clusters)
+def clustersFromArrays(arrays, authors, prefix="clusters_"):
+    ids, centers = arrays[prefix + 'ids'], arrays[prefix + 'centers']
+    rowGroups = np.split(arrays[prefix + 'rows'], np.cumsum(arrays[prefix + 'rowCounts'])[:-1])
+    scatterGroups = np.split(arrays[prefix + 'scatterPoints'], np.cumsum(arrays[prefix + 'scatterCounts'])[:-1])
+    repGroups = np.split(arrays[prefix + 'repPoints'], np.cumsum(arrays[prefix + 'repCounts'])[:-1])
+    clusters = []
+    for i in range(len(ids)):
+        cluster = CureCluster(int(ids[i]), centers[i], authors)
+        cluster.addRows(rowGroups[i].tolist())
+        cluster.scatterPoints = scatterGroups[i].reshape(-1, NUM_FEATURES)
+        cluster.repPoints = repGroups[i].reshape(-1, NUM_FEATURES)
+        clusters.append(cluster)
+    return clusters
 
 ####
 
 # Coordinates the running of the CURE algorithm, calling the relevant functions
 # and ultimately returning the clusters.
-# Input: The dictionary of authors, and the number of clusters to create. (authors, k)
-# Output: The clusters of authors, as created by the CURE clustering method (clusters)
-def runCURE(authors, k):
-    print "Standardizing author data."
-    authors = standardizeAuthors(authors)
-    print "Data standardized. Running preliminary clustering with k=" + str(k) + "."
-    prelimClusters, centers, smallAuthors = prelimClustering(k, authors)
-    print "Preliminary clustering complete. Building cure clusters."
-    clusters = buildCureClusters(prelimClusters, centers, authors, k)
-    print "Clusters initialized; choosing representative points."
-    clusters = generateRepresentativePoints(clusters)
-    print "Representative points chosen. Merging close clusters."
-    clusters = mergeCloseClusters(clusters)
-    print "Merging complete. " + str(len(clusters)) + " clusters remain."
-    print "Assigning remaining data."
-    clusters = assignRemainingData(clusters, authors, smallAuthors)
-    print "All points assigned. CURE complete."
-    return clusters
+# Input: The dictionary of authors, the number of clusters to create, the number of
+#        processes to use when assigning the remaining data, and optionally a larger
+#        number of preliminary k-means clusters to merge down to k, and the number of
+#        partitions to split the sample into, and optionally an already fitted scaler
+#        to standardize with, optionally a RunProfiler (see instrumentation.py) to
+#        time the phases and report progress through, and whether the authors are an
+#        AuthorMatrix that is already standardized, and optionally a RunCheckpoint (see
+#        checkpoint.py) to save the state after each phase to, and to resume from.
+#        (authors, k, workers, prelimK, partitions, scaler, profiler, standardized, checkpoint)
+# Output: The clusters of authors, as created by the CURE clustering method, and a
+#         cluster holding the authors pruned as outliers, which is empty unless
+#         ELIMINATE_OUTLIERS is set (clusters, outliers)
+def runCURE(authors, k, workers=1, prelimK=None, partitions=1, scaler=None, profiler=None, \
+            standardized=False, checkpoint=None):
+    if prelimK is None:
+        prelimK = k
+    if profiler is None:
+        profiler = NULL_PROFILER
+    if checkpoint is None:
+        checkpoint = NULL_CHECKPOINT
+    if not standardized:
+        profiler.log("Standardizing author data.")
+        with profiler.phase("standardizeAuthors"):
+            authors = asAuthorMatrix(authors)
+            if scaler is None:
+                scaler = createScaler(SCALER_KIND).fit(authors.data)
+            authors = standardizeAuthors(authors, scaler)
+    if checkpoint.enabled:
+        checkpoint.start(getCheckpointSettings(authors, k, prelimK, partitions, scaler))
+    resumedFrom = checkpoint.getLastPhase(CHECKPOINT_PHASES)
+    sampleRows = clusters = outliers = None
+    if resumedFrom is not None:
+        profiler.log("Resuming after the " + resumedFrom + " checkpoint.")
+        state = checkpoint.load(resumedFrom)
+        sampleRows = state['sampleRows']
+        if resumedFrom == "prelimClustering":
+            prelimClusters, centers = state['prelimClusters'], state['centers']
+        else:
+            clusters = clustersFromArrays(state, authors)
+        if resumedFrom == "mergeCloseClusters":
+            outliers = clustersFromArrays(state, authors, "outliers_")[0]
+    if sampleRows is None and partitions > 1:
+        profiler.log("Data standardized. Clustering " + str(partitions) + " partitions with k=" + str(prelimK) + ".")
+        with profiler.phase("partitionedClustering"):
+            clusters, sampleRows = partitionedClustering(prelimK, authors, partitions, workers, profiler)
+        checkpoint.save("representativePoints", dict(clustersToArrays(clusters).items() + \
+                                                     [('sampleRows', sampleRows)]))
+        profiler.log("Partitions clustered; " + str(len(clusters)) + " partial clusters found. Merging close clusters.")
+    elif sampleRows is None:
+        profiler.log("Data standardized. Running preliminary clustering with k=" + str(prelimK) + ".")
+        with profiler.phase("prelimClustering"):
+            prelimClusters, centers, sampleRows = prelimClustering(prelimK, authors, profiler)
+        checkpoint.save("prelimClustering", dict([('prelimClusters', prelimClusters), ('centers', centers), \
+                                                  ('sampleRows', sampleRows)]))
+        profiler.log("Preliminary clustering complete.")
+    if clusters is None:
+        profiler.log("Building cure clusters.")
+        with profiler.phase("buildCureClusters"):
+            clusters = buildCureClusters(prelimClusters, centers, authors, len(centers), sampleRows)
+        profiler.log("Clusters initialized; choosing representative points.")
+        with profiler.phase("generateRepresentativePoints"):
+            clusters = generateRepresentativePoints(clusters, profiler)
+        checkpoint.save("representativePoints", dict(clustersToArrays(clusters).items() + \
+                                                     [('sampleRows', sampleRows)]))
+        profiler.log("Representative points chosen. Merging close clusters.")
+    if outliers is None:
+        with profiler.phase("mergeCloseClusters"):
+            clusters, outliers = mergeWithOutlierElimination(clusters, k, authors, len(sampleRows), profiler)
+        checkpoint.save("mergeCloseClusters", dict(clustersToArrays(clusters).items() + \
+                                                   clustersToArrays([outliers], "outliers_").items() + \
+                                                   [('sampleRows', sampleRows)]))
+    profiler.log("Merging complete. " + str(len(clusters)) + " clusters remain.")
+    profiler.log("Assigning remaining data.")
+    with profiler.phase("assignRemainingData"):
+        clusters, labels = assignRemainingData(clusters, authors, sampleRows, workers=workers, \
+                                               checkpoint=checkpoint)
+    profiler.log("All points assigned. CURE complete.")
+    profiler.addResult("run", dict([('numAuthors', len(authors)), ('k', k), ('prelimK', prelimK), \
+                                    ('workers', workers), ('partitions', partitions), \
+                                    ('sampleSize', len(sampleRows)), ('clusters', len(clusters)), \
+                                    ('outliers', len(outliers.rows)), ('resumedFrom', resumedFrom)]))
+    return clusters, outliers
+
+# Helper function for runCURE()
+# Collects everything a checkpointed run's results depend on, so it can only be resumed
+# by the same run: the arguments, the scaler, the clustering settings and seed (see
+# getClusteringSettings), and a fingerprint of the standardized data.
+# Input: the standardized AuthorMatrix of authors, the number of clusters and of
+#        preliminary clusters, the number of partitions, and the scaler, or None if the
+#        authors came already standardized (authors, k, prelimK, partitions, scaler)
+# Output: a dictionary of plain values (settings)
+def getCheckpointSettings(authors, k, prelimK, partitions, scaler):
+    settings = getClusteringSettings()
+    settings.update(dict([('numAuthors', len(authors)), ('k', k), ('prelimK', prelimK), \
+                          ('partitions', partitions), ('assignRows', CHECKPOINT_ASSIGN_ROWS)]))
+    settings['scaler'] = None if scaler is None else toJSONValue(scalerToArrays(scaler))
+    settings['dataFingerprint'] = getDataFingerprint(authors.ids, authors.data)
+    return settings
+
+# Helper function for getCheckpointSettings() and shardedCure.py
+# Collects the module settings the clusters depend on, for checking that saved results
+# were built the same way. The kMeans settings are read from kMeansAuthors, where runs
+# set them.
+# Input: none
+# Output: a dictionary of setting name -> value (settings)
+def getClusteringSettings():
+    settings = dict([])
+    for name in ['CLUSTERING_SEED', 'PRELIM_DATA_PERCENTAGE', 'SAMPLING_MODE', 'SAMPLE_STRATIFY_FEATURE', \
+                 'SAMPLE_NUM_STRATA', 'SAMPLE_MIN_CLUSTER_SIZE', 'SAMPLE_CLUSTER_FRACTION', \
+                 'SAMPLE_FAILURE_PROBABILITY', 'INITIAL_CENTERS_STRATEGY', 'PRELIM_KMEANS_MODE', \
+                 'MINIBATCH_SEEDING_SIZE', 'REP_SELECTION_CRITERION', 'REP_SELECTION_SAMPLE_CAP', \
+                 'PARTITION_REDUCTION', 'REPRESENTATIVE_POINTS_PERCENTAGE', 'CENTROID_MIGRATION_PERCENTAGE', \
+                 'INCREMENTAL_MERGE', 'CLUSTER_MERGE_DISTANCE', 'ELIMINATE_OUTLIERS', 'OUTLIER_PRUNE_POINT', \
+                 'OUTLIER_MIN_SIZE', 'OUTLIER_FINAL_MULTIPLE', 'OUTLIER_FINAL_FRACTION']:
+        settings[name] = globals()[name]
+    for name in ['KMEANS_TOLERANCE', 'KMEANS_MAX_ITERATIONS', 'KMEANS_MAX_SHIFTS', 'MINIBATCH_SIZE', \
+                 'MINIBATCH_MAX_ITERATIONS', 'KMEANS_PARALLEL_ROUNDS', 'KMEANS_PARALLEL_OVERSAMPLING']:
+        settings[name] = getattr(kMeansAuthors, name)
+    return settings
 
 # Assigns all authors that weren't added via the preliminary clustering
 # to an existing cluster based upon the nearest representative point.
-# Input: the list of clusters, the dictionary of authors, and the dictionary of authors
-#        involved in the initial clustering.
-# Output: An updated list of clusters, which now contains all the authors in them. (clusters)
-def assignRemainingData(clusters, authors, smallAuthors):
-    for authorId in authors:
-        if authorId not in smallAuthors:
-            clust = getClosestCluster(authors[authorId], clusters)
-            clust.addAuthor(authors[authorId])
-    return clusters
+# The authors are labeled in chunks of chunkSize against an index over all the representative points;
+# with more than one worker, the chunks are spread over a pool of processes.
+# Input: the list of clusters, the AuthorMatrix of authors, the rows of the authors
+#        involved in the initial clustering, the number of authors to label at a time
+#        (None uses ASSIGN_CHUNK_SIZE), the number of worker processes, and optionally a RunCheckpoint to save the labels
+#        of each block of CHECKPOINT_ASSIGN_ROWS authors to and to resume from.
+#        (clusters, authors, sampleRows, chunkSize, workers, checkpoint)
+# Output: An updated list of clusters, which now contains all the authors in them, and
+#         the index (in clusters) of the cluster of every author row, or -1 for sampled
+#         authors in none of the clusters (pruned as outliers). (clusters, labels)
+def assignRemainingData(clusters, authors, sampleRows, chunkSize=None, workers=1, \
+                        checkpoint=NULL_CHECKPOINT):
+    if chunkSize is None:
+        chunkSize = ASSIGN_CHUNK_SIZE
+    labels = np.empty(len(authors), dtype=np.intp)
+    labels.fill(-1)
+    for i in range(len(clusters)):
+        labels[np.asarray(clusters[i].rows, dtype=np.intp)] = i
+    remaining = np.ones(len(authors), dtype=bool)
+    remaining[sampleRows] = False
+    remainingRows = np.flatnonzero(remaining)
+    reps, repLabels = buildRepMatrix(clusters)
+    index = None
+    pool = None
+    if workers <= 1:
+        index = buildRepIndex(reps, repLabels, REP_INDEX_KIND)
+    blockSize = CHECKPOINT_ASSIGN_ROWS if checkpoint.enabled else max(len(remainingRows), 1)
+    try:
+        for block, start in enumerate(range(0, len(remainingRows), blockSize)):
+            blockRows = remainingRows[start:start + blockSize]
+            blockLabels = checkpoint.loadBlock(block)
+            if blockLabels is None:
+                if workers > 1:
+                    if pool is None: # Started once, for the first block not yet labeled
+                        pool = startAssignPool(authors.data, remainingRows, reps, repLabels, \
+                                               workers, REP_INDEX_KIND)
+                    blockLabels = labelWithPool(pool, start, start + len(blockRows), workers, chunkSize)
+                else:
+                    blockLabels = getNearestRepLabels(authors.data, blockRows, index, chunkSize)
+                checkpoint.saveBlock(block, blockLabels)
+            elif len(blockLabels) != len(blockRows):
+                raise ValueError("Checkpointed labels of block " + str(block) + " do not match the run")
+            labels[blockRows] = blockLabels
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    rowGroups = groupByLabel(remainingRows, labels[remainingRows], len(clusters))
+    for i in range(len(clusters)):
+        clusters[i].addRows(rowGroups[i].tolist())
+    return clusters, labels
+
+# Helper function for assignRemainingData()
+# Stacks the representative points of every cluster into a single array.
+# Input: the list of clusters (clusters)
+# Output: the array of all representative points, and the index (in clusters) of the
+#         cluster each of them belongs to (reps, repLabels)
+def buildRepMatrix(clusters):
+    repCounts = [len(cluster.repPoints) for cluster in clusters]
+    reps = np.vstack([np.empty((0, NUM_FEATURES))] + [cluster.repPoints for cluster in clusters])
+    repLabels = np.repeat(np.arange(len(clusters)), repCounts)
+    return reps, repLabels
 
 # Helper function for assignRemainingData()
 # Determines the cluster associated with the representative point closest 
 # to the given author.
-# Input: a given author of class Author, and the list of clusters (author, clusters)
+# Input: a given author of class Author, the list of clusters, and optionally a rep index
+#        over them labeled by cluster id (author, clusters, index)
 # Output: the clostest cluster for the author, based on repPoints (clustChoice)
-def getClosestCluster(author, clusters):
+def getClosestCluster(author, clusters, index=None):
     clustChoice = None
     minDist = 99999
-    authorData = author.getData()
-    for cluster in clusters:
-        for repPoint in cluster.repPoints:
-            dist = clustering.getEucSquaredDistance(authorData, repPoint)
-            if dist < minDist:
-                minDist = dist
+    authorData = np.asarray(author.getData(), dtype=np.float64)
+    if index is not None:
+        dists, labels = index.nearest(authorData[np.newaxis, :])
+        for cluster in clusters:
+            if cluster.id == labels[0]:
                 clustChoice = cluster
+        return clustChoice
+    for cluster in clusters:
+        if len(cluster.repPoints) == 0:
+            continue
+        dist = ((cluster.repPoints - authorData)**2).sum(axis=1).min()
+        if dist < minDist:
+            minDist = dist
+            clustChoice = cluster
     return clustChoice
     
 # Attempts to merge clusters based on the distance between their closest
 # reprsentative points; may result in cluster deletion.
-# Input: the list of all the cluster (clusters)
+# This is the hierarchical phase of CURE: a heap holds each cluster's distance to its
+# closest cluster, and the closest pair is merged until targetCount clusters remain or
+# the closest pair is at least mergeDistance apart. After a merge only the entries
+# involving the merged clusters are updated. Stale heap entries are skipped using a
+# per-cluster version number.
+# Input: the list of all the cluster, the number of clusters to stop at, and the
+#        distance at which to stop merging; None uses CLUSTER_MERGE_DISTANCE
+#        (clusters, targetCount, mergeDistance)
 # Output: the list of clusters, which may have had clusters merged together. (clusters)
-def mergeCloseClusters(clusters):
-    clustersMerged = False
-    while clustersMerged:
-        for i in range(len(clusters)):
-            for j in range(i, len(clusters)):
-                closestDist = getClosestClusterDist(clusters[i], clusters[j])
-                if closestDist < CLUSTER_MERGE_DISTANCE:
-                    clusters[i].mergeWithCluster(clusters[j])
-                    del clusters[j]
-                    clustersMerged = True
-                    break
-            if clustersMerged:
-                clustersMerged = False
-                break
-    return clusters
+def mergeCloseClusters(clusters, targetCount=1, mergeDistance=None):
+    if mergeDistance is None:
+        mergeDistance = CLUSTER_MERGE_DISTANCE
+    index = buildClusterRepIndex(clusters, REP_INDEX_KIND)
+    remaining = dict([(cluster.id, cluster) for cluster in clusters])
+    closest = dict([])
+    versions = dict([(cluster.id, 0) for cluster in clusters])
+    heap = []
+    
+    # Records a new closest cluster for clustId, invalidating its old heap entry
+    def setClosest(clustId, otherId, dist):
+        closest[clustId] = (otherId, dist)
+        versions[clustId] += 1
+        if otherId is not None:
+            heapq.heappush(heap, (dist, clustId, versions[clustId]))
+    
+    for cluster in clusters:
+        otherId, dist = index.closestCluster(cluster.id)
+        setClosest(cluster.id, otherId, dist)
+    while len(remaining) > targetCount and len(heap) > 0:
+        dist, clustId, version = heapq.heappop(heap)
+        if clustId not in remaining or version != versions[clustId]:
+            continue # Stale entry
+        if mergeDistance is not None and dist >= mergeDistance:
+            break
+        clust, other = remaining[clustId], remaining[closest[clustId][0]]
+        clust.mergeWithCluster(other, index)
+        del remaining[other.id]
+        del closest[other.id]
+        otherId, dist = index.closestCluster(clust.id)
+        setClosest(clust.id, otherId, dist)
+        for updateId in remaining:
+            if updateId == clust.id:
+                continue
+            prevId, prevDist = closest[updateId]
+            if prevId == clust.id or prevId == other.id:
+                # The old closest cluster has changed; look again
+                otherId, dist = index.closestCluster(updateId)
+                setClosest(updateId, otherId, dist)
+            else:
+                dist = getClosestClusterDist(remaining[updateId], clust, index)
+                if dist < prevDist:
+                    setClosest(updateId, clust.id, dist)
+    return [cluster for cluster in clusters if cluster.id in remaining]
+
+# Merges the clusters down to k. If ELIMINATE_OUTLIERS is set, outliers are eliminated
+# on the way in the two passes of the CURE paper: outliers form small clusters that grow
+# slowly, so part way through merging the clusters that are still very small are pruned,
+# and once close to k clusters remain, the clusters that are tiny next to the sample are
+# pruned too. The k largest clusters are never pruned.
+# Input: the list of clusters, the number of clusters to stop at, the AuthorMatrix of
+#        authors, the number of sampled authors, and the profiler to report progress
+#        through (clusters, k, authors, numSampled, profiler)
+# Output: the list of merged clusters, and a cluster holding the authors that were
+#         pruned, without representative points (clusters, outliers)
+def mergeWithOutlierElimination(clusters, k, authors, numSampled, profiler=NULL_PROFILER):
+    outliers = CureCluster(OUTLIER_CLUSTER_ID, np.zeros(NUM_FEATURES), authors)
+    if ELIMINATE_OUTLIERS:
+        clusters = mergeCloseClusters(clusters, max(k, int(len(clusters) * OUTLIER_PRUNE_POINT)))
+        clusters, pruned = pruneSmallClusters(clusters, OUTLIER_MIN_SIZE, k)
+        clusters = mergeCloseClusters(clusters, OUTLIER_FINAL_MULTIPLE * k)
+        clusters, prunedLate = pruneSmallClusters(clusters, OUTLIER_FINAL_FRACTION * numSampled, k)
+        for cluster in pruned + prunedLate:
+            outliers.addRows(cluster.rows)
+        if len(outliers.rows) > 0:
+            outliers.computeCentroid()
+        profiler.log("  Pruned " + str(len(pruned) + len(prunedLate)) + " clusters holding " + \
+                     str(len(outliers.rows)) + " outlying authors.")
+    clusters = mergeCloseClusters(clusters, k)
+    return clusters, outliers
+
+# Helper function for mergeWithOutlierElimination()
+# Splits off the clusters with fewer than minSize authors, apart from the keepCount
+# largest clusters.
+# Input: the list of clusters, the size a cluster must reach to be kept, and the number
+#        of largest clusters always kept (clusters, minSize, keepCount)
+# Output: the kept clusters and the pruned clusters, each in their original order
+#         (clusters, pruned)
+def pruneSmallClusters(clusters, minSize, keepCount):
+    sizes = np.array([len(cluster.rows) for cluster in clusters])
+    prune = sizes < minSize
+    prune[np.argsort(-sizes, kind='mergesort')[:keepCount]] = False
+    kept = [clusters[i] for i in range(len(clusters)) if not prune[i]]
+    pruned = [clusters[i] for i in range(len(clusters)) if prune[i]]
+    return kept, pruned
 
 # Helper function for mergeCloseClusters()
 # Determines the closest distance between any two representative points for two clusters
-# Input: Two clusters of type CureCluster (clust1, clust2)
+# Input: Two clusters of type CureCluster, and optionally a rep index over them labeled
+#        by cluster id (clust1, clust2, index)
 # Output: the closest distance between any two representative points in the clusters (minDist)
-def getClosestClusterDist(clust1, clust2):
+def getClosestClusterDist(clust1, clust2, index=None):
     minDist = 9999
-    for repPoint1 in clust1.repPoints:
-        for repPoint2 in clust2.repPoints:
-            dist = clustering.getEucSquaredDistance(repPoint1, repPoint2)
-            if dist < minDist:
-                minDist = dist
+    if len(clust1.repPoints) > 0 and len(clust2.repPoints) > 0:
+        if index is not None:
+            minDist = min(minDist, index.clusterDistance(clust1.id, clust2.id))
+        else:
+            minDist = min(minDist, getEucSquaredDistances(clust1.repPoints, clust2.repPoints).min())
     return minDist
 
 # For each CURE cluster, computes the representative points
-# Input: the list of clusters (clusters)
+# Input: the list of clusters, and the profiler to report progress through (clusters, profiler)
 # Output: the list of clusters, but the clusters now have representative points associated
 #         with themselves (clusters)
-def generateRepresentativePoints(clusters):
+def generateRepresentativePoints(clusters, profiler=NULL_PROFILER):
     i = 0
     for cluster in clusters:
         cluster.computeRepPoints()
         cluster.moveRepPoints()
         i += 1
-        print "  Cluster " + str(i) + " complete."
+        profiler.log("  Cluster " + str(i) + " complete.")
     return clusters
 
 # Generates initial CURE clusters from the preliminary clusters
-# Input: the preliminary Clusters created by k-means, the centers for those clusters,
-#        the dictionary of authors, and the number of clusters to create.
-#        (prelimClusters, center, authors, k)
+# Input: the preliminary cluster of each sampled author created by k-means, the centers
+#        for those clusters, the AuthorMatrix of authors, the number of clusters to
+#        create, and the rows of the sampled authors.
+#        (prelimClusters, center, authors, k, sampleRows)
 # Output: the new list of clusters, which is a list of CureClusters (clusters)
-def buildCureClusters(prelimClusters, centers, authors, k):
+def buildCureClusters(prelimClusters, centers, authors, k, sampleRows):
     clusters = []
+    rowGroups = groupByLabel(sampleRows, prelimClusters, k)
     for i in range(k):
-        newClust = CureCluster(i, centers[i])
+        newClust = CureCluster(i, centers[i], authors)
+        newClust.addRows(rowGroups[i].tolist())
         clusters.append(newClust)
-    for id in prelimClusters:
-        clusters[prelimClusters[id]].addAuthor(authors[id])
     return clusters
 
+# Runs CURE for every combination of the given numbers of clusters and seeds, and
+# scores each run with the cluster metrics (see clusterMetrics.py). The authors are
+# standardized once and shared read-only with a pool of worker processes, each of
+# which runs whole CURE runs on its own.
+# Input: the AuthorMatrix of authors, the numbers of clusters to try, the seeds to
+#        try them with, the number of worker processes, the scaler to standardize with
+#        (None fits one of SCALER_KIND), and the number of preliminary clusters (None
+#        uses k) (authors, kValues, seeds, workers, scaler, prelimK)
+# Output: a dictionary of results for each run, in the order of kValues then seeds,
+#         and the best of them by SWEEP_SCORE (results, best)
+def sweepK(authors, kValues, seeds=[None], workers=1, scaler=None, prelimK=None):
+    authors = standardizeAuthors(authors, scaler)
+    tasks = [(k, seed, prelimK) for k in kValues for seed in seeds]
+    if workers > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(workers, len(tasks)), initializer=initAuthorsWorker, \
+                                    initargs=(shareAuthors(authors),))
+        try:
+            results = pool.map(runSweepTask, tasks, 1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        workerAuthors['authors'] = authors
+        try:
+            results = [runSweepTask(task) for task in tasks]
+        finally:
+            workerAuthors.clear()
+    return results, chooseBestRun(results)
+
+# Helper function for sweepK()
+# Runs and scores one CURE run of the sweep.
+# Input: the number of clusters, the seed, and the number of preliminary clusters (task)
+# Output: a dictionary of the run's settings, phase times and metrics (result)
+def runSweepTask(task):
+    global CLUSTERING_SEED
+    k, seed, prelimK = task
+    authors = workerAuthors['authors']
+    oldSeed = CLUSTERING_SEED
+    CLUSTERING_SEED = seed
+    profiler = RunProfiler(quiet=True)
+    try:
+        start = time.time()
+        clusters, outliers = runCURE(authors, k, prelimK=prelimK, profiler=profiler, standardized=True)
+        seconds = time.time() - start
+        labels, centers = getClusterLabels(clusters, len(authors))
+        metrics = computeClusterMetrics(authors.data, labels, centers, seed=seed)
+    finally:
+        CLUSTERING_SEED = oldSeed
+    result = dict([])
+    result['k'] = k
+    result['seed'] = seed
+    result['seconds'] = seconds
+    result['phaseSeconds'] = dict([(phase['name'], phase['wallSeconds']) for phase in profiler.phases])
+    result['numClusters'] = len(clusters)
+    result['outliers'] = len(outliers.rows)
+    for name in ['inertia', 'silhouette', 'daviesBouldin', 'sizeSummary']:
+        result[name] = metrics[name]
+    return result
+
+# Helper function for sweepK()
+# Picks the best run of a sweep by SWEEP_SCORE; runs without a score are skipped.
+# Input: the list of run results (results)
+# Output: the best run's result, or None if no run has a score (best)
+def chooseBestRun(results):
+    if SWEEP_SCORE not in ["silhouette", "daviesBouldin"]:
+        raise ValueError("Unknown sweep score: " + str(SWEEP_SCORE))
+    scored = [result for result in results if result[SWEEP_SCORE] is not None]
+    if len(scored) == 0:
+        return None
+    if SWEEP_SCORE == "silhouette":
+        return max(scored, key=lambda result: result[SWEEP_SCORE])
+    return min(scored, key=lambda result: result[SWEEP_SCORE])
+
 # Performs an initial k-Means clustering on a percentage of the dataset
 # to give us some cluster assignments to refine with CURE.
-# Input: the number of clusters to create, and the dictionary of authors (k, authors)
-# Output: the dictionary of clusters, the centers for those clusters, and the dictionary
-#         of authors used to make the initial clusters. (clusters, centers, smallAuthors)
-def prelimClustering(k, authors):
-    smallAuthors = dict([])
-    numEntries = int(math.floor(len(authors) * PRELIM_DATA_PERCENTAGE))
-    print "Using " + str(numEntries) + " authors as the preliminary dataset."
-    i = 0
-    for id in authors:
-        smallAuthors[id] = authors[id]
-        i += 1
-        if i > numEntries:
-            break
-    print "Computing initial cluster centers."
-    initialCenters = getInitialCenters(k, smallAuthors)
-    print "Centers chosen. Running kMeans."
-    clusters, centers = kMeans(smallAuthors, initialCenters)
-    print "kMeans complete; clusters found."
-    return clusters, centers, smallAuthors
+# Input: the number of clusters to create, the AuthorMatrix of authors, and the profiler
+#        to report progress through (k, authors, profiler)
+# Output: the cluster of each sampled author, the centers for those clusters, and the
+#         rows of the authors used to make the initial clusters. (clusters, centers, sampleRows)
+def prelimClustering(k, authors, profiler=NULL_PROFILER):
+    numEntries = getSampleSize(len(authors))
+    profiler.log("Using " + str(numEntries) + " authors as the preliminary dataset.")
+    sampleRows = chooseSampleRows(authors, numEntries)
+    clusters, centers = clusterSample(k, authors, sampleRows, CLUSTERING_SEED, profiler)
+    return clusters, centers, sampleRows
+
+# Helper function for prelimClustering() and clusterPartition()
+# Runs the configured kMeans over the given rows of the authors.
+# Input: the number of clusters to create, the AuthorMatrix of authors, the rows to
+#        cluster, the seed for the random choices, and the profiler to report progress
+#        through (k, authors, sampleRows, seed, profiler)
+# Output: the cluster of each of the rows, and the centers for those clusters, of which
+#         there are fewer than k if the rows hold fewer than k distinct authors (clusters, centers)
+def clusterSample(k, authors, sampleRows, seed, profiler=NULL_PROFILER):
+    profiler.log("Computing initial cluster centers.")
+    if PRELIM_KMEANS_MODE == "minibatch":
+        # Only a seeding subsample is copied out; the batches index the authors directly
+        seedingRows = sampleRows
+        if len(sampleRows) > MINIBATCH_SEEDING_SIZE:
+            seedingRows = np.sort(np.random.RandomState(seed).choice(sampleRows, MINIBATCH_SEEDING_SIZE, \
+                                                                     replace=False))
+        initialCenters = chooseInitialCenters(k, authors.take(seedingRows), INITIAL_CENTERS_STRATEGY, seed)
+        profiler.log("Centers chosen. Running mini-batch kMeans.")
+        clusters, centers = miniBatchKMeans(authors, initialCenters, seed=seed, rows=sampleRows)
+    else:
+        smallAuthors = authors.take(sampleRows)
+        initialCenters = chooseInitialCenters(k, smallAuthors, INITIAL_CENTERS_STRATEGY, seed)
+        profiler.log("Centers chosen. Running kMeans.")
+        clusters, centers = kMeans(smallAuthors, initialCenters)
+    profiler.log("kMeans complete; clusters found.")
+    return clusters, centers
+
+# Partitioned version of the preliminary clustering, as in the CURE paper: the sample
+# is dealt out into the given number of partitions, and each partition is pre-clustered
+# with kMeans and given representative points on its own, in a pool of worker processes
+# that read only the sampled authors from shared memory. The partial clusters of every
+# partition are then returned together, for mergeCloseClusters() to merge down to k.
+# Input: the number of clusters to pre-cluster each partition into, the AuthorMatrix of
+#        authors, the number of partitions, the number of worker processes, and the
+#        profiler to report progress through (k, authors, partitions, workers, profiler)
+# Output: the CureClusters of every partition, with their representative points, and the
+#         rows of the authors used to make them (clusters, sampleRows)
+def partitionedClustering(k, authors, partitions, workers=1, profiler=NULL_PROFILER):
+    numEntries = getSampleSize(len(authors))
+    profiler.log("Using " + str(numEntries) + " authors as the preliminary dataset.")
+    sampleRows = chooseSampleRows(authors, numEntries)
+    tasks = []
+    for i in range(partitions):
+        # Dealing the sorted sample out spreads every part of the data over the partitions
+        rows = sampleRows[i::partitions]
+        if len(rows) > 0:
+            tasks.append((rows, getPartitionK(k, len(rows)), getPartitionSeed(i)))
+    if len(tasks) == 0:
+        return [], sampleRows
+    if workers > 1 and len(tasks) > 1:
+        # Only the sample is shared, so the workers' rows are positions within it
+        localTasks = [(np.searchsorted(sampleRows, rows), partitionK, seed) for rows, partitionK, seed in tasks]
+        pool = multiprocessing.Pool(min(workers, len(tasks)), initializer=initAuthorsWorker, \
+                                    initargs=(shareAuthors(authors, sampleRows),))
+        try:
+            results = pool.map(clusterPartition, localTasks, 1)
+        finally:
+            pool.close()
+            pool.join()
+        results = [[(sampleRows[np.asarray(rows, dtype=np.intp)].tolist(), center, scatterPoints, repPoints) \
+                    for rows, center, scatterPoints, repPoints in partitionClusters] \
+                   for partitionClusters in results]
+    else:
+        workerAuthors['authors'] = authors
+        try:
+            results = [clusterPartition(task) for task in tasks]
+        finally:
+            workerAuthors.clear()
+    clusters = []
+    for i in range(len(results)):
+        profiler.log("  Partition " + str(i + 1) + " complete; " + str(len(results[i])) + " partial clusters.")
+    for partitionClusters in results:
+        for rows, center, scatterPoints, repPoints in partitionClusters:
+            newClust = CureCluster(len(clusters), center, authors)
+            newClust.addRows(rows)
+            newClust.scatterPoints = scatterPoints
+            newClust.repPoints = repPoints
+            clusters.append(newClust)
+    return clusters, sampleRows
+
+# Helper function for partitionedClustering() and sweepK()
+# Copies the ids and features of the authors, or of only the given rows of them, into
+# shared memory for a process pool.
+# Input: the AuthorMatrix of authors, and optionally the sorted rows to share (authors, rows)
+# Output: a dictionary of name -> (shared, shape, dtype) (sharedArrays)
+def shareAuthors(authors, rows=None):
+    sharedArrays = dict([])
+    if rows is None:
+        sharedArrays['ids'] = toSharedArray(np.asarray(authors.ids))
+        sharedArrays['data'] = toSharedArray(np.asarray(authors.data))
+    else:
+        sharedArrays['ids'] = toSharedArray(np.asarray(authors.ids)[rows])
+        sharedArrays['data'] = toSharedRows(authors.data, np.asarray(rows))
+    return sharedArrays
+
+# Helper function for partitionedClustering() and sweepK()
+# Pool initializer; stores an AuthorMatrix over the shared author data for
+# clusterPartition() and runSweepTask() to use.
+# Input: a dictionary of name -> (shared, shape, dtype) (sharedArrays)
+# Output: none
+def initAuthorsWorker(sharedArrays):
+    workerAuthors['authors'] = AuthorMatrix(fromSharedArray(*sharedArrays['ids']), \
+                                            fromSharedArray(*sharedArrays['data']))
+
+# Helper function for partitionedClustering()
+# Pre-clusters one partition: kMeans, then CureClusters with representative points.
+# Progress is reported by partitionedClustering() once the partitions are done, so
+# this runs silently, even in a worker process.
+# Input: the rows of the partition, the number of clusters to create, and the seed
+#        for the random choices (task)
+# Output: the rows, center, scatter points and representative points of each of the
+#         partition's clusters (partitionClusters)
+def clusterPartition(task):
+    rows, k, seed = task
+    authors = workerAuthors['authors']
+    prelimClusters, centers = clusterSample(k, authors, rows, seed, SILENT_PROFILER)
+    clusters = buildCureClusters(prelimClusters, centers, authors, len(centers), rows)
+    clusters = generateRepresentativePoints(clusters, SILENT_PROFILER)
+    return [(cluster.rows, cluster.center, cluster.scatterPoints, cluster.repPoints) \
+            for cluster in clusters]
+
+# Helper function for partitionedClustering()
+# Determines how many clusters a partition is pre-clustered into.
+# Input: the number of preliminary clusters, and the size of the partition (k, size)
+# Output: the number of clusters for the partition (partitionK)
+def getPartitionK(k, size):
+    partitionK = k
+    if PARTITION_REDUCTION is not None:
+        partitionK = max(k, int(math.ceil(size / float(PARTITION_REDUCTION))))
+    return min(partitionK, size)
+
+# Helper function for partitionedClustering()
+# Gives each partition its own seed, so a seeded run is reproduced whatever the
+# number of workers.
+# Input: the number of the partition (partition)
+# Output: the seed for the partition, or None for an unseeded run (seed)
+def getPartitionSeed(partition):
+    if CLUSTERING_SEED is None:
+        return None
+    return CLUSTERING_SEED + partition
+
+# Helper function for prelimClustering()
+# Determines how many authors go into the preliminary sample.
+# Input: the number of authors (numAuthors)
+# Output: the sample size (numEntries)
+def getSampleSize(numAuthors):
+    if SAMPLE_MIN_CLUSTER_SIZE is not None:
+        return chernoffSampleSize(numAuthors, SAMPLE_MIN_CLUSTER_SIZE, SAMPLE_CLUSTER_FRACTION, \
+                                  SAMPLE_FAILURE_PROBABILITY)
+    numEntries = int(math.floor(numAuthors * PRELIM_DATA_PERCENTAGE))
+    return numEntries
+
+# Helper function for prelimClustering()
+# Draws the rows of the preliminary sample according to SAMPLING_MODE.
+# Input: the AuthorMatrix of authors, and the sample size (authors, numEntries)
+# Output: the sorted rows of the sampled authors (sampleRows)
+def chooseSampleRows(authors, numEntries):
+    if SAMPLING_MODE == "prefix":
+        sampleRows = np.arange(min(numEntries + 1, len(authors)))
+    elif SAMPLING_MODE == "stratified":
+        strata = getFeatureStrata(authors.data, SAMPLE_STRATIFY_FEATURE, SAMPLE_NUM_STRATA)
+        sampleRows = stratifiedSample(strata, numEntries, CLUSTERING_SEED)
+    elif SAMPLING_MODE == "reservoir":
+        sampleRows = np.sort(reservoirSample(streamRowChunks(len(authors)), numEntries, CLUSTERING_SEED))
+    else:
+        raise ValueError("Unknown sampling mode: " + str(SAMPLING_MODE))
+    return sampleRows
 
 ####
 
@@ -233,6 +896,8 @@ def prelimClustering(k, authors):
 # Input: the dictionary of authors (authors)
 # Output: the same dictionary, but with the original values (authors)
 def destandardizeAuthors(authors):
+    if isinstance(authors, AuthorMatrix):
+        return authors # Standardizing never touches the original matrix
     for authorId in authors:
         authors[authorId].buildRepList()
     return authors
@@ -243,75 +908,148 @@ def destandardizeAuthors(authors):
 # account for the huge difference between, for example, the year (1994) and
 # the number of journals (2). Log standardization wouldn't account for that.
 # http://www.biomedware.com/files/documentation/boundaryseer/Preparing_data/Methods_for_data_standardization.htm
-# Input: the dictionary of authors (authors)
-# Output: the dictionary of authors, but each author has been standardized via the method
-#         described in the link (authors)
-def standardizeAuthors(authors):
-    maxs, mins = getMaxsAndMins(authors)
-    for authorId in authors:
-        author = authors[authorId].getData()
-        for i in range(len(author)):
-            author[i] = (float(author[i] - mins[i]) / (maxs[i] - mins[i]) ) + 0.01
-    return authors
+# This is the "minmax" scaler; SCALER_KIND picks another (see scaler.py).
+# The Author objects themselves are left untouched.
+# Input: the dictionary of authors, or an AuthorMatrix, and optionally an already fitted
+#        scaler; if None, a scaler of SCALER_KIND is fitted to the authors (authors, scaler)
+# Output: an AuthorMatrix of the authors, where each feature has been standardized via
+#         the method described in the link (authors)
+def standardizeAuthors(authors, scaler=None):
+    matrix = asAuthorMatrix(authors)
+    if scaler is None:
+        scaler = createScaler(SCALER_KIND).fit(matrix.data)
+    return matrix.withData(scaler.transform(matrix.data))
 
-# Given a series of clusters of data standardized by the original function,
-# finds the original values by reversing the calculation
-# Input: the list of CureClusters and the dictionary of authors. (clusters, authors)
-# Output: The list of destandardized clusters. Also, authors is destandardized as well.
-#         (clusters)
-def destandardizeClusterCenters(clusters, authors):
-    destandardizeAuthors(authors)
-    maxs, mins = getMaxsAndMins(authors)
-    for cluster in clusters:
-        for i in range(len(cluster.center)):
-            cluster.center[i] = ((cluster.center[i] - 0.01) * (maxs[i] - mins[i])) + mins[i]
-    return clusters
+# Given a series of clusters of data standardized by the given scaler,
+# finds the original values of their centers by reversing the calculation.
+# The clusters themselves are left untouched.
+# Input: the list of CureClusters and the scaler. (clusters, scaler)
+# Output: The destandardized center of each cluster, one row per cluster. (centers)
+def destandardizeClusterCenters(clusters, scaler):
+    centers = np.vstack([np.empty((0, NUM_FEATURES))] + [cluster.center for cluster in clusters])
+    return scaler.inverseTransform(centers)
 
 # Determines the distance from each author to its cluster center. This uses the standardized
-# values. Prints both the individual error, and the total error.
+# values. Prints both the individual error, and the total error, followed by the other
+# quality metrics of the clustering (see clusterMetrics.py).
 # Input: the list of the CureClusters (clusters)
-# Output: none, but print the error of the clusters
+# Output: the dictionary of metrics, which is also printed (metrics)
 def determineClustError(clusters):
-    j = 1
-    aggError = 0
-    for cluster in clusters:
-        totalDist = 0
-        for author in cluster.authors:
-            for i in range(len(author.repList)):
-                totalDist += math.sqrt((author.repList[i] - cluster.center[i])**2)
-        print "Total Clustering Error for Cluster #" + str(j) + ": " + str(totalDist)
-        j += 1
-        aggError += totalDist
-    print "The total Clustering Error for all Clusters is: " + str(aggError)
-        
+    if len(clusters) == 0:
+        return dict([])
+    data = clusters[0].matrix.data
+    labels, centers = getClusterLabels(clusters, len(data))
+    metrics = computeClusterMetrics(data, labels, centers, seed=CLUSTERING_SEED)
+    for j in range(len(clusters)):
+        print "Total Clustering Error for Cluster #" + str(j + 1) + ": " + str(metrics['l1Errors'][j])
+    print "The total Clustering Error for all Clusters is: " + str(metrics['totalL1Error'])
+    print "Inertia (total squared error): " + str(metrics['inertia'])
+    print "Cluster sizes: " + str(metrics['sizeSummary'])
+    print "Silhouette score (sampled): " + str(metrics['silhouette'])
+    print "Davies-Bouldin index: " + str(metrics['daviesBouldin'])
+    return metrics
 
 # A helper function which prints the clusters in a way which is readable, and gives
 # information about them. Also destandardizes them for readability purposes.
-# Input: the list of CureClusters, and the dictionary of authors. (clusters, authors)
+# Input: the list of CureClusters, and the scaler they were standardized with. (clusters, scaler)
 # Output: none, but prints information
-def printClusters(clusters, authors):
-    clusters = destandardizeClusterCenters(clusters, authors)
+def printClusters(clusters, scaler):
+    centers = destandardizeClusterCenters(clusters, scaler)
     i = 1
     for cluster in clusters:
         print "Cluster " + str(i) + ":"
-        print "\tCentroid: " + str(cluster.center)
-        print "\tNum Authors: " + str(len(cluster.authors))
+        print "\tCentroid: " + str(centers[i - 1])
+        print "\tNum Authors: " + str(len(cluster.rows))
         i += 1
 
+# Runs a sweep over a range of k from the command line, printing the score of each run
+# and the best configuration.
+# Input: the command line arguments after "sweep" (args)
+# Output: None
+def sweepMain(args):
+    if len(args) < 2 or len(args) > 4:
+        print "Usage: pypy cure.py sweep kMin kMax [workers [numSeeds]]"
+        return
+    kValues = range(int(args[0]), int(args[1]) + 1)
+    workers = int(args[2]) if len(args) >= 3 else 1
+    numSeeds = int(args[3]) if len(args) == 4 else 1
+    baseSeed = CLUSTERING_SEED if CLUSTERING_SEED is not None else 0
+    seeds = [baseSeed + i for i in range(numSeeds)]
+    authors = loadAuthors()
+    print "Sweeping k from " + args[0] + " to " + args[1] + " with " + str(numSeeds) + \
+          " seed(s) on " + str(workers) + " worker(s)."
+    results, best = sweepK(authors, kValues, seeds, workers)
+    print "%6s %8s %10s %12s %14s %14s %10s" % ("k", "seed", "clusters", "silhouette", \
+                                                "daviesBouldin", "inertia", "seconds")
+    for result in results:
+        print "%6d %8s %10d %12s %14s %14.4f %10.2f" % (result['k'], result['seed'], \
+              result['numClusters'], formatScore(result['silhouette']), \
+              formatScore(result['daviesBouldin']), result['inertia'], result['seconds'])
+    if best is None:
+        print "No run could be scored by " + SWEEP_SCORE + "."
+    else:
+        print "Best by " + SWEEP_SCORE + ": k = " + str(best['k']) + ", seed = " + str(best['seed']) + \
+              " (" + SWEEP_SCORE + " " + formatScore(best[SWEEP_SCORE]) + ")"
+
+# Helper function for sweepMain()
+# Input: a score, or None (score)
+# Output: the score formatted for printing (text)
+def formatScore(score):
+    return "-" if score is None else "%.4f" % score
+
+# Loads the author data from AUTHORS_FILE, or from AUTHORS_PICKLE if there is no author file.
+# Input: none
+# Output: the AuthorMatrix of authors (authors)
+def loadAuthors():
+    if os.path.exists(AUTHORS_FILE):
+        print "Memory-mapping author file."
+        authors = loadAuthorFile(AUTHORS_FILE)
+    else:
+        print "Attempting to load author data pickle."
+        authors = getAuthorsPickle(AUTHORS_PICKLE)
+    print str(len(authors)) + " authors in dataset."
+    return asAuthorMatrix(authors)
+
 def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == "sweep":
+        sweepMain(sys.argv[2:])
+        return
+    args = [arg for arg in sys.argv[1:] if arg != "--resume"]
+    resume = len(args) < len(sys.argv) - 1
     k = 5
-    if (len(sys.argv) != 2):
-        print "Usage: pypy cure.py k"
+    workers = 1
+    partitions = 1
+    if (len(args) < 1 or len(args) > 3):
+        print "Usage: pypy cure.py k [workers [partitions]] [--resume]"
+        print "       pypy cure.py sweep kMin kMax [workers [numSeeds]]"
         print "Continuing with k = 5"
     else:
-        k = int(sys.argv[1])
-    print "Attempting to load author data pickle."
-    authors = getAuthorsPickle("authorsFull.p")
-    # Can also load up authorsSmall.p for a faster runtime
-    print str(len(authors)) + " authors in dataset."
-    clusters = runCURE(authors, k)
-    determineClustError(clusters)
-    printClusters(clusters, authors)
+        k = int(args[0])
+        if len(args) >= 2:
+            workers = int(args[1])
+        if len(args) == 3:
+            partitions = int(args[2])
+    authors = loadAuthors()
+    profiler = None
+    if RUN_REPORT_FILE is not None:
+        profiler = RunProfiler()
+    checkpoint = None
+    if CHECKPOINT_DIR is not None:
+        checkpoint = RunCheckpoint(CHECKPOINT_DIR, resume)
+    elif resume:
+        print "CHECKPOINT_DIR is not set; nothing to resume from."
+    scaler = createScaler(SCALER_KIND).fit(authors.data)
+    clusters, outliers = runCURE(authors, k, workers, partitions=partitions, scaler=scaler, \
+                                 profiler=profiler, checkpoint=checkpoint)
+    saveCureModel(buildCureModel(clusters, scaler, REP_INDEX_KIND), CURE_MODEL_FILE)
+    print "Model saved to " + CURE_MODEL_FILE + "."
+    metrics = determineClustError(clusters)
+    printClusters(clusters, scaler)
+    print "Outliers: " + str(len(outliers.rows)) + " authors pruned."
+    if profiler is not None:
+        profiler.addResult("metrics", metrics)
+        profiler.writeReport(RUN_REPORT_FILE)
+        print "Run report written to " + RUN_REPORT_FILE + "."
     
 if __name__ == '__main__':
     main()
\ No newline at end of file
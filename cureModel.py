@@ -0,0 +1,104 @@
+# cureModel.py
+# by Zach Levonian and Freddy Stein
+# A compact, saved form of the clusters found by runCURE: the representative points,
+# the cluster of each of them, the cluster centroids, and the scaler used to
+# standardize the authors. It labels new authors the way getClosestCluster does, by the
+# cluster of the nearest representative point, without the clusters' authors.
+# The model file is a NumPy .npz archive of those arrays, the scaler's parameters
+# (see scalerToArrays) and a format version.
+# Convenience functions; intended to be used via import
+
+import numpy as np
+from authorMatrix import *
+from repIndex import *
+from scaler import *
+from checkpoint import *
+
+MODEL_VERSION = 2
+
+# This class holds a fitted CURE model. The reps and centroids are in standardized
+# units; predict() standardizes new authors with the stored scaler first.
+# Cluster labels are the ids of the CureClusters the model was built from.
+class CureModel(object):
+    def __init__(self, reps, repLabels, clusterIds, centers, scaler, indexKind="kdtree"):
+        self.reps = np.asarray(reps, dtype=np.float64).reshape(-1, NUM_FEATURES)
+        self.repLabels = np.asarray(repLabels, dtype=np.int64)
+        self.clusterIds = np.asarray(clusterIds, dtype=np.int64)
+        self.centers = np.asarray(centers, dtype=np.float64).reshape(-1, NUM_FEATURES)
+        self.scaler = scaler
+        self.index = buildRepIndex(self.reps, self.repLabels, indexKind)
+
+    def __repr__(self):
+        return "CureModel of " + str(len(self.clusterIds)) + " clusters and " + \
+               str(len(self.reps)) + " representative points"
+
+    def __len__(self):
+        return len(self.clusterIds)
+
+    # Finds the cluster of a single author.
+    # Input: an Author, an AuthorRow, or a sequence of its 6 raw features (author)
+    # Output: the id of the cluster with the nearest representative point (clusterId)
+    def predictOne(self, author):
+        if hasattr(author, "getData"):
+            author = author.getData()
+        point = self.scaler.transform(np.asarray(author, dtype=np.float64).reshape(1, NUM_FEATURES))
+        return int(self.clusterIds[self.index.nearest(point)[1][0]])
+
+    # Finds the cluster of each of a batch of authors, chunkSize authors at a time.
+    # Input: an AuthorMatrix, a dictionary of authors, or an (n, 6) array of raw
+    #        features, and the chunk size (authors, chunkSize)
+    # Output: the id of the cluster of each author, in matrix (or array) order (clusterIds)
+    def predict(self, authors, chunkSize=DEFAULT_CHUNK_SIZE):
+        return self.predictWithDistances(authors, chunkSize)[0]
+
+    # Finds the cluster of each of a batch of authors, as predict() does, along with
+    # the distance (in standardized units) to the nearest representative point.
+    # Input: an AuthorMatrix, a dictionary of authors, or an (n, 6) array of raw
+    #        features, and the chunk size (authors, chunkSize)
+    # Output: the id of the cluster of each author, and the distance to the nearest
+    #         representative point of each (clusterIds, distances)
+    def predictWithDistances(self, authors, chunkSize=DEFAULT_CHUNK_SIZE):
+        if isinstance(authors, np.ndarray):
+            data = authors.reshape(-1, NUM_FEATURES)
+        else:
+            data = asAuthorMatrix(authors).data
+        labels = np.empty(len(data), dtype=np.int64)
+        distances = np.empty(len(data), dtype=np.float64)
+        for start in range(0, len(data), chunkSize):
+            chunk = self.scaler.transform(data[start:start + chunkSize])
+            dists, labels[start:start + chunkSize] = self.index.nearest(chunk)
+            distances[start:start + chunkSize] = np.sqrt(dists)
+        return self.clusterIds[labels], distances
+
+####
+
+# Builds a model from the clusters returned by runCURE.
+# Input: the list of CureClusters, the fitted scaler the authors were standardized with,
+#        and the kind of rep index to search with (clusters, scaler, indexKind)
+# Output: the model (model)
+def buildCureModel(clusters, scaler, indexKind="kdtree"):
+    repCounts = [len(cluster.repPoints) for cluster in clusters]
+    reps = np.vstack([np.empty((0, NUM_FEATURES))] + [cluster.repPoints for cluster in clusters])
+    repLabels = np.repeat(np.arange(len(clusters)), repCounts)
+    clusterIds = [cluster.id for cluster in clusters]
+    centers = np.vstack([np.empty((0, NUM_FEATURES))] + [cluster.center for cluster in clusters])
+    return CureModel(reps, repLabels, clusterIds, centers, scaler, indexKind)
+
+# Writes a model to a file, under a temporary name first.
+# Input: the model, and the name of the file (model, fileName)
+# Output: None
+def saveCureModel(model, fileName):
+    writeAtomically(fileName, lambda outFile: np.savez(outFile, version=MODEL_VERSION, reps=model.reps, \
+                    repLabels=model.repLabels, clusterIds=model.clusterIds, centers=model.centers, \
+                    **scalerToArrays(model.scaler)))
+
+# Loads a model written by saveCureModel().
+# Input: the name of the file, and the kind of rep index to search with (fileName, indexKind)
+# Output: the model (model)
+def loadCureModel(fileName, indexKind="kdtree"):
+    with np.load(fileName) as stored:
+        if int(stored['version']) != MODEL_VERSION:
+            raise ValueError(fileName + " has unsupported model version " + str(stored['version']))
+        model = CureModel(stored['reps'], stored['repLabels'], stored['clusterIds'], \
+                          stored['centers'], scalerFromArrays(stored), indexKind)
+    return model
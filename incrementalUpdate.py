@@ -0,0 +1,248 @@
+# incrementalUpdate.py
+# by Zach Levonian and Freddy Stein
+# Updates the clustering when new data arrives, without reading the whole data files or
+# rerunning CURE. A delta directory holds the new rows in the dataRev2 formats:
+# PaperAuthor.csv, and optionally Paper.csv (the information of the new papers, or
+# corrections to old ones) and Author.csv (new authors). The new pairs are merged into
+# the paper store saved by pickleCreator, the features of only the authors whose papers
+# changed are recomputed by the rules of recomputeAuthors, and those authors are
+# reassigned to the cluster of their nearest representative point in the saved model
+# (see cureModel.py). The distance from every author to its nearest representative
+# point is kept in an assignments file. Once the mean distance has grown to more than
+# DRIFT_DISTANCE_GROWTH times its value at the last build, or more than
+# DRIFT_CHANGED_FRACTION of the authors have changed since then, the clusters are
+# rebuilt from scratch with runCURE.
+# Usage: pypy incrementalUpdate.py deltaDir [workers]
+
+import sys, os
+import numpy as np
+from cure import *
+
+# The paper store to merge new data into, as written by pickleCreator (OUT_PAPERS_FILENAME)
+PAPERS_FILE = "papersFull.npz"
+
+# Where the cluster of every author and its distance to the nearest representative
+# point are kept between updates
+ASSIGNMENTS_FILE = "assignments.npz"
+ASSIGNMENTS_VERSION = 1
+
+# The clusters are rebuilt once the mean distance to the nearest representative point
+# has grown by this factor since the last build, or once this fraction of the authors
+# has changed since then
+DRIFT_DISTANCE_GROWTH = 1.25
+DRIFT_CHANGED_FRACTION = 0.2
+
+# Applies the data files of a delta directory to the saved author features, model and
+# assignments, rebuilding the clusters if they have drifted too far.
+# Input: the delta directory, and the number of processes to rebuild with (deltaDir, workers)
+# Output: the drift metrics after the update, and whether the clusters were rebuilt
+#         (drift, rebuilt)
+def runIncrementalUpdate(deltaDir, workers=1):
+    papers, knownAuthorIds = loadPaperStore(PAPERS_FILE)
+    matrix = loadAuthorFile(AUTHORS_FILE, loadNames=True)
+    model = loadCureModel(CURE_MODEL_FILE, REP_INDEX_KIND)
+    assignments = loadAssignments(ASSIGNMENTS_FILE, matrix)
+    if assignments is None:
+        print "No assignments for these authors; assigning all " + str(len(matrix)) + " of them."
+        assignments = buildAssignments(model, matrix)
+    print "Applying the delta in " + deltaDir + "."
+    papers, knownAuthorIds, changedIds, newNames = applyPaperDelta(papers, knownAuthorIds, deltaDir)
+    print str(len(changedIds)) + " authors have new or changed papers. Recomputing their features."
+    matrix, assignments, counts = updateAuthors(matrix, assignments, papers, changedIds, newNames, model)
+    print str(counts['updated']) + " authors updated (" + str(counts['moved']) + " changed cluster), " + \
+          str(counts['added']) + " added and " + str(counts['removed']) + " removed."
+    drift = getDriftMetrics(assignments)
+    print "Mean distance to the nearest representative point grew by a factor of %.4f; " \
+          "%.2f%% of the authors changed since the last build." % \
+          (drift['distanceGrowth'], 100 * drift['changedFraction'])
+    rebuilt = needsRebuild(drift)
+    if rebuilt:
+        print "Drift past the thresholds; rebuilding the clusters."
+        model, assignments = rebuildClusters(matrix, len(model), workers)
+        saveCureModel(model, CURE_MODEL_FILE)
+    # The paper store is written last, so an update that is interrupted can be rerun
+    # against the old store
+    writeAuthorFile(matrix, AUTHORS_FILE)
+    saveAssignments(assignments, ASSIGNMENTS_FILE)
+    savePaperStore(papers, knownAuthorIds, PAPERS_FILE)
+    return drift, rebuilt
+
+# Merges the data files of a delta directory into a paper store. The information of new
+# papers missing from the delta's Paper.csv is looked up in dataRev2/Paper.csv.
+# Input: the PaperAuthorStore, the sorted ids of the known authors, and the delta
+#        directory (papers, knownAuthorIds, deltaDir)
+# Output: the merged store, the ids of the known authors, the sorted ids of the authors
+#         with new or changed papers, and a dictionary of id -> name of the new authors
+#         (papers, knownAuthorIds, changedIds, newNames)
+def applyPaperDelta(papers, knownAuthorIds, deltaDir):
+    newNames = dict([])
+    authorFile = os.path.join(deltaDir, "Author.csv")
+    if os.path.exists(authorFile):
+        newAuthors = getAuthors(authorFile)
+        newNames = dict([(authorId, newAuthors[authorId].name) for authorId in newAuthors])
+        knownAuthorIds = np.union1d(knownAuthorIds, np.array(newAuthors.keys(), dtype=np.int64))
+    pairsFile = os.path.join(deltaDir, "PaperAuthor.csv")
+    delta = PaperAuthorStore([], [])
+    if os.path.exists(pairsFile):
+        delta = readPaperAuthorPairs(pairsFile, knownAuthorIds)
+    merged = papers.merge(delta)
+    oldInfo = [merged.year.copy(), merged.conference.copy(), merged.journal.copy()]
+    paperFile = os.path.join(deltaDir, "Paper.csv")
+    if os.path.exists(paperFile):
+        readPaperInfo(merged, paperFile)
+    newPaperIds = delta.paperIds[~findRows(papers.paperIds, delta.paperIds)[1]]
+    newRows = findRows(merged.paperIds, newPaperIds)[0]
+    noInfo = (merged.year[newRows] == 0) & (merged.conference[newRows] == 0) & (merged.journal[newRows] == 0)
+    if noInfo.any():
+        print "Looking up " + str(np.count_nonzero(noInfo)) + " new papers in dataRev2/Paper.csv."
+        readPaperInfo(merged, "dataRev2/Paper.csv", PAPER_NUM, newPaperIds[noInfo])
+    changed = (merged.year != oldInfo[0]) | (merged.conference != oldInfo[1]) | (merged.journal != oldInfo[2])
+    changedIds = np.union1d(delta.authorIds, merged.getAuthorsOfPapers(merged.paperIds[changed]))
+    return merged, knownAuthorIds, changedIds, newNames
+
+# Recomputes the features of the given authors from the paper store, and reassigns them
+# against the model. Authors who now pass the rules of recomputeAuthors but weren't in
+# the matrix are added to the end of it, and authors who no longer pass are removed.
+# Input: the AuthorMatrix of authors, the assignments, the PaperAuthorStore, the ids of
+#        the authors whose papers changed, a dictionary of id -> name of new authors,
+#        and the model (matrix, assignments, papers, changedIds, newNames, model)
+# Output: the updated AuthorMatrix and assignments, and a dictionary of the number of
+#         authors updated, moved to another cluster, added and removed (matrix, assignments, counts)
+def updateAuthors(matrix, assignments, papers, changedIds, newNames, model):
+    authorIds, numPapers, numConferences, numJournals, firstYears, lastYears = \
+        papers.computeAuthorFeatures(changedIds)
+    keep = getKeptAuthors(numPapers, firstYears, lastYears)
+    features = buildFeatureRows(numPapers, numConferences, numJournals, firstYears, lastYears)
+    clusterIds, distances = model.predictWithDistances(features)
+    order = np.argsort(matrix.ids)
+    sortedRows, found = findRows(matrix.ids[order], authorIds)
+    rows = np.zeros(len(authorIds), dtype=np.intp)
+    rows[found] = order[sortedRows[found]]
+    updated, added = found & keep, ~found & keep
+    ids = np.array(matrix.ids)
+    data = np.array(matrix.data)
+    newAssignments = dict(assignments)
+    newAssignments['clusterIds'] = np.array(assignments['clusterIds'])
+    newAssignments['distances'] = np.array(assignments['distances'])
+    counts = dict([])
+    counts['moved'] = int(np.count_nonzero(newAssignments['clusterIds'][rows[updated]] != clusterIds[updated]))
+    data[rows[updated]] = features[updated]
+    newAssignments['clusterIds'][rows[updated]] = clusterIds[updated]
+    newAssignments['distances'][rows[updated]] = distances[updated]
+    names = matrix.names
+    if names is not None:
+        addedIds = authorIds[added].tolist()
+        missing = [authorId for authorId in addedIds if authorId not in newNames]
+        if len(missing) > 0:
+            newNames = dict(newNames.items() + getAuthorNames("dataRev2/Author.csv", missing).items())
+        names = list(names) + [newNames.get(authorId, "") for authorId in addedIds]
+    ids = np.concatenate([ids, authorIds[added]])
+    data = np.vstack([data, features[added]])
+    newAssignments['clusterIds'] = np.concatenate([newAssignments['clusterIds'], clusterIds[added]])
+    newAssignments['distances'] = np.concatenate([newAssignments['distances'], distances[added]])
+    retained = np.ones(len(ids), dtype=bool)
+    retained[rows[found & ~keep]] = False
+    if names is not None:
+        names = [names[row] for row in np.flatnonzero(retained).tolist()]
+    for name in ['clusterIds', 'distances']:
+        newAssignments[name] = newAssignments[name][retained]
+    newAssignments['ids'] = ids[retained]
+    counts['updated'] = int(np.count_nonzero(updated))
+    counts['added'] = int(np.count_nonzero(added))
+    counts['removed'] = int(np.count_nonzero(found & ~keep))
+    newAssignments['changedSinceBuild'] = int(assignments['changedSinceBuild']) + \
+                                          counts['updated'] + counts['added'] + counts['removed']
+    return AuthorMatrix(ids[retained], data[retained], names=names), newAssignments, counts
+
+# Helper function for updateAuthors()
+# Reads the names of the given authors from a file in the format of Author.csv.
+# Input: the name of the file, and the ids of the authors (fileName, authorIds)
+# Output: a dictionary of id -> name of those found (names)
+def getAuthorNames(fileName, authorIds):
+    wanted = set(authorIds)
+    names = dict([])
+    for content in streamRecords(fileName):
+        if int(content[0]) in wanted:
+            names[int(content[0])] = content[1]
+    return names
+
+# Measures how far the clustering has drifted since it was built.
+# Input: the assignments (assignments)
+# Output: a dictionary of the mean distance to the nearest representative point, its
+#         growth since the last build, and the fraction of authors changed since then (drift)
+def getDriftMetrics(assignments):
+    drift = dict([])
+    drift['meanDistance'] = float(assignments['distances'].mean()) if len(assignments['distances']) > 0 else 0.0
+    baseline = float(assignments['baselineDistance'])
+    drift['distanceGrowth'] = drift['meanDistance'] / baseline if baseline > 0 else 1.0
+    drift['changedFraction'] = float(assignments['changedSinceBuild']) / max(int(assignments['builtAuthors']), 1)
+    return drift
+
+# Decides whether the drift calls for rebuilding the clusters.
+# Input: the drift metrics (drift)
+# Output: True if either metric is past its threshold (rebuild)
+def needsRebuild(drift):
+    return drift['distanceGrowth'] > DRIFT_DISTANCE_GROWTH or drift['changedFraction'] > DRIFT_CHANGED_FRACTION
+
+# Reruns CURE from scratch on the current authors.
+# Input: the AuthorMatrix of authors, the number of clusters, and the number of
+#        processes (matrix, k, workers)
+# Output: the new model, and the assignments of the authors to it (model, assignments)
+def rebuildClusters(matrix, k, workers=1):
+    scaler = createScaler(SCALER_KIND).fit(matrix.data)
+    clusters, outliers = runCURE(matrix, k, workers, scaler=scaler)
+    model = buildCureModel(clusters, scaler, REP_INDEX_KIND)
+    return model, buildAssignments(model, matrix)
+
+# Assigns every author to the cluster of its nearest representative point in the
+# model, which becomes the baseline the drift is measured against.
+# Input: the model, and the AuthorMatrix of authors (model, matrix)
+# Output: the assignments: a dictionary of the author ids, their cluster ids and
+#         distances, the baseline mean distance, the number of authors at the build, and
+#         the number changed since (assignments)
+def buildAssignments(model, matrix):
+    clusterIds, distances = model.predictWithDistances(matrix.data, ASSIGN_CHUNK_SIZE)
+    assignments = dict([])
+    assignments['ids'] = np.array(matrix.ids)
+    assignments['clusterIds'] = clusterIds
+    assignments['distances'] = distances
+    assignments['baselineDistance'] = float(distances.mean()) if len(distances) > 0 else 0.0
+    assignments['builtAuthors'] = len(matrix)
+    assignments['changedSinceBuild'] = 0
+    return assignments
+
+# Writes the assignments to a file, under a temporary name first.
+# Input: the assignments, and the name of the file (assignments, fileName)
+# Output: None
+def saveAssignments(assignments, fileName):
+    writeAtomically(fileName, lambda outFile: np.savez(outFile, version=ASSIGNMENTS_VERSION, **assignments))
+
+# Loads the assignments written by saveAssignments(), if they belong to the given authors.
+# Input: the name of the file, and the AuthorMatrix of authors (fileName, matrix)
+# Output: the assignments, or None if there is no file or it holds other authors (assignments)
+def loadAssignments(fileName, matrix):
+    if not os.path.exists(fileName):
+        return None
+    with np.load(fileName) as stored:
+        if int(stored['version']) != ASSIGNMENTS_VERSION:
+            raise ValueError(fileName + " has unsupported assignments version " + str(stored['version']))
+        assignments = dict([(name, stored[name]) for name in stored.files if name != 'version'])
+    if not np.array_equal(assignments['ids'], matrix.ids):
+        return None
+    return assignments
+
+def main():
+    if len(sys.argv) < 2 or len(sys.argv) > 3:
+        print "Usage: pypy incrementalUpdate.py deltaDir [workers]"
+        return
+    workers = 1
+    if len(sys.argv) == 3:
+        workers = int(sys.argv[2])
+    drift, rebuilt = runIncrementalUpdate(sys.argv[1], workers)
+    if rebuilt:
+        print "Clusters rebuilt; model saved to " + CURE_MODEL_FILE + "."
+    else:
+        print "Authors reassigned; model unchanged."
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+# instrumentation.py
+# by Zach Levonian and Freddy Stein
+# Profiling for CURE runs. A RunProfiler times each phase of a run (wall clock and
+# CPU time, including worker processes once they have finished), counts the distance
+# evaluations and rep index queries made in this process, records how much each phase
+# raised the peak memory use, passes each of these to any hooks as it happens, and
+# collects everything into a run report that can be written out as JSON. When
+# profiling is off, runCURE uses NULL_PROFILER, whose methods do nothing beyond
+# printing the progress messages; SILENT_PROFILER doesn't even print them.
+# Convenience functions; intended to be used via import
+
+import time, resource, json
+import numpy as np
+from authorMatrix import *
+
+REPORT_VERSION = 2
+
+# Does nothing but print progress messages (unless quiet); used when no profiler is given.
+class NullProfiler(object):
+    enabled = False
+
+    def __init__(self, quiet=False):
+        self.quiet = quiet
+
+    def phase(self, name):
+        return NULL_PHASE
+
+    def log(self, message):
+        if not self.quiet:
+            print message
+
+    def addResult(self, name, value):
+        pass
+
+    def addHook(self, hook):
+        raise ValueError("Hooks need a RunProfiler")
+
+# The phase returned by NullProfiler
+class NullPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+NULL_PHASE = NullPhase()
+NULL_PROFILER = NullProfiler()
+SILENT_PROFILER = NullProfiler(quiet=True)
+
+# Records the phases, messages and results of a run. Hooks are called as
+# hook(event, record), where event is "phaseStart", "phaseEnd", "log" or "result".
+class RunProfiler(object):
+    enabled = True
+
+    def __init__(self, quiet=False):
+        self.quiet = quiet
+        self.hooks = []
+        self.phases = []
+        self.messages = []
+        self.results = dict([])
+        self.started = time.time()
+
+    def addHook(self, hook):
+        self.hooks.append(hook)
+
+    def callHooks(self, event, record):
+        for hook in self.hooks:
+            hook(event, record)
+
+    # Returns a context manager that profiles the code run inside it as a phase
+    def phase(self, name):
+        return ProfiledPhase(self, name)
+
+    # Prints a progress message (unless quiet) and records it in the report
+    def log(self, message):
+        if not self.quiet:
+            print message
+        record = dict([('time', time.time() - self.started), ('message', message)])
+        self.messages.append(record)
+        self.callHooks("log", record)
+
+    # Adds a named result, such as the cluster metrics, to the report
+    def addResult(self, name, value):
+        self.results[name] = toJSONValue(value)
+        self.callHooks("result", dict([('name', name), ('value', self.results[name])]))
+
+    # Builds the run report.
+    # Input: none
+    # Output: a dictionary that can be written as JSON (report)
+    def getReport(self):
+        report = dict([])
+        report['version'] = REPORT_VERSION
+        report['wallSeconds'] = time.time() - self.started
+        report['phases'] = self.phases
+        report['messages'] = self.messages
+        report['results'] = self.results
+        report['peakMemoryKB'] = getPeakMemory()
+        return report
+
+    # Writes the run report to a JSON file.
+    # Input: the name of the file (fileName)
+    # Output: None
+    def writeReport(self, fileName):
+        with open(fileName, "w") as outFile:
+            json.dump(self.getReport(), outFile, indent=2, sort_keys=True)
+
+# One phase of a RunProfiler; measures the differences between entering and leaving.
+# The peak memory is only ever known for the process as a whole, so a phase records
+# both the process peak when it ends and how far it raised that peak; a phase that
+# stays below an earlier peak shows an increase of 0.
+class ProfiledPhase(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = takeSnapshot()
+        self.profiler.callHooks("phaseStart", dict([('name', self.name)]))
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        end = takeSnapshot()
+        record = dict([('name', self.name)])
+        for key in end:
+            if key == 'processPeakMemoryKB':
+                record[key] = end[key]
+                record['peakMemoryIncreaseKB'] = end[key] - self.start[key]
+            else:
+                record[key] = end[key] - self.start[key]
+        record['failed'] = excType is not None
+        self.profiler.phases.append(record)
+        self.profiler.callHooks("phaseEnd", record)
+        return False
+
+####
+
+# Reads the clocks and counters a phase is measured with.
+# Input: none
+# Output: a dictionary of the current wall time, CPU time of this process and of its
+#         finished children, evaluation counts, and the process peak memory so far (snapshot)
+def takeSnapshot():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    childUsage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    snapshot = dict([])
+    snapshot['wallSeconds'] = time.time()
+    snapshot['cpuSeconds'] = usage.ru_utime + usage.ru_stime
+    snapshot['childCpuSeconds'] = childUsage.ru_utime + childUsage.ru_stime
+    snapshot['distanceEvaluations'] = evaluationCounts['distances']
+    snapshot['indexQueries'] = evaluationCounts['indexQueries']
+    snapshot['processPeakMemoryKB'] = getPeakMemory()
+    return snapshot
+
+# Finds the most memory (resident set size) used so far by this process or by any of
+# its finished children.
+# Input: none
+# Output: the peak memory use in kilobytes (peak)
+def getPeakMemory():
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, \
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+# Converts numpy values and arrays (possibly inside dictionaries and lists) into plain
+# Python values that json can write.
+# Input: the value (value)
+# Output: the converted value (converted)
+def toJSONValue(value):
+    if isinstance(value, dict):
+        return dict([(str(key), toJSONValue(value[key])) for key in value])
+    if isinstance(value, (list, tuple)):
+        return [toJSONValue(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
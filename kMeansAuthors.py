@@ -3,86 +3,183 @@
 # Contains a revised version of kMeans to play nice with the authors' dictionary data structure
 # Convenience functions; intended to be used via import
 
-import clustering, random, math
+import random, math
+import numpy as np
+from authorMatrix import *
+from scaler import *
+
+# Maximum number of passes kMeans makes over the authors, converged or not
+KMEANS_MAX_ITERATIONS = 300
+
+# kMeans has converged once no more than this many authors change cluster in a pass,
+KMEANS_MAX_SHIFTS = 5
+
+# or once no center moves by more than this squared distance in a pass
+KMEANS_TOLERANCE = 1e-10
 
 # Runs kMeans on the given authors, returning the clusters
-# Input: the dictionary of authors, and the list of intial centers. (authors, centers)
-# Output: the dictionary of clusters, and the list of final centers. (clusters, centers)
-def kMeans(authors, centers):
-    clusters = dict([])
-    for id in authors:
-        clusters[id] = clustering.getNearestCenter(authors[id].getData(), centers)
-    while True:
-        prevClusters = clusters.copy()
-        
-        centers = getNewCenters(authors, clusters, centers)
+# Input: the dictionary (or AuthorMatrix) of authors, the list of intial centers, and the
+#        convergence settings described above; None uses the constant's current value.
+#        (authors, centers, tolerance, maxIterations, maxShifts)
+# Output: the cluster index of each row of the author matrix, and the array of
+#         final centers. (clusters, centers)
+def kMeans(authors, centers, tolerance=None, maxIterations=None, maxShifts=None):
+    if tolerance is None:
+        tolerance = KMEANS_TOLERANCE
+    if maxIterations is None:
+        maxIterations = KMEANS_MAX_ITERATIONS
+    if maxShifts is None:
+        maxShifts = KMEANS_MAX_SHIFTS
+    data = asAuthorMatrix(authors).data
+    clusters, centers, iterations = lloydKMeans(data, centers, tolerance, maxIterations, maxShifts)
+    return clusters, centers
+
+# Runs Lloyd's algorithm over a data matrix. Each pass labels every point against all
+# the centers at once and moves the centers to the mean of their points with grouped
+# sums. Empty clusters are re-seeded with assignEmptyCenters(), or dropped when there
+# are fewer distinct points than centers, so fewer than k centers may be returned.
+# Input: the data matrix, the initial centers, the squared center movement below which
+#        to stop, the maximum number of passes, and the number of label changes at or
+#        below which to stop. (data, centers, tolerance, maxIterations, maxShifts)
+# Output: the cluster of each row, the final centers, and the number of passes made
+#         (clusters, centers, iterations)
+def lloydKMeans(data, centers, tolerance, maxIterations, maxShifts):
+    centers = np.array(centers, dtype=np.float64)
+    clusters = getNearestCenters(data, centers)[0]
+    iterations = 0
+    while iterations < maxIterations:
+        iterations += 1
+        prevClusters = clusters
+        prevCenters = centers
         
-        while True:
-            clustTotals = [0 for i in range(len(centers))]
-            for id in authors:
-                clusters[id] = clustering.getNearestCenter(authors[id].getData(), centers)
-                clustTotals[clusters[id]] += 1
-            emptyClusts = clustering.getEmptyClusts(clustTotals)
-            if len(emptyClusts) > 0:
-                #Reposition empty cluster centers and try again
-                centers = assignEmptyCenters(authors, centers, emptyClusts)
-            else: #No empty clusters detected.
-                break
+        centers = getNewCenters(data, clusters, centers)
+        clusters, centers = labelWithoutEmptyClusters(data, centers)
         
-        if getClusterShift(prevClusters, clusters) <= 5:
-            return clusters, centers
+        if len(centers) != len(prevCenters):
+            continue # Centers were dropped, so the labels can't be compared
+        movement = ((centers - prevCenters)**2).sum(axis=1).max()
+        if getClusterShift(prevClusters, clusters) <= maxShifts or movement <= tolerance:
+            break
+    return clusters, centers, iterations
+
+# Number of authors drawn for each step of miniBatchKMeans
+MINIBATCH_SIZE = 1024
+
+# Maximum number of mini-batch steps miniBatchKMeans takes
+MINIBATCH_MAX_ITERATIONS = 200
+
+# Runs mini-batch kMeans (Sculley, 2010) on the given authors. Each step draws a small
+# random batch of authors and moves every center to the running mean of all the points
+# it has been given so far, so the memory and time of a step depend on the batch size
+# rather than the number of authors. A final chunked pass labels every author.
+# Given rows, only those rows of the authors are clustered; the batches and the final
+# pass read them straight from the author matrix, without copying them out first.
+# Input: the dictionary (or AuthorMatrix) of authors, the list of initial centers, the
+#        batch size, the maximum number of steps, the squared center movement below
+#        which to stop, a seed for drawing the batches, and optionally the sorted rows
+#        to cluster. None for the batch size, steps or tolerance uses the constant's
+#        current value. (authors, centers, batchSize, maxIterations, tolerance, seed, rows)
+# Output: the cluster index of each row of the author matrix (or of each of the given
+#         rows), and the array of final centers, just as kMeans() returns. (clusters, centers)
+def miniBatchKMeans(authors, centers, batchSize=None, maxIterations=None, tolerance=None, seed=None, \
+                    rows=None):
+    if batchSize is None:
+        batchSize = MINIBATCH_SIZE
+    if maxIterations is None:
+        maxIterations = MINIBATCH_MAX_ITERATIONS
+    if tolerance is None:
+        tolerance = KMEANS_TOLERANCE
+    data = asAuthorMatrix(authors).data
+    if rows is None:
+        rows = np.arange(len(data))
+    randomState = np.random.RandomState(seed)
+    centers = np.array(centers, dtype=np.float64)
+    k = len(centers)
+    counts = np.zeros(k)
+    for iteration in range(maxIterations):
+        # The rows are sorted, so a sorted draw reads a memory-mapped matrix in file order
+        batch = data[rows[np.sort(randomState.randint(0, len(rows), batchSize))]]
+        batchClusters = getNearestCenters(batch, centers)[0]
+        batchCounts = np.bincount(batchClusters, minlength=k)
+        batchSums = np.empty((k, data.shape[1]))
+        for j in range(data.shape[1]):
+            batchSums[:, j] = np.bincount(batchClusters, weights=batch[:, j], minlength=k)
+        counts += batchCounts
+        moved = batchCounts > 0
+        step = (batchSums[moved] - batchCounts[moved][:, np.newaxis] * centers[moved]) / \
+               counts[moved][:, np.newaxis]
+        centers[moved] += step
+        if iteration > 0 and (step**2).sum(axis=1).max() <= tolerance:
+            break
+    clusters, centers = labelWithoutEmptyClusters(data, centers, rows)
+    return clusters, centers
+
+# Labels every point with its nearest center, re-seeding empty clusters with
+# assignEmptyCenters() until none are left. Empty clusters that can't be re-seeded,
+# because every distinct point already has a center, are dropped.
+# Input: the author data matrix, the array of centers, and optionally the sorted rows
+#        of the data to label (data, centers, rows)
+# Output: the cluster of each row (or of each of the given rows), and the (possibly
+#         re-seeded or fewer) centers (clusters, centers)
+def labelWithoutEmptyClusters(data, centers, rows=None):
+    while True:
+        clusters = getNearestCenters(data, centers, rows=rows)[0]
+        clustTotals = np.bincount(clusters, minlength=len(centers))
+        emptyClusts = np.flatnonzero(clustTotals == 0)
+        if len(emptyClusts) > 0:
+            #Reposition empty cluster centers and try again
+            centers, unseeded = assignEmptyCenters(data, centers, emptyClusts, rows)
+            centers = np.delete(centers, unseeded, axis=0)
+        else: #No empty clusters detected.
+            break
+    return clusters, centers
 
 # Returns the amount of shifting between two assignments of points to clusters
-# Input: the dictionary of where the authors were last iteration, and where the
+# Input: the array of where the authors were last iteration, and where the
 #        authors are for the current iteration. (prev, curr)
 # Output: the number of shifts which occured. (totalShift)
 def getClusterShift(prev, curr):
-    totalShift = 0
-    for id in prev:
-        if prev[id] != curr[id]:
-            totalShift += 1
+    totalShift = int(np.count_nonzero(prev != curr))
     return totalShift
 
-# Reassigns each empty cluster to its closest author
-# Input: the dictionary of authors, the list of centers, and the list of empty clusters
-#        (authors, centers, empty)
-# Output: a newly updated list of centers, where there are no longer empty clusters. (centers)
-def assignEmptyCenters(authors, centers, empty):
-    DISTANCE = 0
-    ID = 1
-    closestPoint = dict([])
-    #Initialize the closest point for each empty cluster center to be invalid and VERY far away
-    for clustIndex in empty:
-        closestPoint[clustIndex] = (999999, -1)
-    for id in authors:
-        for clustIndex in empty:
-            dist = clustering.getEucSquaredDistance(authors[id].getData(), centers[clustIndex])
-            if dist < closestPoint[clustIndex][DISTANCE]:
-                #Found a closer point; use this id unless we find a better one
-                closestPoint[clustIndex] = (dist, id)
-    for clustIndex in empty: #Actually assign the location of the new centers
-        centers[clustIndex] = authors[id].getData()
-    return centers
+# Reassigns each empty cluster to its closest author. Authors already sitting
+# exactly on a center are skipped, or the new center would stay empty; once every
+# author sits on a center, the remaining empty clusters can't be re-seeded.
+# The distances are found chunk by chunk, with getNearestCenters().
+# Input: the author data matrix, the array of centers, the array of empty clusters, and
+#        optionally the sorted rows of the data to choose from (data, centers, empty, rows)
+# Output: a newly updated array of centers, and the empty clusters that couldn't be
+#         re-seeded (centers, unseeded)
+def assignEmptyCenters(data, centers, empty, rows=None):
+    onCenter = getNearestCenters(data, centers, rows=rows)[1] == 0
+    unseeded = []
+    for i in range(len(empty)):
+        if onCenter.all(): # Fewer distinct authors than centers
+            unseeded.append(empty[i])
+            continue
+        dists = getNearestCenters(data, centers[empty[i]][np.newaxis, :], rows=rows)[1]
+        closestId = np.argmin(np.where(onCenter, np.inf, dists))
+        closest = data[closestId] if rows is None else data[rows[closestId]]
+        centers[empty[i]] = closest
+        onCenter |= getNearestCenters(data, closest[np.newaxis, :], rows=rows)[1] == 0
+    return centers, np.array(unseeded, dtype=np.intp)
 
 # Computes the new centers for a cluster given a cluster assignment
 # Gets the average of all points assigned to that cluster, or doesn't
 # move the cluster if it has no points inside of it.
-# Input: the dictionary of authors, the dictionary of clusters, and the list of centers
-#        (authors, clusters, centers)
-# Output: A list of averages for each cluster, which are then used as new cluster
+# Input: the author data matrix, the array of cluster assignments, and the array
+#        of centers (data, clusters, centers)
+# Output: An array of averages for each cluster, which are then used as new cluster
 #         centers. (clustAverages)
-def getNewCenters(authors, clusters, centers):
+def getNewCenters(data, clusters, centers):
     k = len(centers)
-    clustSums = [[0 for j in range(6)] for i in range(k)]
-    clustTotals = [0 for i in range(k)]
-    for id in authors:
-        clustNum = clusters[id]
-        clustTotals[clustNum] += 1
-        addToList(clustSums[clustNum], authors[id].getData())
-    clustAverages = [[0 for j in range(6)] for i in range(k)]
-    for i in range(k):
-        if clustTotals[i] != 0:
-            clustAverages[i] = [clustSums[i][j] / clustTotals[i] for j in range(6)]
+    clustTotals = np.bincount(clusters, minlength=k)
+    clustSums = np.empty((k, data.shape[1]), dtype=np.float64)
+    for j in range(data.shape[1]):
+        clustSums[:, j] = np.bincount(clusters, weights=data[:, j], minlength=k)
+    clustAverages = np.array(centers, dtype=np.float64)
+    nonEmpty = clustTotals != 0
+    clustAverages[nonEmpty] = clustSums[nonEmpty] / clustTotals[nonEmpty][:, np.newaxis]
     return clustAverages
     
 # Convenience method; Adds the vals of list b to the contents of list a
@@ -97,42 +194,103 @@ def addToList(a, b):
 
 # Finds initial cluster centers for kMeans by picking the first point
 # at random, then selecting the point that maximiszes distance from all
-# previously picked centers.
-# Input: the number of clusters to create at first, and the dictionary of authors
-#        which had been previously obtained from a pickled file. (k, authors)
+# previously picked centers. Each point keeps a running total of its squared distance
+# to the centers picked so far, which is only updated against the newest one, so
+# picking k centers from n points costs O(n * k).
+# Input: the number of clusters to create at first, the dictionary (or AuthorMatrix)
+#        of authors, and a seed for the random choice (None uses the random module's
+#        own state). (k, authors, seed)
 # Output: initial cluster centers, which are stored in a list of k size (centers)
-def getInitialCenters(k, authors):
-    centers = []
-    initialPoint = random.choice(authors.keys())
-    numFeatures = len(authors[initialPoint].getData())
-    centers.append(authors[initialPoint].getData())
+def getInitialCenters(k, authors, seed=None):
+    chooser = random if seed is None else random.Random(seed)
+    matrix = asAuthorMatrix(authors)
+    chosen = [matrix.getRow(chooser.choice(matrix.keys()))]
+    totalDists = np.zeros(len(matrix))
     for i in range(k - 1):
-        farPoint = []
-        maxDist = 0
-        for id in authors:
-            author = authors[id].getData()
-            totalDist = 0
-            for center in centers:
-                totalDist += clustering.getEucSquaredDistance(author, center)
-            if totalDist > maxDist:
-                maxDist = totalDist
-                farPoint = author
-        centers.append(farPoint)
+        totalDists += ((matrix.data - matrix.data[chosen[-1]])**2).sum(axis=1)
+        chosen.append(np.argmax(totalDists))
+    centers = [matrix.data[row] for row in chosen]
     return centers
 
+# The ways chooseInitialCenters() can seed kMeans: getInitialCenters' farthest-point
+# rule, k-means++ (Arthur and Vassilvitskii, 2007), or the oversampling k-means||
+# (Bahmani et al., 2012)
+SEEDING_STRATEGIES = ["farthest", "kmeans++", "kmeans||"]
+
+# Number of oversampling rounds made by k-means||
+KMEANS_PARALLEL_ROUNDS = 5
+
+# Expected number of candidates k-means|| samples per round, as a multiple of k
+KMEANS_PARALLEL_OVERSAMPLING = 2.0
+
+# Chooses k initial centers for kMeans with the given strategy.
+# Input: the number of clusters, the dictionary (or AuthorMatrix) of authors, one of
+#        SEEDING_STRATEGIES, and a seed for the random choices (k, authors, strategy, seed)
+# Output: the array of k initial centers (centers)
+def chooseInitialCenters(k, authors, strategy, seed=None):
+    if strategy == "farthest":
+        return np.array(getInitialCenters(k, authors, seed), dtype=np.float64)
+    data = asAuthorMatrix(authors).data
+    randomState = np.random.RandomState(seed)
+    if strategy == "kmeans++":
+        return kMeansPlusPlusCenters(data, np.ones(len(data)), k, randomState)
+    elif strategy == "kmeans||":
+        return kMeansParallelCenters(data, k, randomState)
+    raise ValueError("Unknown seeding strategy: " + str(strategy))
+
+# Chooses k centers with (weighted) k-means++ seeding: the first point at random,
+# then each next one with probability proportional to its weight times its squared
+# distance to the nearest center chosen so far. The running minimum distances are
+# only updated against the newest center, so this is O(n * k).
+# Input: the points, their weights, the number of centers, and a numpy RandomState
+#        (points, weights, k, randomState)
+# Output: the array of k centers (centers)
+def kMeansPlusPlusCenters(points, weights, k, randomState):
+    chosen = [randomState.choice(len(points), p=weights / float(weights.sum()))]
+    minDists = ((points - points[chosen[0]])**2).sum(axis=1)
+    for i in range(k - 1):
+        scores = weights * minDists
+        total = scores.sum()
+        if total > 0:
+            nextId = np.searchsorted(np.cumsum(scores), randomState.rand() * total, side='right')
+            nextId = min(nextId, len(points) - 1)
+        else: # Every point already sits on a center
+            nextId = randomState.randint(len(points))
+        chosen.append(nextId)
+        np.minimum(minDists, ((points - points[nextId])**2).sum(axis=1), out=minDists)
+    return np.array(points[chosen], dtype=np.float64)
+
+# Chooses k centers with k-means|| seeding. Starting from one random point, each round
+# samples every point independently with probability proportional to its squared
+# distance to the nearest candidate, about KMEANS_PARALLEL_OVERSAMPLING * k points per
+# round. The candidates are then weighted by how many points are nearest to them and
+# reduced to k centers with weighted k-means++.
+# Input: the data matrix, the number of centers, and a numpy RandomState (data, k, randomState)
+# Output: the array of k centers (centers)
+def kMeansParallelCenters(data, k, randomState):
+    oversampling = KMEANS_PARALLEL_OVERSAMPLING * k
+    candidates = [randomState.randint(len(data))]
+    minDists = ((data - data[candidates[0]])**2).sum(axis=1)
+    for roundNum in range(KMEANS_PARALLEL_ROUNDS):
+        cost = minDists.sum()
+        if cost == 0:
+            break
+        newIds = np.flatnonzero(randomState.rand(len(data)) < oversampling * minDists / cost)
+        if len(newIds) == 0:
+            continue
+        candidates.extend(newIds.tolist())
+        np.minimum(minDists, getNearestCenters(data, data[newIds])[1], out=minDists)
+    candidates = np.unique(candidates)
+    if len(candidates) < k:
+        return kMeansPlusPlusCenters(data, np.ones(len(data)), k, randomState)
+    weights = np.bincount(getNearestCenters(data, data[candidates])[0], minlength=len(candidates))
+    return kMeansPlusPlusCenters(data[candidates], weights.astype(np.float64), k, randomState)
+
 # This function finds the max and mins of each of the parameters associated
-# with an author.
-# Input: the dictionary of all the authors (authors)
+# with an author, using a fitted MinMaxScaler (see scaler.py).
+# Input: the dictionary (or AuthorMatrix) of all the authors (authors)
 # Output: the max value and min value for each author. This is used in standardization
 #         (maxs, mins)
 def getMaxsAndMins(authors):
-    maxs = [0 for i in range(6)]
-    mins = [99999 for i in range(6)]
-    for authorId in authors:
-        author = authors[authorId].getData()
-        for i in range(len(author)):
-            if author[i] > maxs[i]:
-                maxs[i] = author[i]
-            if author[i] < mins[i]:
-                mins[i] = author[i]
-    return maxs, mins
+    scaler = MinMaxScaler().fit(authors)
+    return scaler.maxs.tolist(), scaler.mins.tolist()
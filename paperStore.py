@@ -0,0 +1,195 @@
+# paperStore.py
+# by Zachary Levonian and Freddy Stein
+# A compact, array-backed store of the paper-author pairs and the paper information,
+# used by pickleCreator in place of a Paper object per paper and a list of papers per
+# Author. Both directions of the pairing are kept as CSR-style arrays: the sorted
+# distinct ids, an array of offsets, and the concatenated ids they point to.
+# A store can be saved to a .npz file, so later deltas of paper-author pairs can be
+# merged into it without reading the data files again (see incrementalUpdate.py).
+# Convenience functions; intended to be used via import
+
+import numpy as np
+from checkpoint import *
+
+PAPER_STORE_VERSION = 1
+
+# Builds one direction of the pairing as CSR arrays.
+# Input: the ids being grouped and the ids they point to (keys, values)
+# Output: the sorted distinct keys, the offsets of each key's values, and the values
+#         grouped by key and sorted within each group (keyIds, ptr, grouped)
+def buildCSR(keys, values):
+    order = np.lexsort((values, keys))
+    sortedKeys = keys[order]
+    keyIds, starts = np.unique(sortedKeys, return_index=True)
+    ptr = np.append(starts, len(sortedKeys)).astype(np.int64)
+    return keyIds, ptr, values[order]
+
+# Finds the rows of the given ids in a sorted id array.
+# Input: the sorted ids, and the ids to look up (sortedIds, ids)
+# Output: the row of each id, and whether it was found at all (rows, found)
+def findRows(sortedIds, ids):
+    ids = np.asarray(ids, dtype=np.int64)
+    rows = np.searchsorted(sortedIds, ids)
+    found = rows < len(sortedIds)
+    found[found] = sortedIds[rows[found]] == ids[found]
+    return rows, found
+
+# Finds the positions of the given segments of a CSR values array.
+# Input: the offset and length of each segment (starts, counts)
+# Output: the positions of every value in the segments, in order (positions)
+def getSegmentPositions(starts, counts):
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(np.asarray(starts, dtype=np.int64) - offsets, counts) + np.arange(counts.sum())
+
+# This class holds every paper-author pair along with the year, conference and
+# journal of each paper. A pair listed twice in PaperAuthor is kept twice, as the
+# per-author paper lists always did, so the paper counts stay the same.
+class PaperAuthorStore:
+    def __init__(self, paperIds, authorIds):
+        paperIds = np.asarray(paperIds, dtype=np.int64)
+        authorIds = np.asarray(authorIds, dtype=np.int64)
+        self.authorIds, self.authorPtr, self.authorPapers = buildCSR(authorIds, paperIds)
+        self.paperIds, self.paperPtr, self.paperAuthors = buildCSR(paperIds, authorIds)
+        self.year = np.zeros(len(self.paperIds), dtype=np.int32)
+        self.conference = np.zeros(len(self.paperIds), dtype=np.int64)
+        self.journal = np.zeros(len(self.paperIds), dtype=np.int64)
+
+    def __repr__(self):
+        return "PaperAuthorStore of " + str(len(self.paperIds)) + " papers and " + \
+               str(len(self.authorIds)) + " authors"
+
+    def __len__(self):
+        return len(self.paperIds)
+
+    def __contains__(self, paperId):
+        return findRows(self.paperIds, [paperId])[1][0]
+
+    # Returns the sorted ids of the papers of the given author
+    def getPapers(self, authorId):
+        rows, found = findRows(self.authorIds, [authorId])
+        if not found[0]:
+            return self.authorPapers[0:0]
+        return self.authorPapers[self.authorPtr[rows[0]]:self.authorPtr[rows[0] + 1]]
+
+    # Returns the sorted ids of the authors of the given paper
+    def getAuthors(self, paperId):
+        rows, found = findRows(self.paperIds, [paperId])
+        if not found[0]:
+            return self.paperAuthors[0:0]
+        return self.paperAuthors[self.paperPtr[rows[0]]:self.paperPtr[rows[0] + 1]]
+
+    # Returns the sorted distinct ids of the authors of any of the given papers
+    def getAuthorsOfPapers(self, paperIds):
+        rows, found = findRows(self.paperIds, paperIds)
+        rows = rows[found]
+        positions = getSegmentPositions(self.paperPtr[rows], self.paperPtr[rows + 1] - self.paperPtr[rows])
+        return np.unique(self.paperAuthors[positions])
+
+    # Returns every paper-author pair, grouped by author (paperIds, authorIds)
+    def getPairs(self):
+        return self.authorPapers, np.repeat(self.authorIds, np.diff(self.authorPtr))
+
+    # Returns a new store holding the pairs of both this store and the other. Each
+    # paper's year, conference and journal are taken from the other store where it
+    # knows them, and from this one otherwise.
+    def merge(self, other):
+        paperIds, authorIds = self.getPairs()
+        otherPaperIds, otherAuthorIds = other.getPairs()
+        merged = PaperAuthorStore(np.concatenate([paperIds, otherPaperIds]), \
+                                  np.concatenate([authorIds, otherAuthorIds]))
+        for store in [self, other]:
+            rows = findRows(merged.paperIds, store.paperIds)[0]
+            for name in ['year', 'conference', 'journal']:
+                values = getattr(store, name)
+                getattr(merged, name)[rows[values != 0]] = values[values != 0]
+        return merged
+
+    def hasPaper(self, authorId, paperId):
+        papers = self.getPapers(authorId)
+        row = np.searchsorted(papers, paperId)
+        return row < len(papers) and papers[row] == paperId
+
+    def hasAuthor(self, paperId, authorId):
+        authors = self.getAuthors(paperId)
+        row = np.searchsorted(authors, authorId)
+        return row < len(authors) and authors[row] == authorId
+
+    # Fills in the information of a batch of papers, ignoring papers not in the store.
+    # Conference and journal ids are only recorded when positive, and years only when
+    # positive, clamped to the range [minYear, maxYear].
+    # Input: arrays of paper ids, years, conference ids and journal ids, and the year
+    #        range (paperIds, years, conferences, journals, minYear, maxYear)
+    # Output: none
+    def setPaperInfo(self, paperIds, years, conferences, journals, minYear, maxYear):
+        rows, found = findRows(self.paperIds, paperIds)
+        years = np.asarray(years)
+        conferences = np.asarray(conferences)
+        journals = np.asarray(journals)
+        hasConference = found & (conferences > 0)
+        self.conference[rows[hasConference]] = conferences[hasConference]
+        hasJournal = found & (journals > 0)
+        self.journal[rows[hasJournal]] = journals[hasJournal]
+        hasYear = found & (years > 0)
+        self.year[rows[hasYear]] = np.clip(years[hasYear], minYear, maxYear)
+
+    # Computes the features of every author in the store, or of only the given authors,
+    # with grouped reductions over the author -> papers arrays. Years of 0 (unknown) are
+    # left out of the first and last year, which are 9999 and 0 respectively for an
+    # author with no known year.
+    # Input: optionally, the ids of the authors to compute; ids not in the store are
+    #        skipped (authorIds)
+    # Output: the sorted author ids and, for each of them, the number of papers,
+    #         conference papers and journal papers and the first and last year published
+    #         (authorIds, numPapers, numConferences, numJournals, firstYears, lastYears)
+    def computeAuthorFeatures(self, authorIds=None):
+        if authorIds is None:
+            authorIds, authorPapers = self.authorIds, self.authorPapers
+            numPapers = np.diff(self.authorPtr)
+        else:
+            rows, found = findRows(self.authorIds, authorIds)
+            rows = np.unique(rows[found])
+            authorIds = self.authorIds[rows]
+            numPapers = self.authorPtr[rows + 1] - self.authorPtr[rows]
+            authorPapers = self.authorPapers[getSegmentPositions(self.authorPtr[rows], numPapers)]
+        starts = np.cumsum(numPapers) - numPapers
+        paperRows = findRows(self.paperIds, authorPapers)[0]
+        years = self.year[paperRows]
+        if len(starts) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return authorIds, numPapers, empty, empty, empty, empty
+        numConferences = np.add.reduceat((self.conference[paperRows] != 0).astype(np.int64), starts)
+        numJournals = np.add.reduceat((self.journal[paperRows] != 0).astype(np.int64), starts)
+        firstYears = np.minimum.reduceat(np.where(years != 0, years, 9999), starts)
+        lastYears = np.maximum.reduceat(years, starts)
+        return authorIds, numPapers, numConferences, numJournals, firstYears, lastYears
+
+####
+
+# Writes a store and the ids of every author the pairs were filtered by to a file,
+# under a temporary name first.
+# Input: the PaperAuthorStore, the ids of the known authors, and the name of the file
+#        (papers, knownAuthorIds, fileName)
+# Output: None
+def savePaperStore(papers, knownAuthorIds, fileName):
+    paperIds, authorIds = papers.getPairs()
+    writeAtomically(fileName, lambda outFile: np.savez(outFile, version=PAPER_STORE_VERSION, \
+                    pairPaperIds=paperIds, pairAuthorIds=authorIds, paperIds=papers.paperIds, \
+                    year=papers.year, conference=papers.conference, journal=papers.journal, \
+                    knownAuthorIds=np.asarray(knownAuthorIds, dtype=np.int64)))
+
+# Loads a store written by savePaperStore().
+# Input: the name of the file (fileName)
+# Output: the PaperAuthorStore, and the sorted ids of the known authors (papers, knownAuthorIds)
+def loadPaperStore(fileName):
+    with np.load(fileName) as stored:
+        if int(stored['version']) != PAPER_STORE_VERSION:
+            raise ValueError(fileName + " has unsupported paper store version " + str(stored['version']))
+        papers = PaperAuthorStore(stored['pairPaperIds'], stored['pairAuthorIds'])
+        if not np.array_equal(papers.paperIds, stored['paperIds']):
+            raise ValueError(fileName + " is not a consistent paper store")
+        papers.year[:] = stored['year']
+        papers.conference[:] = stored['conference']
+        papers.journal[:] = stored['journal']
+        knownAuthorIds = np.sort(stored['knownAuthorIds'])
+    return papers, knownAuthorIds
@@ -0,0 +1,112 @@
+# parallelAssign.py
+# by Zach Levonian and Freddy Stein
+# Spreads the labeling of the remaining authors over a pool of worker processes.
+# The rows of the author data to label and the frozen representative points are copied
+# once into shared memory, so each task only carries the bounds of its shard. Each worker
+# builds its own nearest-neighbour index over the shared reps when it starts.
+# Convenience functions; intended to be used via import
+
+import multiprocessing, ctypes
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+from authorMatrix import *
+from repIndex import *
+
+# Number of shards handed out per worker; a few per worker evens out the load
+SHARDS_PER_WORKER = 4
+
+# The shared arrays, as seen from inside a worker process
+workerArrays = dict([])
+
+# Copies an array into a block of shared memory that child processes can read.
+# Input: the array to share (array)
+# Output: the shared memory block, and its shape and numpy type (shared, shape, dtype)
+def toSharedArray(array):
+    ctype = ctypes.c_int64 if array.dtype.kind in 'iu' else ctypes.c_double
+    dtype = np.int64 if array.dtype.kind in 'iu' else np.float64
+    shared = RawArray(ctype, max(array.size, 1))
+    view = np.frombuffer(shared, dtype=dtype)[:array.size].reshape(array.shape)
+    view[...] = array
+    return shared, array.shape, dtype
+
+# Rebuilds a numpy view of an array shared by toSharedArray(); no data is copied.
+# Input: the shared memory block, its shape and its numpy type (shared, shape, dtype)
+# Output: the array view (array)
+def fromSharedArray(shared, shape, dtype):
+    size = int(np.prod(shape))
+    return np.frombuffer(shared, dtype=dtype)[:size].reshape(shape)
+
+# Pool initializer; stores views of the shared arrays and an index over the reps
+# for labelShard() to use.
+# Input: a dictionary of name -> (shared, shape, dtype), and the kind of rep index
+#        (sharedArrays, indexKind)
+# Output: none
+def initWorker(sharedArrays, indexKind):
+    for name in sharedArrays:
+        workerArrays[name] = fromSharedArray(*sharedArrays[name])
+    workerArrays['index'] = buildRepIndex(workerArrays['reps'], workerArrays['repLabels'], indexKind)
+
+# Copies the given rows of a matrix into a block of shared memory, a chunk of rows at
+# a time, so the rows are never all copied twice.
+# Input: the matrix, the rows to share, and the chunk size (data, rows, chunkSize)
+# Output: the shared memory block, and its shape and numpy type (shared, shape, dtype)
+def toSharedRows(data, rows, chunkSize=DEFAULT_CHUNK_SIZE):
+    shape = (len(rows),) + tuple(data.shape[1:])
+    shared = RawArray(ctypes.c_double, max(int(np.prod(shape)), 1))
+    view = fromSharedArray(shared, shape, np.float64)
+    for start in range(0, len(rows), chunkSize):
+        view[start:start + chunkSize] = data[rows[start:start + chunkSize]]
+    return shared, shape, np.float64
+
+# Labels one shard of the shared rows inside a worker process.
+# Input: the shard bounds within the shared rows, and the chunk size (task)
+# Output: the start of the shard and the cluster label of each of its rows (start, labels)
+def labelShard(task):
+    start, stop, chunkSize = task
+    labels = getNearestRepLabels(workerArrays['data'], np.arange(start, stop), workerArrays['index'], chunkSize)
+    return start, labels
+
+# Starts a pool of worker processes to label the given rows of the author data. Only
+# those rows are copied into shared memory, along with the representative points; the
+# pool then labels any range of them with labelWithPool().
+# Input: the author data matrix, the rows to label, the stacked representative points
+#        and their cluster labels, the number of worker processes, and the kind of rep
+#        index to use. (data, rows, reps, repLabels, workers, indexKind)
+# Output: the pool (pool)
+def startAssignPool(data, rows, reps, repLabels, workers, indexKind="brute"):
+    sharedArrays = dict([])
+    sharedArrays['data'] = toSharedRows(data, np.asarray(rows))
+    sharedArrays['reps'] = toSharedArray(np.asarray(reps))
+    sharedArrays['repLabels'] = toSharedArray(np.asarray(repLabels))
+    return multiprocessing.Pool(workers, initializer=initWorker, initargs=(sharedArrays, indexKind))
+
+# Labels a range of the rows given to startAssignPool(), sharded over the pool.
+# Input: the pool, the bounds of the range within the pool's rows, the number of worker
+#        processes, and the chunk size (pool, start, stop, workers, chunkSize)
+# Output: the cluster label of each row in the range (labels)
+def labelWithPool(pool, start, stop, workers, chunkSize=DEFAULT_CHUNK_SIZE):
+    labels = np.empty(stop - start, dtype=np.intp)
+    shardSize = max(chunkSize, int(np.ceil((stop - start) / float(workers * SHARDS_PER_WORKER))))
+    tasks = [(shardStart, min(shardStart + shardSize, stop), chunkSize) \
+             for shardStart in range(start, stop, shardSize)]
+    for shardStart, shardLabels in pool.imap_unordered(labelShard, tasks):
+        labels[shardStart - start:shardStart - start + len(shardLabels)] = shardLabels
+    return labels
+
+# Parallel version of getNearestRepLabels(); shards the rows over a process pool
+# and merges the per-shard labels back in order, so the result is identical.
+# Input: the author data matrix, the rows to label, the stacked representative points
+#        and their cluster labels, the number of worker processes, the chunk size, and
+#        the kind of rep index to use. (data, rows, reps, repLabels, workers, chunkSize, indexKind)
+# Output: the cluster label for each of the given rows (labels)
+def getNearestRepLabelsParallel(data, rows, reps, repLabels, workers, \
+                                chunkSize=DEFAULT_CHUNK_SIZE, indexKind="brute"):
+    if len(rows) == 0:
+        return np.empty(0, dtype=np.intp)
+    pool = startAssignPool(data, rows, reps, repLabels, workers, indexKind)
+    try:
+        labels = labelWithPool(pool, 0, len(rows), workers, chunkSize)
+    finally:
+        pool.close()
+        pool.join()
+    return labels
@@ -2,29 +2,49 @@
 #   from the various data files; a lot of parsing and handling of bad input happens here.
 # by Zachary Levonian and Freddy Stein
 
-import re
+import sys, csv, itertools
 import cPickle as pickle
+import numpy as np
+from paperStore import *
+from authorMatrix import *
+from authorFile import *
 
 # The filename of the output pickle, which is a dictionary of authors
 OUT_FILENAME = "authorsSmall.p"
 
+# The filename of the output author file, the same authors in the columnar format
+# that cure.py memory-maps (see authorFile.py)
+OUT_AUTHOR_FILENAME = "authorsSmall.bin"
+
+# The filename of the output paper store, the paper-author pairs and paper information
+# that incrementalUpdate.py merges new data into (see savePaperStore in paperStore.py)
+OUT_PAPERS_FILENAME = "papersSmall.npz"
+
 # These constants limit the number of lines read from the data files.
 # Will read in to the nearest 10000th + 1, rounded up.
 PAPERAUTHOR_NUM = 1000000
 PAPER_NUM = 1000000
 
+# Number of records parsed and handed on at a time while streaming the data files;
+# peak memory while loading depends on this rather than on the file sizes.
+CHUNK_SIZE = 10000
+
 # Number of papers an author must have in the dataset to be considered
 PAPERS_THRESHOLD = 4
 
+# Paper years outside of this range are clamped to it
+MIN_YEAR = 1960
+MAX_YEAR = 2013
+
 # This class describes a scholarly author in some detail;
 # A dictionary of these objects will be pickled to a file for clustering.
+# Which papers an author wrote is kept in a PaperAuthorStore (see paperStore.py).
 class Author:
     def __init__(self, _id, _name):
         self.id = _id
         self.name = _name
         #self.conferences = [] #These are totally unused
         #self.journals = []    #Could add them as a feature: Intersection size between two users.
-        self.papers = []
         self.numConferences = 0
         self.numJournals = 0
         self.yearsActive = 0
@@ -35,7 +55,7 @@ class Author:
     
     def __repr__(self):
         selfStr = str(self.id) + " " + self.name + "\n"
-        selfStr += "\tNumber of Papers: " + str(len(self.papers)) + "\n"
+        selfStr += "\tNumber of Papers: " + str(self.numPapers) + "\n"
         selfStr += "\tConferences: " + str(self.numConferences) + "\n"
         selfStr += "\tJournals: " + str(self.numJournals) + "\n"
         selfStr += "\tYears Active: " + str(self.yearsActive) + "\n"
@@ -44,16 +64,6 @@ class Author:
     def __str__(self):
         return self.__repr__()
     
-    def addPaper(self, paper):
-        self.papers.append(paper)
-    
-    def hasPaper(self, paper):
-        return (paper in self.papers)
-        
-    def printPapers(self):
-        for i in range(len(self.papers)):
-            print self.papers[i]
-    
     def buildRepList(self):
         self.repList = [self.numPapers, self.numConferences, self.numJournals, \
                        self.yearsActive, self.firstYearPublished, self.lastYearPublished]
@@ -61,120 +71,120 @@ class Author:
     def getData(self):
         return self.repList
 
-# This class contains information about an individual paper
-class Paper:
-    def __init__(self, _id):
-        self.id = _id
-        self.name = ""
-        self.conference = 0
-        self.journal = 0
-        self.year = 0
-        self.authors = []
-    
-    def addAuthor(self, author):
-        self.authors.append(author)
-        
-    def hasAuthor(self, author):
-        return (author in self.authors)
-
 ####
 
-# Generic file reading method. Skips the first line, as it assumes it's a header.
+# Generic file streaming method. Skips the first line, as it assumes it's a header.
+# Records are parsed lazily as CSV, so quoted fields (such as paper titles) may
+# contain commas and span several lines.
 # Input: Name of the file to read (fileName)
-# Output: the lines of the file which has just been read (data)
-def loadData(fileName):
-    inFile = open(fileName, 'r')
-    inFile.readline()
-    data = inFile.readlines()
-    inFile.close()
-    return data
+# Output: a generator of the records of the file, each a list of fields (records)
+def streamRecords(fileName):
+    with open(fileName, 'rb') as inFile:
+        reader = csv.reader(inFile)
+        next(reader, None)
+        for record in reader:
+            yield record
+
+# Groups the records of a file into lists of at most chunkSize records.
+# Input: Name of the file to read, and the number of records per chunk (fileName, chunkSize)
+# Output: a generator of lists of records (chunks)
+def streamChunks(fileName, chunkSize=CHUNK_SIZE):
+    records = streamRecords(fileName)
+    while True:
+        chunk = list(itertools.islice(records, chunkSize))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+# Parses the given columns of a chunk of records as integers. Records that are too
+# short or hold a non-integer in one of the columns are skipped.
+# Input: a list of records, the indexes of the columns to parse, and the number of
+#        fields a record needs to be used (chunk, columns, minFields)
+# Output: a list holding an int64 array for each of the columns (parsed)
+def parseIntColumns(chunk, columns, minFields):
+    values = []
+    for content in chunk:
+        try:
+            if len(content) < minFields:
+                raise ValueError
+            values.append([int(content[i]) for i in columns])
+        except ValueError:
+            print "Skipping record " + ",".join(content)
+    parsed = np.array(values, dtype=np.int64).reshape(len(values), len(columns))
+    return [parsed[:, i] for i in range(len(columns))]
 
 # Loads in the papers. Then runs through all the papers, and updates the paper
 # associated with it if it already exist in the papers set created by
 # running through PaperAuthor. This takes some time. If the paper
-# has no author attached to it, then it is ignored.
-# Input: The dictionary of papers which was previously created by PaperAuthor (papers)
-# Output: That dictionary list of papers, which is now updated with information (papers)
+# has no author attached to it, then it is ignored. Each chunk of the file is
+# parsed into arrays and applied to the store at once.
+# Input: The PaperAuthorStore which was previously created by PaperAuthor (papers)
+# Output: That store of papers, which is now updated with information (papers)
 def getPaperInfo(papers):
-    papersFile = loadData("dataRev2/Paper.csv")
-    print "File loaded; parsing lines."
-    newPaper = ""
+    print "Streaming papers file."
+    return readPaperInfo(papers, "dataRev2/Paper.csv", PAPER_NUM)
+
+# Reads a file in the format of Paper.csv into a store of papers, as getPaperInfo does.
+# Input: the PaperAuthorStore, the name of the file, the number of lines after which
+#        to stop (None reads them all), and optionally the only paper ids to update
+#        (papers, fileName, limit, onlyPaperIds)
+# Output: the updated store of papers (papers)
+def readPaperInfo(papers, fileName, limit=None, onlyPaperIds=None):
     time = 0
-    for paper in papersFile:
-        time += 1
-        if time % 10000 == 0:
-            print "Line: " + str(time)
-            if time > PAPER_NUM:
-                return papers
-        if re.match("\d+,", paper) != None and newPaper != "":
-            newPaper = re.sub("\".*\",(?=\d+|-\d+)", ',', newPaper, flags=re.MULTILINE | re.DOTALL)
-            content = newPaper.split(",")
-            paperId = int(content[0])
-            if paperId not in papers:
-                newPaper = ""
-                newPaper += paper.strip()
-                continue
-            year = int(content[2])
-            conferenceId = int(content[3])
-            journalId = int(content[4])
-            paperObj = papers[paperId]
-            if conferenceId > 0:
-                paperObj.conference = conferenceId
-            if journalId > 0:
-                paperObj.journal = journalId
-            if year > 0:
-                if year > 2013:
-                    year = 2013
-                if year < 1960:
-                    year = 1960
-                paperObj.year = year
-            newPaper = ""
-        newPaper += paper.strip()
+    for chunk in streamChunks(fileName):
+        paperIds, years, conferenceIds, journalIds = parseIntColumns(chunk, [0, 2, 3, 4], 5)
+        if onlyPaperIds is not None:
+            wanted = findRows(onlyPaperIds, paperIds)[1]
+            paperIds, years, conferenceIds, journalIds = \
+                paperIds[wanted], years[wanted], conferenceIds[wanted], journalIds[wanted]
+        papers.setPaperInfo(paperIds, years, conferenceIds, journalIds, MIN_YEAR, MAX_YEAR)
+        time += len(chunk)
+        print "Line: " + str(time)
+        if limit is not None and time > limit:
+            return papers
     return papers
 
-# Adds papers associated with at least one author in the given dict
-# to a paper dictionary.  Only extracts paper id and author id. This program
+# Collects the paper-author pairs whose author is in the given dict into a
+# PaperAuthorStore. Only extracts paper id and author id. This program
 # takes quite a while to run, as PaperAuthor is a massive file.
 #
 # But actually, it takes a really long time to run. Just a warning.
 #
 # Input: the dictionary of authors previously created by getAuthors() (authors)
-# Output: updated authors, who now have papers associated with them, and a 
-#         new dictionary of papers, which is every paper which is confirmed to have an author
-#         (papers, authors)
+# Output: a new store of papers, which holds every paper which is confirmed to have an
+#         author and the pairs linking them, and the unchanged authors (papers, authors)
 def readPaperAuthor(authors):
-    papers = dict([])
-    lines = loadData("dataRev2/PaperAuthor.csv")
-    print "File loaded; parsing lines."
-    time = 0
-    for line in lines:
-        content = line.split(",")
-        if len(content) <= 2:
-            print "Skipping line " + line
-            continue
-        paperId = int(content[0])
-        authorId = int(content[1])
-        if authorId in authors:
-            authors[authorId].addPaper(paperId)
-            if paperId not in papers:
-                paper = Paper(paperId)
-                papers[paperId] = paper
-            papers[paperId].addAuthor(authorId)
-        time += 1
-        if (time % 10000) == 0:
-        	print "Line:", time
-        	if (time > PAPERAUTHOR_NUM):
-        		return papers, authors
+    knownAuthors = np.sort(np.fromiter(authors.keys(), dtype=np.int64, count=len(authors)))
+    print "Streaming PaperAuthor file."
+    papers = readPaperAuthorPairs("dataRev2/PaperAuthor.csv", knownAuthors, PAPERAUTHOR_NUM)
     return papers, authors
 
+# Reads the pairs of a file in the format of PaperAuthor.csv whose author is known.
+# Input: the name of the file, the sorted ids of the known authors, and the number of
+#        lines after which to stop (None reads them all) (fileName, knownAuthors, limit)
+# Output: a new store of the pairs read, without any paper information (papers)
+def readPaperAuthorPairs(fileName, knownAuthors, limit=None):
+    paperIdChunks = []
+    authorIdChunks = []
+    time = 0
+    for chunk in streamChunks(fileName):
+        paperIds, authorIds = parseIntColumns(chunk, [0, 1], 3)
+        known = findRows(knownAuthors, authorIds)[1]
+        paperIdChunks.append(paperIds[known])
+        authorIdChunks.append(authorIds[known])
+        time += len(chunk)
+        print "Line:", time
+        if limit is not None and time > limit:
+            break
+    return PaperAuthorStore(np.concatenate([np.zeros(0, dtype=np.int64)] + paperIdChunks), \
+                            np.concatenate([np.zeros(0, dtype=np.int64)] + authorIdChunks))
+
 # Returns a dictionary of authors, with only id and name filled
-# Input: none
+# Input: optionally, the name of the file to read in place of dataRev2/Author.csv (fileName)
 # Output: A dictionary of authors (authors)
-def getAuthors():
+def getAuthors(fileName="dataRev2/Author.csv"):
     authors = dict([])
-    lines = loadData("dataRev2/Author.csv")
-    for line in lines:
-        content = line.split(",")
+    for content in streamRecords(fileName):
         authorId = int(content[0])
         authorName = content[1]
         author = Author(authorId, authorName)
@@ -182,47 +192,49 @@ def getAuthors():
     return authors
 
 # Calculates the various features from the set of papers associated
-# with each author. Further elaborated within the program itself
-# Input: the dictionary of authors and the dictionary of papers (authors, papers)
+# with each author, using grouped array reductions over the paper store.
+# Authors with fewer than PAPERS_THRESHOLD papers, or without any year
+# information, are deleted.
+# Input: the dictionary of authors and the PaperAuthorStore (authors, papers)
 # Output: the newly updated list of authors. Papers is no longer needed (authors)
 def recomputeAuthors(authors, papers):
-    toDel = []
-    for author in authors:
-        #First, delete any author from the set that has fewer than t papers
-        if len(authors[author].papers) < PAPERS_THRESHOLD:
-            toDel.append(author)
-            continue
-        #Second, compute firstYearPublished and lastYearPublished.
-        #Third, compute numConferences and numJournals
-        #Fourth, build the conferences and journals lists
-        authorObj = authors[author]
-        for paperId in authorObj.papers:
-            paper = papers[paperId]
-            if paper.year != 0:
-                if paper.year > authorObj.lastYearPublished:
-                    authorObj.lastYearPublished = paper.year
-                if paper.year < authorObj.firstYearPublished:
-                    authorObj.firstYearPublished = paper.year
-            if paper.conference != 0:
-                authorObj.numConferences += 1
-                #authorObj.conferences.append(paper.conference)
-            if paper.journal != 0:
-                authorObj.numJournals += 1
-                #authorObj.journals.append(paper.journal)
-        #Fifth, compute yearsActive, if at least one paper had a year
-        if authorObj.lastYearPublished == 0 and authorObj.firstYearPublished == 9999:
-            toDel.append(author) #Delete authors without any year info
-            continue
+    authorIds, numPapers, numConferences, numJournals, firstYears, lastYears = \
+        papers.computeAuthorFeatures()
+    keep = getKeptAuthors(numPapers, firstYears, lastYears)
+    for i in np.flatnonzero(keep).tolist():
+        authorObj = authors[int(authorIds[i])]
+        authorObj.numPapers = int(numPapers[i])
+        authorObj.numConferences = int(numConferences[i])
+        authorObj.numJournals = int(numJournals[i])
+        authorObj.firstYearPublished = int(firstYears[i])
+        authorObj.lastYearPublished = int(lastYears[i])
         authorObj.yearsActive = authorObj.lastYearPublished - authorObj.firstYearPublished
-        #Sixth, confirm the number of papers
-        authorObj.numPapers = len(authorObj.papers)
-        #Seventh, compute the actual list that will be used in CURE
         authorObj.buildRepList()
-    #Complete the deletion
-    for key in toDel:
-        del authors[key]
+    #Delete every author who was not kept, including those with no papers at all
+    keptIds = set(authorIds[keep].tolist())
+    for key in authors.keys():
+        if key not in keptIds:
+            del authors[key]
     return authors
 
+# Helper function for recomputeAuthors()
+# Decides which authors are kept: those with at least PAPERS_THRESHOLD papers and
+# some year information.
+# Input: the number of papers and the first and last year of each author
+#        (numPapers, firstYears, lastYears)
+# Output: whether each author is kept (keep)
+def getKeptAuthors(numPapers, firstYears, lastYears):
+    return (numPapers >= PAPERS_THRESHOLD) & ~((lastYears == 0) & (firstYears == 9999))
+
+# Builds the feature rows of authors from the values computed by computeAuthorFeatures,
+# in the order of Author.buildRepList.
+# Input: the number of papers, conference papers and journal papers and the first and
+#        last year of each author (numPapers, numConferences, numJournals, firstYears, lastYears)
+# Output: the (n, 6) array of features (data)
+def buildFeatureRows(numPapers, numConferences, numJournals, firstYears, lastYears):
+    return np.column_stack([numPapers, numConferences, numJournals, lastYears - firstYears, \
+                            firstYears, lastYears]).astype(np.float64).reshape(-1, NUM_FEATURES)
+
 # Creates the actual pickle file.
 # Input: the dictionary of authors to pickle, and the name of the file to place the info in
 #        (authors, fileName)
@@ -231,6 +243,22 @@ def createPickleFile(authors, fileName):
     pickle.dump(authors, open(fileName, 'wb'))
 
 
+# Creates the columnar author file, which holds the features and names only.
+# Input: the dictionary of authors to store, and the name of the file to place the info in
+#        (authors, fileName)
+# Output: None
+def createAuthorFile(authors, fileName):
+    matrix = buildAuthorMatrix(authors)
+    matrix.names = [authors[authorId].name for authorId in matrix.ids.tolist()]
+    writeAuthorFile(matrix, fileName)
+
+# Converts an existing pickle file into a columnar author file.
+# Input: the filename of the pickled data, and the name of the file to create
+#        (pickleName, fileName)
+# Output: None
+def convertPickleFile(pickleName, fileName):
+    createAuthorFile(getAuthorsPickle(pickleName), fileName)
+
 # Loads the pickle file.
 # Input: the filename of the pickled data (file)
 # Output: the dictionary of authors which had previously been created (authors)
@@ -242,10 +270,16 @@ def getAuthorsPickle(file):
 # Loads all the various datafiles, with the intention of creating a dictionary of 
 # authors which can be used in a clustering algorithm.
 # Input: None
-# Output: Creates a pickle file at the designated OUT_FILENAME, and also prints all the
+# Output: Creates a pickle file at the designated OUT_FILENAME, an author file at
+#         OUT_AUTHOR_FILENAME and a paper store at OUT_PAPERS_FILENAME, and also prints all the
 #         authors, which reveals the # of papers published, info about conferences and 
 #         journals, and the # of years active.
+# Run with two filenames instead to convert an existing pickle into an author file.
 def main():
+    if len(sys.argv) == 3:
+        convertPickleFile(sys.argv[1], sys.argv[2])
+        print "Author file " + sys.argv[2] + " created."
+        return
     print "Loading authors."
     authors = getAuthors()
     print "Authors loaded."
@@ -253,10 +287,12 @@ def main():
     papers, authors = readPaperAuthor(authors)
     print "Paper-author pairs loaded. Loading paper data."
     papers = getPaperInfo(papers)
-    print "Paper info filled. Recomputing author data."
+    savePaperStore(papers, authors.keys(), OUT_PAPERS_FILENAME)
+    print "Paper info filled and saved. Recomputing author data."
     authors = recomputeAuthors(authors, papers)
     print "Author data recomputed. Creating pickle file."
     createPickleFile(authors, OUT_FILENAME)
+    createAuthorFile(authors, OUT_AUTHOR_FILENAME)
     for key in authors:
         print authors[key]
     print len(authors)
@@ -0,0 +1,243 @@
+# repIndex.py
+# by Zach Levonian and Freddy Stein
+# Nearest-neighbour indexes over the representative points of the CURE clusters.
+# Each index stores the reps of every cluster under a cluster label, answers
+# nearest-rep queries for points and clusters, and lets one cluster's reps be
+# replaced (after a merge) without rebuilding everything.
+# Convenience functions; intended to be used via import
+
+import numpy as np
+from scipy.spatial import cKDTree
+from authorMatrix import *
+
+# The kinds of index that buildRepIndex() knows how to create
+INDEX_KINDS = ["kdtree", "brute"]
+
+# Once the reps replaced or removed since the KD-tree was last built exceed this
+# fraction of the live reps, the tree is rebuilt. Until then the new reps are
+# scanned by brute force and the old ones are skipped in query results.
+REBUILD_FRACTION = 0.25
+
+# Checks every point against every rep. Best for small rep sets, and the
+# reference the other indexes must agree with.
+class BruteForceRepIndex:
+    def __init__(self):
+        self.clusterReps = dict([])
+        self.stacked = None
+
+    def __len__(self):
+        return sum([len(reps) for reps in self.clusterReps.values()])
+
+    # Adds a cluster's reps to the index, replacing any it had before
+    def setCluster(self, label, reps):
+        self.clusterReps[label] = np.asarray(reps, dtype=np.float64).reshape(-1, NUM_FEATURES)
+        self.stacked = None
+
+    def removeCluster(self, label):
+        del self.clusterReps[label]
+        self.stacked = None
+
+    def getStacked(self):
+        if self.stacked is None:
+            labels = sorted(self.clusterReps.keys())
+            reps = np.vstack([np.empty((0, NUM_FEATURES))] + [self.clusterReps[l] for l in labels])
+            repLabels = np.repeat(labels, [len(self.clusterReps[l]) for l in labels])
+            self.stacked = (reps, np.asarray(repLabels, dtype=np.intp))
+        return self.stacked
+
+    # Finds the nearest rep to each point.
+    # Input: an (n, 6) array of points (points)
+    # Output: the squared distance to the nearest rep, and its cluster label (dists, labels)
+    def nearest(self, points):
+        reps, repLabels = self.getStacked()
+        nearest, dists = getNearestCenters(points, reps)
+        return dists, repLabels[nearest]
+
+    # Finds the smallest squared distance between the reps of two clusters
+    def clusterDistance(self, label1, label2):
+        return getEucSquaredDistances(self.clusterReps[label1], self.clusterReps[label2]).min()
+
+    # Finds the cluster with the rep closest to any rep of the given cluster.
+    # Input: the label of the cluster (label)
+    # Output: the label of the closest other cluster (None if there is no other cluster),
+    #         and the squared distance between them (closest, dist)
+    def closestCluster(self, label):
+        reps, repLabels = self.getStacked()
+        others = repLabels != label
+        if not others.any():
+            return None, np.inf
+        dists = getEucSquaredDistances(self.clusterReps[label], reps[others]).min(axis=0)
+        nearest = np.argmin(dists)
+        return repLabels[others][nearest], dists[nearest]
+
+# Keeps the reps in a KD-tree, which suits our 6 standardized features. Each cluster
+# also gets a small tree of its own for cluster-to-cluster distance lookups.
+class KDTreeRepIndex:
+    def __init__(self):
+        self.clusterReps = dict([])
+        self.clusterTrees = dict([])
+        self.tree = None
+        self.treeLabels = np.empty(0, dtype=np.intp)
+        self.treeLive = np.empty(0, dtype=bool)
+        self.treeSlices = dict([])
+        self.numDead = 0
+        self.pending = dict([])
+
+    def __len__(self):
+        return sum([len(reps) for reps in self.clusterReps.values()])
+
+    # Adds a cluster's reps to the index, replacing any it had before. The new
+    # reps wait in self.pending until the next rebuild of the main tree.
+    def setCluster(self, label, reps):
+        if label in self.clusterReps:
+            self.removeCluster(label)
+        reps = np.asarray(reps, dtype=np.float64).reshape(-1, NUM_FEATURES)
+        self.clusterReps[label] = reps
+        self.clusterTrees[label] = cKDTree(reps) if len(reps) > 0 else None
+        self.pending[label] = reps
+        self.checkRebuild()
+
+    def removeCluster(self, label):
+        del self.clusterReps[label]
+        del self.clusterTrees[label]
+        if label in self.pending:
+            del self.pending[label]
+        if label in self.treeSlices:
+            start, stop = self.treeSlices.pop(label)
+            self.treeLive[start:stop] = False
+            self.numDead += stop - start
+        self.checkRebuild()
+
+    # Rebuilds the main tree once too much of it is stale
+    def checkRebuild(self):
+        if self.tree is None:
+            return # Still being filled; see buildRepIndex()
+        numPending = sum([len(reps) for reps in self.pending.values()])
+        if self.numDead + numPending > REBUILD_FRACTION * max(len(self), 1):
+            self.rebuild()
+
+    def rebuild(self):
+        labels = sorted(self.clusterReps.keys())
+        counts = [len(self.clusterReps[l]) for l in labels]
+        reps = np.vstack([np.empty((0, NUM_FEATURES))] + [self.clusterReps[l] for l in labels])
+        self.tree = cKDTree(reps) if len(reps) > 0 else None
+        self.treeLabels = np.asarray(np.repeat(labels, counts), dtype=np.intp)
+        self.treeLive = np.ones(len(reps), dtype=bool)
+        bounds = np.concatenate([[0], np.cumsum(counts)]).astype(int)
+        self.treeSlices = dict([(labels[i], (bounds[i], bounds[i + 1])) for i in range(len(labels))])
+        self.numDead = 0
+        self.pending = dict([])
+
+    # Queries the main tree for the nearest live rep to each point, skipping the
+    # reps of the excluded cluster as well as dead ones.
+    # Input: the points, and a cluster label to skip or None (points, exclude)
+    # Output: the squared distance to the nearest rep and its cluster label, with
+    #         infinity and -1 where there is none (dists, labels)
+    def queryTree(self, points, exclude=None):
+        dists = np.empty(len(points))
+        dists.fill(np.inf)
+        labels = np.empty(len(points), dtype=np.intp)
+        labels.fill(-1)
+        if self.tree is None or len(points) == 0:
+            return dists, labels
+        numSkipped = self.numDead
+        if exclude in self.treeSlices:
+            start, stop = self.treeSlices[exclude]
+            numSkipped += stop - start
+        k = min(numSkipped + 1, len(self.treeLabels))
+        evaluationCounts['indexQueries'] += len(points)
+        treeDists, treeIds = self.tree.query(points, k=k)
+        treeDists = treeDists.reshape(len(points), k)
+        treeIds = treeIds.reshape(len(points), k)
+        usable = self.treeLive[treeIds]
+        if exclude is not None:
+            usable &= self.treeLabels[treeIds] != exclude
+        found = usable.any(axis=1)
+        first = np.argmax(usable, axis=1)
+        pointIds = np.flatnonzero(found)
+        dists[pointIds] = treeDists[pointIds, first[pointIds]]**2
+        labels[pointIds] = self.treeLabels[treeIds[pointIds, first[pointIds]]]
+        return dists, labels
+
+    # Finds the nearest rep to each point.
+    # Input: an (n, 6) array of points (points)
+    # Output: the squared distance to the nearest rep, and its cluster label (dists, labels)
+    def nearest(self, points, exclude=None):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, NUM_FEATURES)
+        if len(points) > len(self) and (self.numDead > 0 or len(self.pending) > 0):
+            self.rebuild() # Cheap next to a large batch of queries
+        dists, labels = self.queryTree(points, exclude)
+        for label in self.pending:
+            if label == exclude or len(self.pending[label]) == 0:
+                continue
+            pendingDists = getEucSquaredDistances(points, self.pending[label]).min(axis=1)
+            closer = pendingDists < dists
+            dists[closer] = pendingDists[closer]
+            labels[closer] = label
+        return dists, labels
+
+    # Finds the smallest squared distance between the reps of two clusters
+    def clusterDistance(self, label1, label2):
+        evaluationCounts['indexQueries'] += len(self.clusterReps[label1])
+        return self.clusterTrees[label2].query(self.clusterReps[label1])[0].min()**2
+
+    # Finds the cluster with the rep closest to any rep of the given cluster.
+    # Input: the label of the cluster (label)
+    # Output: the label of the closest other cluster (None if there is no other cluster),
+    #         and the squared distance between them (closest, dist)
+    def closestCluster(self, label):
+        if len(self.clusterReps[label]) == 0:
+            return None, np.inf
+        dists, labels = self.nearest(self.clusterReps[label], exclude=label)
+        nearest = np.argmin(dists)
+        if labels[nearest] == -1:
+            return None, np.inf
+        return labels[nearest], dists[nearest]
+
+####
+
+# Creates an empty index of the given kind.
+# Input: the kind of index, one of INDEX_KINDS (kind)
+# Output: the new index (index)
+def createRepIndex(kind):
+    if kind == "kdtree":
+        return KDTreeRepIndex()
+    elif kind == "brute":
+        return BruteForceRepIndex()
+    raise ValueError("Unknown rep index kind: " + str(kind))
+
+# Builds an index from stacked representative points, like those of buildRepMatrix().
+# Input: the array of reps, the cluster label of each, and the kind of index
+#        (reps, repLabels, kind)
+# Output: the index (index)
+def buildRepIndex(reps, repLabels, kind):
+    index = createRepIndex(kind)
+    repLabels = np.asarray(repLabels)
+    for label in np.unique(repLabels).tolist():
+        index.setCluster(label, reps[repLabels == label])
+    if kind == "kdtree":
+        index.rebuild()
+    return index
+
+# Builds an index over the reps of the given clusters, labeled by cluster id.
+# Input: the list of CureClusters, and the kind of index (clusters, kind)
+# Output: the index (index)
+def buildClusterRepIndex(clusters, kind):
+    index = createRepIndex(kind)
+    for cluster in clusters:
+        index.setCluster(cluster.id, cluster.repPoints)
+    if kind == "kdtree":
+        index.rebuild()
+    return index
+
+# Finds the cluster of the nearest representative point for each of the given rows,
+# working through them chunkSize rows at a time.
+# Input: the author data matrix, the rows to label, the index over the representative
+#        points, and the chunk size. (data, rows, index, chunkSize)
+# Output: the cluster label for each of the given rows (labels)
+def getNearestRepLabels(data, rows, index, chunkSize=DEFAULT_CHUNK_SIZE):
+    labels = np.empty(len(rows), dtype=np.intp)
+    for start in range(0, len(rows), chunkSize):
+        chunk = data[rows[start:start + chunkSize]]
+        labels[start:start + chunkSize] = index.nearest(chunk)[1]
+    return labels
@@ -0,0 +1,57 @@
+# repSelection.py
+# by Zach Levonian and Freddy Stein
+# Chooses well-scattered representative points for a cluster. Each candidate keeps
+# a running distance to the points chosen so far, which is only updated against the
+# newest choice, so choosing r points from m candidates costs O(m * r).
+# Convenience functions; intended to be used via import
+
+import numpy as np
+from authorMatrix import *
+
+# Choose the candidate with the largest total distance to the chosen points
+# (the criterion this project has always used)
+MAX_TOTAL_DISTANCE = "maxTotal"
+
+# Choose the candidate whose nearest chosen point is furthest away
+# (the farthest-point criterion of the CURE paper)
+MAX_MIN_DISTANCE = "maxMin"
+
+CRITERIA = [MAX_TOTAL_DISTANCE, MAX_MIN_DISTANCE]
+
+# Chooses numPoints well-scattered points from the candidates: first the candidate
+# furthest from the center, then repeatedly the best unchosen candidate under the
+# given criterion. If sampleCap is set, clusters with more candidates than that
+# choose from a random subsample of sampleCap of them.
+# Input: the candidate points, the cluster center, the number of points to choose,
+#        the criterion (one of CRITERIA), the subsample size cap or None, and a
+#        numpy RandomState or seed for the subsample.
+#        (points, center, numPoints, criterion, sampleCap, random)
+# Output: the array of chosen points, at most one per candidate (chosen)
+def selectScatteredPoints(points, center, numPoints, criterion=MAX_TOTAL_DISTANCE, \
+                          sampleCap=None, random=None):
+    if criterion not in CRITERIA:
+        raise ValueError("Unknown rep selection criterion: " + str(criterion))
+    points = np.asarray(points, dtype=np.float64)
+    if sampleCap is not None and len(points) > sampleCap:
+        if not isinstance(random, np.random.RandomState):
+            random = np.random.RandomState(random)
+        points = points[np.sort(random.choice(len(points), sampleCap, replace=False))]
+    if len(points) == 0:
+        return np.empty((0, NUM_FEATURES))
+    numPoints = min(numPoints, len(points))
+    chosenIds = np.empty(numPoints, dtype=np.intp)
+    # Choose the first rep point to be the point furthest point from the "center"
+    chosenIds[0] = np.argmax(((points - center)**2).sum(axis=1))
+    running = ((points - points[chosenIds[0]])**2).sum(axis=1)
+    chosen = np.zeros(len(points), dtype=bool)
+    chosen[chosenIds[0]] = True
+    for i in range(1, numPoints):
+        scores = np.where(chosen, -1.0, running)
+        chosenIds[i] = np.argmax(scores)
+        chosen[chosenIds[i]] = True
+        newDists = ((points - points[chosenIds[i]])**2).sum(axis=1)
+        if criterion == MAX_TOTAL_DISTANCE:
+            running += newDists
+        else:
+            np.minimum(running, newDists, out=running)
+    return points[chosenIds]
@@ -0,0 +1,93 @@
+# sampling.py
+# by Zach Levonian and Freddy Stein
+# Chooses the sample of authors used for the preliminary clustering: uniform
+# reservoir sampling in a single streaming pass, stratified sampling, and the
+# Chernoff-bound sample size from the CURE paper (Guha, Rastogi and Shim, 1998).
+# Convenience functions; intended to be used via import
+
+import math
+import numpy as np
+from authorMatrix import *
+
+# Streams the row numbers of a matrix of numRows rows, chunkSize rows at a time.
+# Input: the number of rows, and the number of rows per chunk (numRows, chunkSize)
+# Output: a generator of arrays of consecutive row numbers (chunks)
+def streamRowChunks(numRows, chunkSize=DEFAULT_CHUNK_SIZE):
+    for start in range(0, numRows, chunkSize):
+        yield np.arange(start, min(start + chunkSize, numRows))
+
+# Draws a uniform random sample of the given size from a stream of items in one pass,
+# without knowing the length of the stream in advance (reservoir sampling, Algorithm R).
+# Each chunk is handled with array operations: item t of the stream replaces a random
+# reservoir slot j, drawn from [0, t], whenever j falls inside the reservoir.
+# Input: an iterable of arrays of items (such as row numbers or author ids), the sample
+#        size, and a seed or numpy RandomState (chunks, size, seed)
+# Output: the array of sampled items, fewer than size only if the stream was shorter
+#         (sample)
+def reservoirSample(chunks, size, seed=None):
+    randomState = seed if isinstance(seed, np.random.RandomState) else np.random.RandomState(seed)
+    reservoir = None
+    seen = 0
+    for chunk in chunks:
+        chunk = np.asarray(chunk)
+        if reservoir is None:
+            reservoir = np.empty(size, dtype=chunk.dtype)
+        numFill = max(0, min(size - seen, len(chunk)))
+        reservoir[seen:seen + numFill] = chunk[:numFill]
+        positions = np.arange(seen + numFill, seen + len(chunk))
+        if len(positions) > 0:
+            slots = (randomState.random_sample(len(positions)) * (positions + 1)).astype(np.int64)
+            replace = slots < size
+            # Later items overwrite earlier ones, as they would one at a time
+            reservoir[slots[replace]] = chunk[numFill:][replace]
+        seen += len(chunk)
+    if reservoir is None:
+        return np.empty(0, dtype=np.int64)
+    return reservoir[:min(size, seen)]
+
+# Draws a stratified random sample of rows: each stratum gets a share of the sample
+# proportional to its size (largest remainders get the leftover rows), sampled
+# uniformly without replacement within the stratum.
+# Input: the stratum of each row, the sample size, and a seed or numpy RandomState
+#        (strata, size, seed)
+# Output: the sorted array of sampled rows (sample)
+def stratifiedSample(strata, size, seed=None):
+    randomState = seed if isinstance(seed, np.random.RandomState) else np.random.RandomState(seed)
+    strata = np.asarray(strata)
+    size = min(size, len(strata))
+    labels, inverse, counts = np.unique(strata, return_inverse=True, return_counts=True)
+    quotas = counts * size / float(len(strata))
+    allocations = np.floor(quotas).astype(np.int64)
+    leftover = size - allocations.sum()
+    allocations[np.argsort(-(quotas - allocations), kind='mergesort')[:leftover]] += 1
+    order = np.argsort(inverse, kind='mergesort')
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    samples = []
+    for i in range(len(labels)):
+        members = order[bounds[i]:bounds[i + 1]]
+        samples.append(randomState.choice(members, allocations[i], replace=False))
+    return np.sort(np.concatenate([np.empty(0, dtype=np.int64)] + samples))
+
+# Splits the rows into strata by quantiles of one feature, for stratifiedSample().
+# Input: the data matrix, the column of the feature, and the number of strata
+#        (data, feature, numStrata)
+# Output: the stratum of each row (strata)
+def getFeatureStrata(data, feature, numStrata):
+    column = data[:, feature]
+    edges = np.percentile(column, np.linspace(0, 100, numStrata + 1)[1:-1])
+    strata = np.searchsorted(np.unique(edges), column, side='right')
+    return strata
+
+# Computes the sample size the CURE paper derives from the Chernoff bound: with a
+# sample of this size, every cluster of at least minClusterSize points has at least
+# clusterFraction of its points in the sample with probability at least 1 - delta.
+# Input: the number of points, the smallest cluster size of interest, the fraction of
+#        such a cluster wanted in the sample, and the allowed failure probability
+#        (numPoints, minClusterSize, clusterFraction, delta)
+# Output: the number of points to sample, at most numPoints (size)
+def chernoffSampleSize(numPoints, minClusterSize, clusterFraction, delta):
+    ratio = numPoints / float(minClusterSize)
+    logTerm = math.log(1.0 / delta)
+    size = clusterFraction * numPoints + ratio * logTerm + \
+           ratio * math.sqrt(logTerm**2 + 2 * clusterFraction * minClusterSize * logTerm)
+    return min(numPoints, int(math.ceil(size)))
@@ -0,0 +1,202 @@
+# scaler.py
+# by Zach Levonian and Freddy Stein
+# Scalers put the author features on comparable scales before clustering. A scaler
+# is fitted once, in a single vectorized pass over the feature matrix, and then keeps
+# its parameters so it can transform and inverse-transform whole matrices or single
+# points later on. The author data itself is never modified.
+# Convenience functions; intended to be used via import
+
+import numpy as np
+from authorMatrix import *
+
+# Offset added by the min-max scaler, so no standardized feature is 0
+MINMAX_OFFSET = 0.01
+
+# Puts each feature on a 0.01 to 1.01 scale using its smallest and largest values.
+# This is the standardization cure.py has always used.
+class MinMaxScaler(object):
+    kind = "minmax"
+
+    def __init__(self, offset=MINMAX_OFFSET):
+        self.offset = offset
+        self.mins = None
+        self.maxs = None
+
+    def __repr__(self):
+        return "MinMaxScaler(mins=" + str(self.mins) + ", maxs=" + str(self.maxs) + ")"
+
+    # Fits the scaler to a feature matrix, or an AuthorMatrix or dictionary of authors
+    def fit(self, data):
+        data = getFeatureData(data)
+        self.mins = data.min(axis=0)
+        self.maxs = data.max(axis=0)
+        return self
+
+    # Widens the fitted range to cover another block of data, so the scaler can be
+    # fitted a block at a time
+    def partialFit(self, data):
+        data = getFeatureData(data)
+        if len(data) == 0:
+            return self
+        if self.mins is None:
+            return self.fit(data)
+        self.mins = np.minimum(self.mins, data.min(axis=0))
+        self.maxs = np.maximum(self.maxs, data.max(axis=0))
+        return self
+
+    def getScale(self):
+        ranges = self.maxs - self.mins
+        return np.where(ranges > 0, ranges, 1.0) # A constant feature is only shifted
+
+    def transform(self, data):
+        return ((np.asarray(data, dtype=np.float64) - self.mins) / self.getScale()) + self.offset
+
+    def inverseTransform(self, data):
+        return ((np.asarray(data, dtype=np.float64) - self.offset) * self.getScale()) + self.mins
+
+    def getParams(self):
+        return dict([('offset', np.float64(self.offset)), ('mins', self.mins), ('maxs', self.maxs)])
+
+    def setParams(self, params):
+        self.offset = float(params['offset'])
+        self.mins = np.asarray(params['mins'], dtype=np.float64)
+        self.maxs = np.asarray(params['maxs'], dtype=np.float64)
+        return self
+
+# Centers each feature on its mean and divides by its standard deviation.
+class ZScoreScaler(object):
+    kind = "zscore"
+
+    def __init__(self):
+        self.count = 0
+        self.means = None
+        self.squares = None # Sum of squared differences from the mean
+
+    def __repr__(self):
+        return "ZScoreScaler(means=" + str(self.means) + ", stds=" + str(self.getScale()) + ")"
+
+    def fit(self, data):
+        self.count = 0
+        self.means = None
+        self.squares = None
+        return self.partialFit(data)
+
+    # Adds another block of data to the fit, combining the running means and sums of
+    # squares with those of the block (Chan et al.'s parallel update)
+    def partialFit(self, data):
+        data = getFeatureData(data)
+        if len(data) == 0:
+            return self
+        count = len(data)
+        means = data.mean(axis=0)
+        squares = ((data - means)**2).sum(axis=0)
+        if self.means is None:
+            self.count, self.means, self.squares = count, means, squares
+        else:
+            total = self.count + count
+            delta = means - self.means
+            self.squares = self.squares + squares + delta**2 * self.count * count / float(total)
+            self.means = self.means + delta * count / float(total)
+            self.count = total
+        return self
+
+    def getScale(self):
+        if self.means is None:
+            return None
+        stds = np.sqrt(self.squares / max(self.count, 1))
+        return np.where(stds > 0, stds, 1.0)
+
+    def transform(self, data):
+        return (np.asarray(data, dtype=np.float64) - self.means) / self.getScale()
+
+    def inverseTransform(self, data):
+        return (np.asarray(data, dtype=np.float64) * self.getScale()) + self.means
+
+    def getParams(self):
+        return dict([('count', np.int64(self.count)), ('means', self.means), ('squares', self.squares)])
+
+    def setParams(self, params):
+        self.count = int(params['count'])
+        self.means = np.asarray(params['means'], dtype=np.float64)
+        self.squares = np.asarray(params['squares'], dtype=np.float64)
+        return self
+
+# Centers each feature on its median and divides by its interquartile range, so a few
+# extreme authors barely move the scale. Needs all of the data at once to fit.
+class RobustScaler(object):
+    kind = "robust"
+
+    def __init__(self):
+        self.medians = None
+        self.ranges = None
+
+    def __repr__(self):
+        return "RobustScaler(medians=" + str(self.medians) + ", iqrs=" + str(self.ranges) + ")"
+
+    def fit(self, data):
+        data = getFeatureData(data)
+        lower, self.medians, upper = np.percentile(data, [25, 50, 75], axis=0)
+        self.ranges = upper - lower
+        return self
+
+    def partialFit(self, data):
+        raise ValueError("A robust scaler can't be fitted a block at a time")
+
+    def getScale(self):
+        return np.where(self.ranges > 0, self.ranges, 1.0)
+
+    def transform(self, data):
+        return (np.asarray(data, dtype=np.float64) - self.medians) / self.getScale()
+
+    def inverseTransform(self, data):
+        return (np.asarray(data, dtype=np.float64) * self.getScale()) + self.medians
+
+    def getParams(self):
+        return dict([('medians', self.medians), ('ranges', self.ranges)])
+
+    def setParams(self, params):
+        self.medians = np.asarray(params['medians'], dtype=np.float64)
+        self.ranges = np.asarray(params['ranges'], dtype=np.float64)
+        return self
+
+# The kinds of scaler that createScaler() knows how to create
+SCALERS = dict([(scalerClass.kind, scalerClass) for scalerClass in \
+                [MinMaxScaler, ZScoreScaler, RobustScaler]])
+SCALER_KINDS = sorted(SCALERS.keys())
+
+####
+
+# Creates an unfitted scaler of the given kind.
+# Input: one of SCALER_KINDS (kind)
+# Output: the scaler (scaler)
+def createScaler(kind):
+    if kind not in SCALERS:
+        raise ValueError("Unknown scaler kind: " + str(kind))
+    return SCALERS[kind]()
+
+# Gets the feature matrix to fit a scaler to.
+# Input: an (n, 6) array, an AuthorMatrix, or a dictionary of authors (data)
+# Output: the (n, 6) array of features (data)
+def getFeatureData(data):
+    if isinstance(data, np.ndarray):
+        return data.reshape(-1, NUM_FEATURES)
+    return asAuthorMatrix(data).data
+
+# Flattens a fitted scaler into named arrays, for storing in an .npz file.
+# Input: the scaler (scaler)
+# Output: a dictionary of name -> array, all named with a "scaler" prefix (arrays)
+def scalerToArrays(scaler):
+    arrays = dict([('scalerKind', np.array(scaler.kind))])
+    params = scaler.getParams()
+    for name in params:
+        arrays['scaler_' + name] = params[name]
+    return arrays
+
+# Rebuilds a scaler flattened by scalerToArrays().
+# Input: a dictionary (or loaded .npz file) holding the scaler arrays (arrays)
+# Output: the fitted scaler (scaler)
+def scalerFromArrays(arrays):
+    scaler = createScaler(str(arrays['scalerKind']))
+    params = dict([(name[len('scaler_'):], arrays[name]) for name in arrays.keys() \
+                   if name.startswith('scaler_')])
+    return scaler.setParams(params)
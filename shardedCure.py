@@ -0,0 +1,278 @@
+# shardedCure.py
+# by Zach Levonian and Freddy Stein
+# Runs CURE over authors stored as a directory of shards (see writeAuthorShards in
+# authorFile.py) without ever holding all of them in memory. The scaler and
+# the sample are fitted in streaming passes over the shards, the clusters are built
+# from the sample alone, and then every shard is labeled on its own by a pool of
+# worker processes, each writing a label file for its shard. The clusters and the
+# per-shard label files are kept in the output directory, so an interrupted run picks
+# up where it stopped, and the labels are finally merged into a single file.
+# Usage: pypy shardedCure.py shardDir outDir k [workers]
+
+import sys, os, json, multiprocessing
+import numpy as np
+from cure import *
+
+# The most authors held in memory to build the clusters from; larger samples are cut
+# down to this size
+MAX_SUBSET_SIZE = 500000
+
+# Names of the files written to the output directory
+MODEL_FILENAME = "clusters.npz"
+SHARD_LABELS_FORMAT = "labels-%05d.npy"
+LABELS_FILENAME = "labels.npy"
+
+# The clusters, as seen from inside a worker process
+shardWorkerState = dict([])
+
+# Coordinates a sharded run: builds the clusters (or loads them from an earlier run with
+# the same settings), labels every shard that has no label file yet, and merges the
+# label files. Building new clusters deletes the label files of any earlier run.
+# Input: the shard directory, the output directory, the number of clusters to create,
+#        the number of worker processes, and optionally a larger number of preliminary
+#        k-means clusters. (shardDir, outDir, k, workers, prelimK)
+# Output: the name of the merged label file, which holds the cluster of every author in
+#         shard order (labelsFile)
+def runShardedCURE(shardDir, outDir, k, workers=1, prelimK=None):
+    if prelimK is None:
+        prelimK = k
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+    shardFiles = listAuthorShards(shardDir)
+    shardSizes = getShardSizes(shardFiles)
+    print str(len(shardFiles)) + " shards holding " + str(sum(shardSizes)) + " authors."
+    modelFile = os.path.join(outDir, MODEL_FILENAME)
+    settings = getShardSettings(k, prelimK)
+    if os.path.exists(modelFile):
+        print "Loading clusters from an earlier run."
+        model = loadShardModel(modelFile, shardSizes, settings)
+    else:
+        removeShardLabels(outDir)
+        model = buildShardModel(shardFiles, shardSizes, k, prelimK)
+        model['settings'] = np.array(json.dumps(settings, sort_keys=True))
+        saveShardModel(model, modelFile)
+    print "Clusters ready. Labeling shards."
+    labelShards(shardFiles, shardSizes, model, outDir, workers)
+    print "All shards labeled. Merging labels."
+    labelsFile = mergeShardLabels(shardSizes, outDir)
+    print "Labels merged into " + labelsFile + "."
+    return labelsFile
+
+# Builds the clusters from a sample of the authors in the shards. The sample is chosen
+# in one streaming pass and only the sampled authors are read into memory.
+# Input: the shard files, the number of authors in each, the number of clusters to
+#        create and the number of preliminary clusters (shardFiles, shardSizes, k, prelimK)
+# Output: a dictionary holding the scaler arrays, the stacked representative points and
+#         their cluster, the sampled rows and their cluster, and the number of authors
+#         in each shard (model)
+def buildShardModel(shardFiles, shardSizes, k, prelimK):
+    numAuthors = sum(shardSizes)
+    numEntries = min(getSampleSize(numAuthors), MAX_SUBSET_SIZE)
+    print "Using " + str(numEntries) + " authors as the preliminary dataset."
+    sampleRows = np.sort(reservoirSample(streamRowChunks(numAuthors), numEntries, CLUSTERING_SEED))
+    subset = readShardRows(shardFiles, shardSizes, sampleRows)
+    scaler = fitShardScaler(shardFiles, subset)
+    subset = standardizeAuthors(subset, scaler)
+    subsetRows = np.arange(len(subset))
+    prelimClusters, centers = clusterSample(prelimK, subset, subsetRows, CLUSTERING_SEED)
+    print "Preliminary clustering complete. Building cure clusters."
+    clusters = buildCureClusters(prelimClusters, centers, subset, len(centers), subsetRows)
+    clusters = generateRepresentativePoints(clusters)
+    print "Representative points chosen. Merging close clusters."
+    clusters, outliers = mergeWithOutlierElimination(clusters, k, subset, len(subset))
+    print "Merging complete. " + str(len(clusters)) + " clusters remain."
+    sampleLabels = np.empty(len(subset), dtype=np.int64)
+    sampleLabels.fill(OUTLIER_CLUSTER_ID)
+    for i in range(len(clusters)):
+        sampleLabels[np.asarray(clusters[i].rows, dtype=np.intp)] = i
+    reps, repLabels = buildRepMatrix(clusters)
+    model = scalerToArrays(scaler)
+    model['reps'] = reps
+    model['repLabels'] = repLabels
+    model['sampleRows'] = sampleRows
+    model['sampleLabels'] = sampleLabels
+    model['shardSizes'] = np.asarray(shardSizes, dtype=np.int64)
+    return model
+
+# Writes the clusters of a sharded run, under a temporary name first.
+# Input: the dictionary from buildShardModel(), and the name of the file (model, fileName)
+# Output: None
+def saveShardModel(model, fileName):
+    writeAtomically(fileName, lambda outFile: np.savez(outFile, **model))
+
+# Loads the clusters of an earlier sharded run, checking they were built from the
+# same shards with the same settings.
+# Input: the name of the file, the number of authors in each shard, and the settings
+#        from getShardSettings() (fileName, shardSizes, settings)
+# Output: the dictionary from buildShardModel() (model)
+def loadShardModel(fileName, shardSizes, settings):
+    with np.load(fileName) as stored:
+        model = dict([(name, stored[name]) for name in stored.files])
+    if model['shardSizes'].tolist() != list(shardSizes):
+        raise ValueError(fileName + " was built from different shards")
+    stored = json.loads(str(model['settings'])) if 'settings' in model else None
+    if stored != json.loads(json.dumps(settings)):
+        raise ValueError(fileName + " was built with different settings: " + str(stored))
+    return model
+
+# Collects the settings the clusters of a sharded run depend on.
+# Input: the number of clusters and of preliminary clusters (k, prelimK)
+# Output: a dictionary of plain values (settings)
+def getShardSettings(k, prelimK):
+    settings = getClusteringSettings()
+    settings['k'] = k
+    settings['prelimK'] = prelimK
+    settings['SCALER_KIND'] = SCALER_KIND
+    settings['MAX_SUBSET_SIZE'] = MAX_SUBSET_SIZE
+    return settings
+
+# Deletes the label files of an earlier run, so they aren't mixed with labels from new
+# clusters.
+# Input: the output directory (outDir)
+# Output: None
+def removeShardLabels(outDir):
+    for fileName in os.listdir(outDir):
+        if fileName.startswith("labels"):
+            os.remove(os.path.join(outDir, fileName))
+
+# Labels every shard without a label file, spread over a pool of worker processes
+# when more than one is asked for.
+# Input: the shard files, the number of authors in each, the clusters, the output
+#        directory and the number of worker processes
+#        (shardFiles, shardSizes, model, outDir, workers)
+# Output: None
+def labelShards(shardFiles, shardSizes, model, outDir, workers):
+    offsets = np.concatenate([[0], np.cumsum(shardSizes)]).tolist()
+    tasks = []
+    for i in range(len(shardFiles)):
+        labelsFile = os.path.join(outDir, SHARD_LABELS_FORMAT % i)
+        if os.path.exists(labelsFile):
+            print "  Shard " + str(i) + " already labeled."
+        else:
+            tasks.append((i, shardFiles[i], offsets[i], labelsFile))
+    if workers > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(workers, len(tasks)), initializer=initShardWorker, \
+                                    initargs=(model,))
+        try:
+            for shard in pool.imap_unordered(labelShardFile, tasks):
+                print "  Shard " + str(shard) + " complete."
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        initShardWorker(model)
+        try:
+            for task in tasks:
+                print "  Shard " + str(labelShardFile(task)) + " complete."
+        finally:
+            shardWorkerState.clear()
+
+# Helper function for labelShards()
+# Pool initializer; stores the clusters, the scaler and an index over their
+# representative points for labelShardFile() to use.
+# Input: the dictionary from buildShardModel() (model)
+# Output: none
+def initShardWorker(model):
+    shardWorkerState.update(model)
+    shardWorkerState['scaler'] = scalerFromArrays(model)
+    shardWorkerState['index'] = buildRepIndex(model['reps'], model['repLabels'], REP_INDEX_KIND)
+
+# Helper function for labelShards()
+# Labels the authors of one shard and writes their labels, under a temporary name
+# first. Sampled authors keep the cluster they were put in; the others get the
+# cluster of their nearest representative point, or OUTLIER_CLUSTER_ID if they were
+# pruned as outliers.
+# Input: the shard number, the shard file, the row of its first author among all the
+#        shards, and the name of the label file to write (task)
+# Output: the shard number (shard)
+def labelShardFile(task):
+    shard, shardFile, offset, labelsFile = task
+    matrix = loadAuthorFile(shardFile)
+    labels = np.empty(len(matrix), dtype=np.int64)
+    for start in range(0, len(matrix), ASSIGN_CHUNK_SIZE):
+        stop = min(start + ASSIGN_CHUNK_SIZE, len(matrix))
+        chunk = shardWorkerState['scaler'].transform(matrix.data[start:stop])
+        labels[start:stop] = getNearestRepLabels(chunk, np.arange(stop - start), \
+                                                 shardWorkerState['index'], ASSIGN_CHUNK_SIZE)
+    sampleRows = shardWorkerState['sampleRows']
+    first, last = np.searchsorted(sampleRows, [offset, offset + len(matrix)])
+    labels[sampleRows[first:last] - offset] = shardWorkerState['sampleLabels'][first:last]
+    writeAtomically(labelsFile, lambda outFile: np.save(outFile, labels))
+    return shard
+
+# Concatenates the per-shard label files, in shard order, into one label file that is
+# written through a memory map rather than held in memory.
+# Input: the number of authors in each shard, and the output directory (shardSizes, outDir)
+# Output: the name of the merged label file (labelsFile)
+def mergeShardLabels(shardSizes, outDir):
+    labelsFile = os.path.join(outDir, LABELS_FILENAME)
+    tempName = labelsFile + ".tmp"
+    merged = np.lib.format.open_memmap(tempName, mode="w+", dtype=np.int64, shape=(sum(shardSizes),))
+    start = 0
+    for i in range(len(shardSizes)):
+        shardLabels = np.load(os.path.join(outDir, SHARD_LABELS_FORMAT % i), mmap_mode="r")
+        if len(shardLabels) != shardSizes[i]:
+            raise ValueError("Label file of shard " + str(i) + " does not match the shard")
+        merged[start:start + len(shardLabels)] = shardLabels
+        start += len(shardLabels)
+    merged.flush()
+    del merged
+    os.rename(tempName, labelsFile)
+    return labelsFile
+
+####
+
+# Reads the number of authors in each shard from the shard headers.
+# Input: the shard files (shardFiles)
+# Output: the number of authors in each shard (shardSizes)
+def getShardSizes(shardFiles):
+    return [int(readAuthorFileHeader(shardFile)[1]) for shardFile in shardFiles]
+
+# Fits a scaler of SCALER_KIND in one streaming pass over the shards. A scaler that
+# can't be fitted a block at a time (robust scaling) is fitted to the sample instead.
+# Input: the shard files, and the AuthorMatrix of sampled authors (shardFiles, subset)
+# Output: the fitted scaler (scaler)
+def fitShardScaler(shardFiles, subset):
+    scaler = createScaler(SCALER_KIND)
+    try:
+        for shardFile in shardFiles:
+            scaler.partialFit(loadAuthorFile(shardFile).data)
+    except ValueError:
+        print "  Fitting the " + SCALER_KIND + " scaler to the sample only."
+        scaler = createScaler(SCALER_KIND).fit(subset.data)
+    return scaler
+
+# Reads the given rows, numbered across all of the shards in order, into memory.
+# Input: the shard files, the number of authors in each, and the sorted rows to read
+#        (shardFiles, shardSizes, rows)
+# Output: an AuthorMatrix of the authors in those rows (subset)
+def readShardRows(shardFiles, shardSizes, rows):
+    ids, data = [np.empty(0, dtype=np.int64)], [np.empty((0, NUM_FEATURES))]
+    offset = 0
+    for i in range(len(shardFiles)):
+        first, last = np.searchsorted(rows, [offset, offset + shardSizes[i]])
+        if last > first:
+            matrix = loadAuthorFile(shardFiles[i])
+            shardRows = rows[first:last] - offset
+            ids.append(np.asarray(matrix.ids[shardRows]))
+            data.append(np.asarray(matrix.data[shardRows]))
+        offset += shardSizes[i]
+    return AuthorMatrix(np.concatenate(ids), np.vstack(data))
+
+# Runs CURE over a shard directory, then prints the size of each cluster.
+def main():
+    if len(sys.argv) < 4 or len(sys.argv) > 5:
+        print "Usage: pypy shardedCure.py shardDir outDir k [workers]"
+        return
+    workers = 1
+    if len(sys.argv) == 5:
+        workers = int(sys.argv[4])
+    labelsFile = runShardedCURE(sys.argv[1], sys.argv[2], int(sys.argv[3]), workers)
+    labels = np.load(labelsFile, mmap_mode="r")
+    sizes = np.bincount(labels[labels != OUTLIER_CLUSTER_ID])
+    for i in range(len(sizes)):
+        print "Cluster #" + str(i) + " Size: " + str(sizes[i])
+    print "Outliers: " + str(np.count_nonzero(labels == OUTLIER_CLUSTER_ID)) + " authors pruned."
+
+if __name__ == '__main__':
+    main()
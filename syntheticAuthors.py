@@ -0,0 +1,87 @@
+# syntheticAuthors.py
+# by Zach Levonian and Freddy Stein
+# Generates synthetic authors, since the real dataset can't be shipped. Each author is
+# drawn from one of a number of author profiles (a typical paper count, share of
+# conference and journal papers, start of career and career length), and the profile
+# is kept as the ground-truth cluster. The features follow the rules of
+# recomputeAuthors in pickleCreator.py: at least PAPERS_THRESHOLD papers, conference
+# plus journal papers no more than the papers, and years within MIN_YEAR and MAX_YEAR.
+# The same authors can also be written out as the dataRev2 CSV files, so the ingestion
+# path can be run on them too.
+# Convenience functions; intended to be used via import
+
+import os
+import numpy as np
+from authorMatrix import *
+from pickleCreator import PAPERS_THRESHOLD, MIN_YEAR, MAX_YEAR
+
+# Number of distinct conference and journal ids the synthetic papers are spread over
+NUM_VENUES = 5000
+
+# Generates synthetic authors with known clusters.
+# Input: the number of authors, the number of ground-truth clusters, and a seed or
+#        numpy RandomState (numAuthors, numClusters, seed)
+# Output: an AuthorMatrix of the authors (ids 1 to numAuthors), and the ground-truth
+#         cluster of each of them (matrix, trueLabels)
+def generateAuthors(numAuthors, numClusters, seed=None):
+    randomState = seed if isinstance(seed, np.random.RandomState) else np.random.RandomState(seed)
+    paperRates = randomState.uniform(5, 80, numClusters)
+    conferenceShares = randomState.uniform(0.1, 0.6, numClusters)
+    journalShares = randomState.uniform(0.1, 0.9, numClusters) * (1 - conferenceShares)
+    startYears = randomState.uniform(MIN_YEAR, MAX_YEAR - 10, numClusters)
+    careerLengths = randomState.uniform(0, 30, numClusters)
+    # Uneven cluster sizes, but none much smaller than a fifth of the mean size
+    weights = randomState.uniform(0.2, 1.0, numClusters)
+    trueLabels = randomState.choice(numClusters, numAuthors, p=weights / weights.sum())
+    numPapers = PAPERS_THRESHOLD + randomState.poisson(paperRates[trueLabels])
+    numConferences = randomState.binomial(numPapers, conferenceShares[trueLabels])
+    numJournals = randomState.binomial(numPapers - numConferences, \
+                                       journalShares[trueLabels] / (1 - conferenceShares[trueLabels]))
+    firstYears = np.clip(np.round(randomState.normal(startYears[trueLabels], 3)), MIN_YEAR, MAX_YEAR)
+    careers = np.maximum(np.round(randomState.normal(careerLengths[trueLabels], 3)), 0)
+    lastYears = np.minimum(firstYears + careers, MAX_YEAR)
+    data = np.column_stack([numPapers, numConferences, numJournals, lastYears - firstYears, \
+                            firstYears, lastYears]).astype(np.float64)
+    return AuthorMatrix(np.arange(1, numAuthors + 1, dtype=np.int64), data), trueLabels
+
+# Writes the dataRev2 files (Author.csv, Paper.csv and PaperAuthor.csv) for the given
+# authors, such that reading them back through pickleCreator gives the same features.
+# Each author gets their own papers: the first in their first year, the second in
+# their last year and the rest in between; their first numConferences papers have a
+# conference and the next numJournals a journal.
+# Input: the AuthorMatrix of authors (raw features, as from generateAuthors), the
+#        directory to write the files to, and a seed or numpy RandomState
+#        (matrix, directory, seed)
+# Output: the number of papers written (numPapers)
+def writeDataFiles(matrix, directory, seed=None):
+    randomState = seed if isinstance(seed, np.random.RandomState) else np.random.RandomState(seed)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    data = matrix.data.astype(np.int64)
+    numPapers, numConferences, numJournals = data[:, 0], data[:, 1], data[:, 2]
+    firstYears, lastYears = data[:, 4], data[:, 5]
+    authorRows = np.repeat(np.arange(len(matrix)), numPapers)
+    starts = np.concatenate([[0], np.cumsum(numPapers)[:-1]]).astype(np.int64)
+    positions = np.arange(len(authorRows)) - starts[authorRows]
+    spans = lastYears[authorRows] - firstYears[authorRows] + 1
+    years = firstYears[authorRows] + (randomState.random_sample(len(authorRows)) * spans).astype(np.int64)
+    years[positions == 0] = firstYears[authorRows][positions == 0]
+    years[positions == 1] = lastYears[authorRows][positions == 1]
+    isConference = positions < numConferences[authorRows]
+    isJournal = ~isConference & (positions < numConferences[authorRows] + numJournals[authorRows])
+    conferences = np.where(isConference, randomState.randint(1, NUM_VENUES + 1, len(authorRows)), 0)
+    journals = np.where(isJournal, randomState.randint(1, NUM_VENUES + 1, len(authorRows)), 0)
+    paperIds = np.arange(1, len(authorRows) + 1, dtype=np.int64)
+    authorIds = np.asarray(matrix.ids, dtype=np.int64)
+    with open(os.path.join(directory, "Author.csv"), "w") as outFile:
+        outFile.write("Id,Name,Affiliation\n")
+        np.savetxt(outFile, np.column_stack([authorIds, authorIds]), fmt="%d,Author %d,")
+    with open(os.path.join(directory, "Paper.csv"), "w") as outFile:
+        outFile.write("Id,Title,Year,ConferenceId,JournalId,Keyword\n")
+        np.savetxt(outFile, np.column_stack([paperIds, paperIds, years, conferences, journals]), \
+                   fmt="%d,Paper %d,%d,%d,%d,")
+    with open(os.path.join(directory, "PaperAuthor.csv"), "w") as outFile:
+        outFile.write("PaperId,AuthorId,Name,Affiliation\n")
+        np.savetxt(outFile, np.column_stack([paperIds, authorIds[authorRows], authorIds[authorRows]]), \
+                   fmt="%d,%d,Author %d,")
+    return len(paperIds)